@@ -1,147 +1,29 @@
-import pandas as pd
+import argparse
+import asyncio
 import pickle
 import os
-import csv
-import requests
-from bs4 import BeautifulSoup
 import re
+import shutil
+import sys
+from datetime import date
 from random import sample
 
+import polars as pl
 
-# define variables used in the functions
-headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/118.0"
-}
-variables = [
-    "text",
-    "text_length",
-    "tag",
-    "url",
-    "url_redirect",
-]  # names for the extracted text dataframe
-min_length = 150  # minimum text length of paragraphs
-tags_to_keep = ["p", "h1", "h2", "h3"]  # keep just the text elements in this list
+from scraping.archive import ArchiveWriter, reextract_archive
+from scraping.dedup import TextDedup
+from scraping.frontier import Frontier
+from scraping.output import CsvOutput, ParquetOutput, replace_dir
+from scraping.pipeline import deferrals_max_default, run_pipeline
+from scraping.routing import RoutedArchive, RoutedOutput, RoutedState
+from scraping.state import CrawlState
+from scraping.urls import SeenUrls
 
 
-def write_error_to_csv(url, error, file):
+def load_urls(country, sample_num=0):
     """
-    Writes an error to a csv file.
-
-    Parameters
-    ----------
-    url : str
-        The url that caused the error.
-    error : str
-        The error message to write.
-    file : str
-        The path to the csv file to write the url and error to.
-    """
-    print(error)
-    pd.DataFrame({"url": [url], "error": [error]}).to_csv(
-        file, mode="a", index=False, header=False
-    )
-
-
-def extract_html_text(url, file_good, file_bad, verify=True):
-    """
-    Extracts the main text from a given url, keep just useful text elements and writes to csv.
-
-    Parameters
-    ----------
-    url : str
-        The url to extract the text from.
-    file_good : str
-        The path to the csv file to write extracted text to.
-    file_bad : str
-        The path to the csv file to write errors to.
-
-    Returns
-    -------
-    texts_df : pd.DataFrame
-        A DataFrame containing the extracted text.
-    error : str or None
-        None if no error occurred during extraction.
-    """
-    try:
-        response = requests.get(url, headers=headers, timeout=(5, 10), verify=verify)
-
-        response.raise_for_status()
-
-        # Exit with error if redirected to a PDF
-        if response.headers["Content-Type"] == "application/pdf":
-            write_error_to_csv(url, "Redirected to PDF", file_bad)
-            return pd.DataFrame(), "Redirect to PDF"
-
-        # Parse the content of the response with BeautifulSoup
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        # Get the title and add as first row for this url
-        title = soup.title.string if soup.title else "No title"
-        title = title if title != None else "No title"
-        title = " ".join(title.split())
-        title_list = [title, len(title), "title", url, None]
-        text_elements = [dict(zip(variables, title_list))]
-
-        # Loop over valid tags, get the text and meta data, and add to the list
-        for tag in soup.find_all(tags_to_keep, recursive=True):
-            text = tag.get_text(separator=" ", strip=True)
-            text = " ".join(text.split())
-            text_length = len(text)
-            if (tag.name == "p" and text_length >= min_length) or (
-                re.match(r"^h", tag.name) and text_length > 0
-            ):
-                # Store the text with its tag, and length as meta information
-                results = [text, text_length, tag.name, url, None]
-                text_elements.append(dict(zip(variables, results)))
-
-        # Convert the list of dictionaries to a pandas DataFrame
-        texts_df = pd.DataFrame(text_elements)
-
-        # Drop duplicates (because of nested structure)
-        texts_df = texts_df.drop_duplicates(subset=["text"])
-
-        # Drop rows with headlines that follow other headlines
-        texts_df = texts_df[
-            ~(
-                texts_df["tag"].isin(["h1", "h2", "h3"])
-                & texts_df["tag"].shift(+1).isin(["h1", "h2", "h3"])
-            )
-        ]
-
-        # Add a value for the new url if redirected
-        if response.history:
-            texts_df["url_redirect"] = response.url
-
-        # Append the DataFrame to the CSV file
-        texts_df.to_csv(file_good, mode="a", index=False, header=False)
-
-        return texts_df, None  # No error
-
-    # If error for request, write to csv and return empty dataframe
-    except requests.HTTPError as http_err:
-        http_err_code = http_err.response.status_code
-        write_error_to_csv(url, http_err_code, file_bad)
-        return pd.DataFrame(), http_err_code
-    except Exception as err:
-        write_error_to_csv(url, err, file_bad)
-        return pd.DataFrame(), err
-
-
-def extract_texts_from_urls(country="Germany", sample_num=0):
-    """
-    Extracts html text from a list of urls, filters out short texts and writes to csv.
-
-    Parameters
-    ----------
-    country : str, optional
-        The country to extract urls from. Defaults to "Germany".
-
-    Returns
-    -------
-    combined_df : pd.DataFrame
-        A DataFrame containing the extracted text.
-    errors_df : pd.DataFrame
-        A DataFrame containing errors that occurred during extraction.
+    Loads the urls of a country (first pkl file in its scraping folder), without
+    fragments and duplicates, optionally just a random sample of them.
     """
     # load country specific pkl file from scraping country folder
     file_urls = os.listdir(f"data/scraping/{country}")
@@ -157,58 +39,453 @@ def extract_texts_from_urls(country="Germany", sample_num=0):
     if sample_num > 0:
         urls_clean = sample(urls_clean, sample_num)
 
-    # Define and write initial csv files (if not existing yet)
-    outfile_good = f"data/scraping/{country}/scraped_data.csv"
+    return urls_clean
 
-    if not os.path.isfile(outfile_good):
-        with open(outfile_good, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            writer.writerow(variables)
 
-    outfile_bad = f"data/scraping/{country}/scraped_data_errors.csv"
+def load_seeds(country, file="data/uni_infos/university_infos.csv"):
+    """
+    Loads the homepages of the universities of a country (written by
+    4_1_uni_infos_prepare.py), the start of a link-discovery crawl.
+    """
+    codes = {"Germany": "ger", "USA": "usa", "UK": "uk", "India": "ind"}
+    homepages = (
+        pl.read_csv(file)
+        .filter(pl.col("country") == codes.get(country, country.lower()))
+        .get_column("url")
+        .drop_nulls()
+        .str.strip_chars()
+    )
+    # some homepages are stored without scheme
+    return [url if "://" in url else f"https://{url}" for url in homepages]
 
-    if not os.path.isfile(outfile_bad):
-        with open(outfile_bad, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            writer.writerow(["url", "error"])
 
-    # Check for already done urls (in csv files) and skip them
-    urls_good = (
-        pd.read_csv(outfile_good).drop_duplicates(subset=["url"])["url"].tolist()
+def open_output(country, output_format, directory="data/scraping"):
+    """
+    Opens the output of a country (csv files or parquet dataset in `directory`).
+    """
+    if output_format == "parquet":
+        return ParquetOutput(f"{directory}/parquet", country)
+    # csv files get a header row if not existing yet
+    os.makedirs(f"{directory}/{country}", exist_ok=True)
+    return CsvOutput(
+        f"{directory}/{country}/scraped_data.csv",
+        f"{directory}/{country}/scraped_data_errors.csv",
     )
-    urls_bad = pd.read_csv(outfile_bad)["url"].tolist()
 
-    urls_done = urls_good + urls_bad
 
-    # Initialize lists to store extracted texts and errors
-    all_dfs = []
-    errors = []
+def open_country(country, output_format, directory="data/scraping"):
+    """
+    Opens the crawl state and the output (in `directory`) of a country.
 
-    urls_to_do = [url for url in urls_clean if url not in urls_done]
-    print(f"Total urls to scrape: {len(urls_to_do)}")
+    Returns the state, the output and the path of the csv file for texts.
+    """
+    outfile_good = f"data/scraping/{country}/scraped_data.csv"
+    outfile_bad = f"data/scraping/{country}/scraped_data_errors.csv"
+    file_state = f"data/scraping/{country}/crawl_state.sqlite"
+    migrate_state = not os.path.isfile(file_state)
+    os.makedirs(f"data/scraping/{country}", exist_ok=True)
 
-    # Loop over unique and unscrape urls and write results (texts or error) to csv
-    for count, url in enumerate(urls_to_do, start=1):
-        print(count, url)
+    # a crawl started before the state file existed is imported once from the
+    # csv files
+    state = CrawlState(file_state)
+    if migrate_state:
+        state.import_csv(outfile_good, outfile_bad)
 
-        df, error = extract_html_text(url, outfile_good, outfile_bad)
+    output = open_output(country, output_format, directory)
+    return state, output, f"{directory}/{country}/scraped_data.csv"
 
-        if not df.empty:
-            all_dfs.append(df)
-        if error:
-            errors.append({"url": url, "error": error})
 
-    combined_df = pd.concat(all_dfs, ignore_index=True) if all_dfs else pd.DataFrame()
+def filter_duplicates(urls, seen, state):
+    """
+    Records the urls that are variants of already scraped pages as duplicates
+    and returns the others. Variants of the same page within `urls` go to the
+    end of the list, so they are skipped once the first one is fetched (see
+    scraping.pipeline.run_pipeline) but still tried if it fails.
+    """
+    urls_first, urls_variant, canonical = [], [], set()
+    for url in urls:
+        url_original = seen.duplicate_of(url)
+        if url_original is not None:
+            state.mark_duplicate(url, url_original)
+            continue
+        key = seen.canonical(url)
+        (urls_variant if key in canonical else urls_first).append(url)
+        canonical.add(key)
+    state.commit()
+    return urls_first + urls_variant
+
+
+def extract_texts_from_countries(
+    countries,
+    sample_num=0,
+    concurrency=64,
+    host_concurrency=2,
+    host_delay=1.0,
+    parser="bs4",
+    parse_workers=None,
+    output_format="csv",
+    dedup=True,
+    max_bytes=5_000_000,
+    archive=False,
+    refresh=False,
+    discover=False,
+    depth_max=3,
+    pages_max=1000,
+    batch_size=10_000,
+    pdf_workers=2,
+    deferrals_max=deferrals_max_default,
+):
+    """
+    Extracts html text from the urls of several countries, filters out short
+    texts and writes them to the csv files of each country.
+
+    The urls of all countries are scraped in a single crawl, so the fetch
+    capacity is spread over the domains of all countries at once; results are
+    routed to the output and crawl state of the url's country (see
+    scraping.routing).
+
+    The scraping runs as a pipeline (see scraping.pipeline.run_pipeline): the
+    urls are downloaded concurrently, but every single host gets at most
+    `host_concurrency` parallel requests and a pause of `host_delay` seconds
+    between them; the pages are parsed in `parse_workers` processes and a
+    single writer appends the results to the csv files. Hosts that are down or
+    very slow are paused by a circuit breaker; their urls are deferred to the
+    next run instead of being logged as errors. The crawl telemetry (latency
+    per host, throughput, parse time, errors by class) is written to
+    data/scraping/crawl_metrics.json / crawl_metrics_hosts.csv while running
+    and summarized at the end.
+
+    Before a request is made, every url is canonicalized (scheme, www, trailing
+    slash, tracking parameters; see scraping.urls). Urls whose canonical form
+    or known redirect target was already scraped are recorded as duplicates in
+    the crawl state and not fetched; the redirect map is learned from the
+    redirect chains of all responses and kept in the crawl state.
 
-    errors_df = pd.DataFrame(errors)
+    Parameters
+    ----------
+    countries : list of str
+        The countries to extract urls from (folders in data/scraping).
+    sample_num : int, optional
+        Scrape just a random sample of this many urls per country (0 for all).
+    concurrency : int, optional
+        Maximum number of open requests over all hosts.
+    host_concurrency : int, optional
+        Maximum number of open requests per host.
+    host_delay : float, optional
+        Minimum seconds between two requests to the same host.
+    parser : str, optional
+        The html parser backend, "bs4" (BeautifulSoup reference) or "lxml"
+        (fast, see scraping.extract.elements_lxml).
+    parse_workers : int, optional
+        Number of parser processes (None for all cores).
+    output_format : str, optional
+        "csv" appends to scraped_data.csv / scraped_data_errors.csv, "parquet"
+        writes batched parquet parts to data/scraping/parquet (partitioned by
+        country). Later steps read both via scraping.dataset.
+    dedup : bool, optional
+        Write texts repeated within a domain (footers, navigation, legal notes)
+        just once and as references afterwards (see scraping.dedup.TextDedup).
+        Not possible for a csv file started without the `text_hash` column.
+    max_bytes : int, optional
+        Pages larger than this are aborted while downloading. Bodies that are
+        not html or PDF (images, office documents) are aborted after the
+        headers; both are logged with a reason code in the error file.
+    archive : bool, optional
+        Keep the raw responses (headers, redirects, html) as zstd compressed
+        WARC files in data/scraping/<country>/archive, so the texts can be
+        extracted again without fetching (see `reextract_countries`).
+    refresh : bool, optional
+        Scrape the already scraped urls again, with conditional requests
+        (ETag, Last-Modified from the crawl state). Pages that answer 304 or
+        have the same content as before are skipped; the texts of changed pages
+        are written as a new snapshot to data/scraping/snapshots/<date>.
+    discover : bool, optional
+        Find the urls by following links instead of loading the url lists:
+        the crawl starts at the university homepages (see `load_seeds`) and
+        follows links within their domains (see scraping.frontier.Frontier).
+        robots.txt is respected; the queue is kept in
+        data/scraping/frontier.sqlite, so an interrupted crawl resumes.
+    depth_max : int, optional
+        With `discover`, the maximum number of links from a homepage.
+    pages_max : int, optional
+        With `discover`, the maximum number of urls per host.
+    batch_size : int, optional
+        With `discover`, the number of urls scraped per pipeline run.
+    pdf_workers : int, optional
+        Number of processes extracting PDFs (diversity statements, equality
+        plans), written as rows with the tag "pdf_p" (see scraping.pdf). 0
+        skips PDFs like other bodies that are not html.
+    deferrals_max : int, optional
+        Number of runs in a row a url is deferred (host down, robots.txt
+        unreachable) before it is given up and recorded as an error.
 
-    return combined_df, errors_df
+    Returns
+    -------
+    stats : scraping.pipeline.PipelineStats or list of them
+        Number of fetched, parsed and written urls, rows and errors (one per
+        batch with `discover`).
+    """
+    if discover and refresh:
+        raise ValueError("discover and refresh can't be combined")
+    directory = "data/scraping"
+    if refresh:
+        directory = f"data/scraping/snapshots/{date.today().isoformat()}"
+
+    frontier = None
+    if discover:
+        frontier = Frontier("data/scraping/frontier.sqlite", depth_max, pages_max)
+
+    states, outputs, country_of, validators = {}, {}, {}, {}
+    for country in countries:
+        states[country], outputs[country], _ = open_country(
+            country, output_format, directory
+        )
+
+    # Canonical forms of all scraped pages and the known redirects
+    seen = None
+    if not refresh:
+        seen = SeenUrls(
+            [page for state in states.values() for page in state.urls_fetched()],
+            {
+                url: target
+                for state in states.values()
+                for url, target in state.load_redirects().items()
+            },
+        )
+
+    for country in countries:
+        outfile_good = f"{directory}/{country}/scraped_data.csv"
+
+        if discover:
+            # Start from the homepages, the urls come from the frontier
+            urls_to_do = []
+            frontier.add_seeds(load_seeds(country), country)
+        elif refresh:
+            # Scrape done urls again, conditional on their last validators
+            urls_clean = load_urls(country, sample_num)
+            urls_scraped = states[country].urls_scraped()
+            urls_to_do = [url for url in urls_clean if url in urls_scraped]
+            validators.update(states[country].load_validators(urls_to_do))
+        else:
+            # Check for already done urls (in crawl state) and skip them
+            urls_clean = load_urls(country, sample_num)
+            urls_to_do = states[country].filter_todo(urls_clean)
+            urls_to_do = filter_duplicates(urls_to_do, seen, states[country])
+        print(f"{country}: urls to scrape: {len(urls_to_do)}")
+        for url in urls_to_do:
+            country_of.setdefault(url, country)
+
+        if dedup and not outputs[country].keeps_references:
+            print(f"No text dedup: {outfile_good} has no text_hash column")
+            dedup = False
+
+    print(f"Total urls to scrape: {len(country_of)}")
+
+    # Fetch, parse and write unique and unscraped urls (texts or error) to file
+    archives = RoutedArchive(
+        {
+            country: ArchiveWriter(f"data/scraping/{country}/archive")
+            for country in (countries if archive else [])
+        },
+        country_of,
+    )
+    text_dedup = TextDedup() if dedup else None
+
+    def scrape(urls, on_links=None):
+        return asyncio.run(
+            run_pipeline(
+                urls,
+                output,
+                state,
+                parser=parser,
+                parse_workers=parse_workers,
+                concurrency=concurrency,
+                host_concurrency=host_concurrency,
+                host_delay=host_delay,
+                dedup=text_dedup,
+                max_bytes=max_bytes,
+                archive=archives if archive else None,
+                validators=validators,
+                seen=seen,
+                on_links=on_links,
+                pdf_workers=pdf_workers,
+                deferrals_max=deferrals_max,
+                metrics_files=(
+                    "data/scraping/crawl_metrics.json",
+                    "data/scraping/crawl_metrics_hosts.csv",
+                ),
+            )
+        )
+
+    with RoutedState(states, country_of) as state, RoutedOutput(
+        outputs, country_of
+    ) as output, archives:
+        if not discover:
+            return scrape(list(country_of))
+
+        # Link discovery: a batch of the frontier at a time, lowest depth first
+        stats = []
+        while batch := frontier.next_batch(batch_size):
+            asyncio.run(frontier.robots.load([url for url, _, _ in batch]))
+            depth_of, urls_to_do, urls_deferred = {}, [], []
+            for url, country, depth in batch:
+                depth_of[url] = depth
+                country_of.setdefault(url, country)
+                if frontier.robots.unreachable(url):
+                    # tried again in the next run (a few times)
+                    if states[country].deferrals(url) + 1 >= deferrals_max:
+                        states[country].mark_error(url, "robots_unreachable")
+                    else:
+                        states[country].mark_deferred(url, "robots_unreachable")
+                        urls_deferred.append(url)
+                elif not frontier.robots.allowed(url):
+                    states[country].mark_error(url, "robots")
+            frontier.defer(urls_deferred)
+            for country in countries:
+                urls = [
+                    url
+                    for url, c, _ in batch
+                    if c == country and frontier.robots.allowed(url)
+                ]
+                urls = states[country].filter_todo(urls)
+                urls_to_do += filter_duplicates(urls, seen, states[country])
+            print(f"Frontier batch: {len(urls_to_do)} urls to scrape")
+
+            def on_links(url, links):
+                frontier.add(links, country_of[url], depth_of[url] + 1)
+
+            stats.append(scrape(urls_to_do, on_links))
+            # urls of hosts that were down stay queued for the next run
+            frontier.defer(stats[-1].urls_deferred)
+            frontier.finish_batch(batch)
+
+        frontier.close()
+
+    return stats
+
+
+def reextract_countries(
+    countries,
+    parser="bs4",
+    parse_workers=None,
+    output_format="csv",
+    dedup=True,
+    directory="data/scraping/reextracted",
+):
+    """
+    Extracts the texts again from the archived raw responses (no network).
 
+    Every country's archive (see the `archive` option of
+    `extract_texts_from_countries`) is parsed on all cores with the current
+    extraction rules. The results go to `directory` in the same layout as the
+    crawl (<country>/scraped_data.csv or parquet/), so they can be read with
+    scraping.dataset.scan_scraped_data(country, directory).
 
-data, data_errors = extract_texts_from_urls(country="India")
+    Every run is written to a staging folder first and then replaces the
+    output of the previous run of the country (in both formats), so running
+    it again doesn't append the rows a second time.
+    """
+    stats = {}
+    staging = f"{directory}/.staging"
+    for country in countries:
+        shutil.rmtree(staging, ignore_errors=True)  # left by a crash
+        with open_output(country, output_format, staging) as output:
+            stats[country] = reextract_archive(
+                f"data/scraping/{country}/archive",
+                output,
+                parser=parser,
+                parse_workers=parse_workers,
+                dedup=TextDedup() if dedup and output.keeps_references else None,
+            )
+        for path in [
+            country,
+            f"parquet/scraped_data/country={country}",
+            f"parquet/scraped_data_errors/country={country}",
+        ]:
+            replace_dir(f"{staging}/{path}", f"{directory}/{path}")
+        shutil.rmtree(staging)
+    return stats
+
+
+def extract_texts_from_urls(country="Germany", sample_num=0, **kwargs):
+    """
+    Extracts html text from the urls of a single country (see
+    `extract_texts_from_countries` for the arguments).
+    """
+    return extract_texts_from_countries([country], sample_num, **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Scrape the texts of the university urls of several countries."
+    )
+    parser.add_argument(
+        "countries", nargs="+", help="country folders in data/scraping, e.g. India"
+    )
+    parser.add_argument(
+        "--sample", type=int, default=0, help="random urls per country (0 for all)"
+    )
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--host-concurrency", type=int, default=2)
+    parser.add_argument("--host-delay", type=float, default=1.0)
+    parser.add_argument("--parser", default="bs4", choices=["bs4", "lxml"])
+    parser.add_argument("--parse-workers", type=int, default=None)
+    parser.add_argument("--output-format", default="csv", choices=["csv", "parquet"])
+    parser.add_argument("--no-dedup", action="store_true")
+    parser.add_argument(
+        "--pdf-workers", type=int, default=2, help="PDF processes (0 skips PDFs)"
+    )
+    parser.add_argument(
+        "--archive", action="store_true", help="keep the raw responses (WARC)"
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="scrape done urls again, write just changed pages as a snapshot",
+    )
+    parser.add_argument(
+        "--discover",
+        action="store_true",
+        help="follow links from the university homepages instead of url lists",
+    )
+    parser.add_argument("--depth-max", type=int, default=3)
+    parser.add_argument("--pages-max", type=int, default=1000)
+    parser.add_argument(
+        "--reextract",
+        action="store_true",
+        help="extract the texts again from the archives, without fetching",
+    )
+    args = parser.parse_args()
+
+    if args.reextract:
+        stats = reextract_countries(
+            args.countries,
+            parser=args.parser,
+            parse_workers=args.parse_workers,
+            output_format=args.output_format,
+            dedup=not args.no_dedup,
+        )
+        sys.exit()
+
+    stats = extract_texts_from_countries(
+        args.countries,
+        sample_num=args.sample,
+        concurrency=args.concurrency,
+        host_concurrency=args.host_concurrency,
+        host_delay=args.host_delay,
+        parser=args.parser,
+        parse_workers=args.parse_workers,
+        output_format=args.output_format,
+        dedup=not args.no_dedup,
+        archive=args.archive,
+        refresh=args.refresh,
+        discover=args.discover,
+        depth_max=args.depth_max,
+        pages_max=args.pages_max,
+        pdf_workers=args.pdf_workers,
+    )
 
 
-# TODO indexing urls to save storage space ? necessary ?
 # TODO check redirected urls for patterns: just "full" redirects
 
 # TODO clean final results from cookie consent texts
@@ -1,61 +1,156 @@
+import os
+
 import polars as pl
-import tldextract
+
+from scraping.neardup import NearDuplicateIndex
+from scraping.plans import check_native
+from scraping.storage import (
+    compact_store,
+    domain_partitions,
+    partition_filter,
+    scan_store_texts,
+    scan_store_urls,
+)
 
 # TODO list of URLs: remove ?.*
 
 
-# helper function: extract the domain from a given url
-def extract_domain(url):
-    extracted = tldextract.extract(url)
-    return f"{extracted.domain}.{extracted.suffix}"
+# 1. load and prepare data (normalized store: urls and domains stored once)
+countries = {"Germany": "ger", "USA": "usa", "UK": "uk", "India": "ind"}
+rows_max = 250_000  # text rows per partition (bounds the memory)
+words_min = 10  # shorter texts (and headings, titles) aren't near duplicates
 
+file_clean = "data/scraping/data_scraped_all_clean.csv"
+file_near_duplicates = "data/scraping/near_duplicates.csv"
 
-# 1. load and prepare data
-countries = {"Germany": "ger", "USA": "usa", "UK": "uk", "India": "ind"}
+# rows scraped since the last run are moved into the store (their csv and
+# parquet files are deleted), the store is the only copy of the scraped texts
+print(f"Moved {compact_store(list(countries))} scraped files into the store")
+
+urls = scan_store_urls()
+
+texts = (
+    # 1. text rows of all countries (in url order, with url and domain ids)
+    scan_store_texts().with_columns(pl.col("country").replace_strict(countries))
+    # keep just valid urls
+    .join(urls.filter(pl.col("url").str.contains(r"^http")), on="url_id", how="semi")
+)
+
+# all cleaning steps are scoped to a domain (references, dedup, order), so the
+# texts are cleaned per partition of whole domains; the partitions are in the
+# order of the final sort (country, domain), appending them keeps it
+partitions = domain_partitions(
+    rows_max, key=[pl.col("country").replace_strict(countries)]
+)
 
-data_countries = [
-    pl.scan_csv(f"data/scraping/{country}/scraped_data.csv").with_columns(
-        pl.lit(code).alias("country")
+
+def clean(texts, urls):
+    """
+    Returns the query cleaning the text rows of whole domains (`urls`: at least
+    the urls of these domains).
+    """
+    # texts repeated within a domain are references (null text) to a stored text
+    is_removed = pl.col("text").str.contains(r"(?i)cookies") | pl.col(
+        "text"
+    ).str.contains(r"No title")
+    removed = (
+        texts.filter(pl.col("text").is_not_null() & pl.col("text_hash").is_not_null())
+        .select("domain_id", "text_hash", removed=is_removed)
+        .unique(subset=["domain_id", "text_hash"])
     )
-    for country, code in countries.items()
-]
-
-querry = (
-    pl
-    # 1. combine the dataframes (append rows)
-    .concat(data_countries, how="vertical")
-    # 2. filter all text elements (keep just valid urls; remove cookies & no title)
-    .filter(pl.col("url").str.contains(r"^http"))
-    .filter(~pl.col("text").str.contains(r"(?i)cookies"))
-    .filter(~pl.col("text").str.contains(r"No title"))
-    # 3. remove unnecessary whitespace
-    .with_columns(pl.col("text").str.strip_chars().str.replace_all(r"\s+", " "))
-    # 4. add column: # of words
-    .with_columns(
-        pl.col("text")
-        .str.split(" ")
-        .map_elements(lambda lst: len(lst), return_dtype=pl.Int64)
-        .alias("text_words")
+
+    querry = (
+        texts.join(
+            removed, on=["domain_id", "text_hash"], how="left", maintain_order="left"
+        )
+        # 2. filter all text elements (remove cookies & no title, references like
+        # their stored text)
+        .filter(~pl.coalesce(is_removed, "removed"))
+        # 3. add order of text elements per url
+        .with_columns((pl.cum_count("url_id").over("url_id") + 1).alias("order"))
+        # 4. drop references (repeats of a stored text of the same domain)
+        .filter(pl.col("text").is_not_null())
+        # 5. remove unnecessary whitespace
+        .with_columns(pl.col("text").str.strip_chars().str.replace_all(r"\s+", " "))
+        # 6. add column: # of words
+        .with_columns(text_words=pl.col("text").str.split(" ").list.len())
+        # 7. keep just unique text elements per domain, the first one in url
+        # order (domain_id: extracted once per url when building the store)
+        .unique(subset=["domain_id", "text"], keep="first", maintain_order=True)
+        # 8. restore order of text elements per url (ids are in domain and url
+        # order)
+        .sort(["country", "domain_id", "url_id", "order"])
+        # 9. add url and domain strings, remove urls containing "datenschutz"
+        .join(
+            urls.select("url_id", "url", "url_redirect", "domain"),
+            on="url_id",
+            how="left",
+            maintain_order="left",
+        )
+        .filter(~pl.col("url").str.contains(r"(?i)datenschutz"))
+        # 10. remove all text elements with text_length greater than 4000
+        # characters
+        .filter(pl.col("text_length") < 4000)
+        .select(
+            "text",
+            "text_length",
+            "tag",
+            "url",
+            "url_redirect",
+            "country",
+            "text_words",
+            "domain",
+            "order",
+        )
+    )
+    return querry
+
+
+# one partition in memory at a time (the url filter is pushed down to the
+# parquet scan, which reads just the row groups of the partition's url ids),
+# appended to the csv file in sort order; the near duplicate index gets the
+# texts of each partition (its signatures and band keys go to a temporary
+# folder next to the data, not into memory)
+index = NearDuplicateIndex(directory="data/scraping")
+with open(f"{file_clean}.tmp", "w", encoding="utf-8") as file:
+    for i, (_, part) in enumerate(partitions.group_by("part", maintain_order=True)):
+        in_part = partition_filter(part["url_id"])
+        querry = clean(texts.filter(in_part), urls.filter(in_part))
+        if i == 0:
+            # native expressions only (no map_elements), see scraping.plans
+            check_native(querry, "cleaning query")
+        data_clean = querry.collect()
+        data_clean.write_csv(file, include_header=i == 0)
+        index.add(
+            data_clean["text"],
+            include=~data_clean["tag"].str.contains(r"^(?:h[1-6]|title)$")
+            & (data_clean["text_words"] >= words_min),
+        )
+
+# 11. keep one text of each cluster of near duplicates (within and across
+# domains), the first in sort order; the others are written with the
+# cluster_id of their representative, so labels can be fanned back out (see
+# scraping.neardup.fan_out)
+with index:
+    clusters = index.clusters()
+data_clean = (
+    pl.scan_csv(f"{file_clean}.tmp", infer_schema=False)
+    .with_row_index("text_id")
+    .join(
+        clusters.lazy().cast({"text_id": pl.UInt32}),
+        on="text_id",
+        how="left",
+        maintain_order="left",
     )
-    # 5. add column: domain
     .with_columns(
-        pl.when(pl.col("url_redirect").is_not_null())
-        .then(pl.col("url_redirect").map_elements(extract_domain, return_dtype=pl.Utf8))
-        .otherwise(pl.col("url").map_elements(extract_domain, return_dtype=pl.Utf8))
-        .alias("domain")
+        is_near_duplicate=pl.col("cluster_id").is_not_null()
+        & (pl.col("cluster_id") != pl.col("text_id"))
     )
-    # 6. add order of text elements per url
-    .with_columns((pl.cum_count("text").over("url") + 1).alias("order"))
-    # 7. keep just unique text elements per domain
-    .unique(subset=["domain", "text"])
-    # 8. restore order of text elements per url
-    .sort(["country", "domain", "url", "order"])
-    # 9. remove urls containing "datenschutz"
-    .filter(~pl.col("url").str.contains(r"(?i)datenschutz"))
-    # 10. remove all text elements with text_length greater than 4000 characters
-    .filter(pl.col("text_length") < 4000)
 )
-
-data_clean = querry.collect()
-
-data_clean.write_csv("data/scraping/data_scraped_all_clean.csv")
+data_clean.filter("is_near_duplicate").select(
+    "cluster_id", "country", "domain", "url", "url_redirect", "order", "text"
+).sink_csv(file_near_duplicates)
+data_clean.filter(~pl.col("is_near_duplicate")).drop(
+    "text_id", "is_near_duplicate"
+).sink_csv(file_clean)
+os.remove(f"{file_clean}.tmp")
@@ -1,108 +1,95 @@
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import polars as pl
-import ftfy
-
-
-replacement_dict = {
-    "√§": "ä",  #
-    "ГӨ": "ä",  #
-    "Ă¤": "ä",  #
-    "ÃĊ": "ä",  #
-    "ΟΛ": "ä",  #
-    "ûÊ": "ä",  #
-    "УЄ": "ä",  #
-    "ÃĪ": "ä",  #
-    "Ã€": "ä",  #
-    "Ã¤": "ä",  #
-    "├ż": "ä",  #
-    "Ć¤": "ä",  #
-    "√∂": "ö",  #
-    "Ă¶": "ö",  #
-    "ΟΕ": "ö",  #
-    "ûÑ": "ö",  #
-    "УЖ": "ö",  #
-    "Ãķ": "ö",  #
-    "Г¶": "ö",  #
-    "├Č": "ö",  #
-    "Ć¶": "ö",  #
-    "√ľ": "ü",  #
-    "Гј": "ü",  #
-    "ĂĽ": "ü",  #
-    "Ãỳ": "ü",  #
-    "УМ": "ü",  #
-    # 'û': 'ü', #
-    "ΟΦ": "ü",  #
-    "û¥": "ü",  #
-    "Ãž": "ü",  #
-    "ÃŒ": "ü",  #
-    "Ã¼": "ü",  #
-    "├╝": "ü",  #
-    "uМҲ": "ü",  #
-    "uäˆ": "ü",  #
-    "Ć¼": "ü",  #
-    "√Ą": "Ä",  #
-    "Ã": "Ä",  #
-    'Ã""': "Ä",  #
-    'û""': "Ä",  #
-    "√Ė": "Ö",  #
-    "Ã¶": "Ö",  #
-    "Ã": "Ö",  #
-    "Ã–": "Ö",  #
-    "Ć": "Ö",  #
-    "√ú": "Ü",
-    "Ăś": "Ü",  # Übersicht
-    "├£": "Ü",  #
-    "Ã": "Ü",  #
-    "Гң": "Ü",  #
-    "Ο€": "Ü",  #
-    "ûœ": "Ü",  #
-    "Ãœ": "Ü",  #
-    "Ć": "Ü",  #
-    "√ü": "ß",  #
-    "Гҹ": "ß",  #
-    "Οü": "ß",  #
-    "ûŸ": "ß",  #
-    "УЖ": "ß",  #
-    "ÃŸ": "ß",  #
-    "Ã": "ß",  #
-    "├¤": "ß",  #
-    "У": "ß",  #
-    "Ć": "ß",  #
-    # 'û': 'ß', #
-    "‚Äě": " ",  #
-    "вҖһ": " ",  #
-    "‚Äú": " ",  #
-    "вҖ“": " ",  #
-    "â€": " ",  #
-    "'Äě": " ",  #
-    "'Äú": " ",  #
-    "'Äď": " ",  #
-    "'Äô": " ",  #
-    "'Äö": " ",  #
-    "'Äė": " ",  #
-    "'Ä¶": " ",  #
-}
-
-# Ã 149
-
-
-def correct_umlaute(text):
-    # Ensure the input is a string for replacement operation
-    if isinstance(text, str):
-
-        text = ftfy.fix_text(text)
-
-        for wrong, right in replacement_dict.items():
-            text = text.replace(wrong, right)
-
-    return text
-
-
-data_ger = pl.scan_csv("data/scraping/Germany/scraped_data.csv")
-
-querry = data_ger.with_columns(
-    pl.col("text").map_elements(lambda t: correct_umlaute(t), return_dtype=pl.Utf8)
-).with_columns(pl.col("text").str.replace_all(r"Maönahme", "Maßnahme"))
-
-data_ger = querry.collect()
-
-data_ger.write_csv("data/scraping/Germany/scraped_data.csv")
+
+from scraping.output import schema_texts, write_parquet_atomic
+from scraping.umlaute import repair_texts
+
+
+# Repairs broken umlauts in the scraped texts of Germany, incrementally: the
+# scraper only appends to scraped_data.csv and adds parquet parts, so the state
+# file keeps how far the csv file and which parts are repaired already, and
+# only new rows are read, repaired and written back. Run it when the scraper
+# isn't writing (the csv file has to end with a complete row).
+
+
+def load_state(file):
+    if not os.path.isfile(file):
+        return {"csv_bytes": 0, "parts": []}
+    with open(file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state, file):
+    with open(f"{file}.tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(f"{file}.tmp", file)
+
+
+def repair_csv(file, start, executor):
+    """
+    Repairs the rows of a csv file after byte `start` (0: all rows) in place.
+
+    Returns the size of the file, where the next run starts.
+    """
+    with open(file, "rb") as f:
+        header = f.readline()
+        if start > os.path.getsize(file):
+            start = 0  # the file was written anew
+        start = max(start, f.tell())
+        f.seek(start)
+        tail = f.read()
+    if not tail.strip():
+        return start + len(tail)
+
+    # all columns as strings, so all but the text are written back as read
+    data = pl.read_csv(io.BytesIO(header + tail), infer_schema=False)
+    texts = repair_texts(data["text"], executor)
+    if not texts.equals(data["text"]):
+        with open(file, "r+b") as f:
+            f.seek(start)
+            f.truncate()
+            data.with_columns(texts).write_csv(f, include_header=False)
+    return os.path.getsize(file)
+
+
+def repair_parts(directory, parts_done, executor):
+    """
+    Repairs the parquet parts in `directory` not in `parts_done` (each one is
+    replaced if a text changed). Returns the names of all repaired parts.
+    """
+    if not os.path.isdir(directory):
+        return parts_done
+    parts_done = set(parts_done)
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".parquet") or name in parts_done:
+            continue
+        data = pl.read_parquet(f"{directory}/{name}")
+        texts = repair_texts(data["text"], executor)
+        if not texts.equals(data["text"]):
+            table = data.with_columns(texts).to_arrow().cast(schema_texts)
+            write_parquet_atomic(table, directory, name)
+        parts_done.add(name)
+    return sorted(parts_done)
+
+
+def repair_country(country, directory="data/scraping", workers=os.cpu_count()):
+    file_state = f"{directory}/{country}/umlaute_repaired.json"
+    state = load_state(file_state)
+    with ProcessPoolExecutor(workers) as executor:
+        file_csv = f"{directory}/{country}/scraped_data.csv"
+        if os.path.isfile(file_csv):
+            state["csv_bytes"] = repair_csv(file_csv, state["csv_bytes"], executor)
+        state["parts"] = repair_parts(
+            f"{directory}/parquet/scraped_data/country={country}",
+            state["parts"],
+            executor,
+        )
+    save_state(state, file_state)
+
+
+if __name__ == "__main__":
+    repair_country("Germany")
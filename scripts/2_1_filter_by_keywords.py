@@ -1,5 +1,8 @@
 import polars as pl
-import xlsxwriter
+
+from scraping.export import export, write_workbooks
+from scraping.keyword_index import KeywordIndex, text_key
+from scraping.keywords import KeywordMatcher
 
 # 1. filter all text elements by diviersity keywords -> get unique urls
 # 2. keep all text elements from filteres urls
@@ -42,10 +45,24 @@ with open("data/keywords_strict.txt", "r", encoding="utf-8") as f:
 with open("data/keywords_compound.txt", "r", encoding="utf-8") as f:
     keywords_compound = [line.strip() for line in f if line.strip()]
 
-pattern_strict = r"\b(?:" + "|".join(keywords_strict) + r")\b"
-pattern_compound = r"\w*(?:" + "|".join(keywords_compound) + r")\w*"
-
-pattern = f"(?i){pattern_strict}|{pattern_compound}"
+# whole words for strict keywords, the whole word around compound keywords (an
+# Aho-Corasick automaton with the same matches as the regex, see
+# scraping.keywords)
+matcher = KeywordMatcher(keywords_strict, keywords_compound)
+
+# inverted index of the words of the cleaned texts (new texts are added): just
+# the texts it returns for the keyword lists can have keywords
+index = KeywordIndex()
+print(f"Texts added to keyword index: {index.update(data_clean['text'])}")
+candidates = index.candidates(keywords_strict, keywords_compound)
+texts_keywords = data_clean.select(pl.col("text").unique())
+if candidates is not None:
+    texts_keywords = texts_keywords.filter(
+        text_key(pl.col("text")).is_in(candidates.implode())
+    )
+texts_keywords = texts_keywords.with_columns(
+    keywords=matcher.expr(pl.col("text").str.to_lowercase())
+)
 
 
 data_prepare_filtering = (
@@ -53,9 +70,11 @@ data_prepare_filtering = (
     # remove page title rows
     .filter(~pl.col("tag").str.contains(r"title"))
     # keep just unique text elements per url
-    .unique(subset=["url", "text"]).sort(["country", "domain", "url", "order"])
+    .unique(subset=["url", "text"])
+    .sort(["country", "domain", "url", "order"])
     # extract and mark all keywords included in the text elements
-    .with_columns(keywords=pl.col("text").str.to_lowercase().str.extract_all(pattern))
+    .join(texts_keywords, on="text", how="left", maintain_order="left")
+    .with_columns(pl.col("keywords").fill_null(pl.lit([], pl.List(pl.Utf8))))
     # add indicators for heading and correct order
     .with_columns(
         is_heading=pl.col("tag").str.contains("h[1-6]"),
@@ -95,7 +114,7 @@ data_prepare_filtering = (
     .with_columns(keywords=pl.col("keywords").list.unique())
 )
 
-# write prepared data to excel
+# prepared data to excel (one sheet per country, written at the end)
 countries = {
     "ger": "Germany",
     "usa": "USA",
@@ -103,14 +122,13 @@ countries = {
     "ind": "India",
 }
 
-with xlsxwriter.Workbook("data/data_prepare_filtering.xlsx") as workbook:
-    for code, sheet in countries.items():
-        (
-            data_prepare_filtering.filter(pl.col("country") == code)
-            .select(["keywords", "text", "domain"])
-            .with_columns(keywords=pl.col("keywords").list.join(", "))
-            .write_excel(workbook=workbook, worksheet=sheet)
-        )
+workbooks = export(
+    data_prepare_filtering,
+    "data/data_prepare_filtering.xlsx",
+    by="country",
+    names=countries,
+    columns=["keywords", "text", "domain"],
+)
 
 
 data_filtered = (
@@ -120,7 +138,7 @@ data_filtered = (
         pl.col("keywords").list.len() >= 2,
         ~pl.col("is_heading"),
         ~pl.col("remove_following"),
-    ).select(["keywords", "text", "country", "domain", "url"])
+    ).select(["keywords", "text", "country", "domain", "url", "cluster_id"])
     # cast list of keywords to string
     .with_columns(keywords=pl.col("keywords").list.join(", "))
 )
@@ -131,19 +149,19 @@ print_data_info(data_filtered)
 # Number of unique domains: 789 764 (721)
 # Mean rows per url: 1.77 1.76 (1.73)
 
-data_filtered.write_csv("data/data_filtered.csv")
-
 
 # export all text with excatlcy one keyword or at least two different for check
+# (with data_filtered.csv)
+
+workbooks |= export(
+    data_filtered,
+    "data/data_filtered.xlsx",
+    by=pl.when(pl.col("keywords").str.split(", ").list.len() == 1)
+    .then(pl.lit("keyword_1"))
+    .when(pl.col("keywords").str.split(", ").list.unique().list.len() >= 2)
+    .then(pl.lit("keyword_2+")),
+    names={"keyword_1": "keyword_1", "keyword_2+": "keyword_2+"},
+    csv="data/data_filtered.csv",
+)
 
-with xlsxwriter.Workbook("data/data_filtered.xlsx") as workbook:
-    (
-        data_filtered.filter(
-            pl.col("keywords").str.split(", ").list.len() == 1
-        ).write_excel(workbook=workbook, worksheet="keyword_1")
-    )
-    (
-        data_filtered.filter(
-            pl.col("keywords").str.split(", ").list.unique().list.len() >= 2
-        ).write_excel(workbook=workbook, worksheet="keyword_2+")
-    )
+write_workbooks(workbooks, processes=2)
@@ -1,35 +1,26 @@
-import polars as pl
-import langdetect
-from langdetect.lang_detect_exception import LangDetectException
+import os
+from concurrent.futures import ProcessPoolExecutor
 
+import polars as pl
 
-def detect_language(text: str) -> str:
-    """
-    Detects the language of a given text.
-    Returns 'english', 'german', 'Other', or 'Error'.
-    """
-    # Handle empty or invalid input
-    if not text or not isinstance(text, str) or text.isspace():
-        return "Other"
+from scraping.language import detect_languages
 
-    try:
-        lang = langdetect.detect(text)
-        if lang == "en":
-            return "eng"
-        elif lang == "de":
-            return "ger"
-        else:
-            return "Other"
-    except LangDetectException:
-        # This exception is thrown for texts that are too short or ambiguous
-        return "Error"
+# languages of earlier runs by text hash (just new texts are detected)
+file_cache = "data/language_cache.parquet"
 
 
-data_filtered = pl.read_csv("data/data_filtered.csv").with_columns(
-    language=pl.col("text").map_elements(detect_language, return_dtype=pl.Utf8)
-)
+if __name__ == "__main__":
+    # the detection runs on worker processes, which import this script again
+    # on Windows, hence the main guard
+    data_filtered = pl.read_csv("data/data_filtered.csv")
 
+    with ProcessPoolExecutor(os.cpu_count()) as executor:
+        data_filtered = data_filtered.with_columns(
+            language=detect_languages(
+                data_filtered["text"], executor, file_cache=file_cache
+            )
+        )
 
-data_filtered.filter(pl.col("language").is_in(["eng", "ger"])).write_csv(
-    "data/data_filtered_language.csv"
-)
+    data_filtered.filter(pl.col("language").is_in(["eng", "ger"])).write_csv(
+        "data/data_filtered_language.csv"
+    )
@@ -1,5 +1,8 @@
 import polars as pl
 
+from scraping.export import export, write_workbooks
+from scraping.neardup import fan_out
+
 # 1. combine language specific classified data
 data_results_eng = pl.read_csv("data/classification/data_results_v9_eng.csv")
 data_results_ger = pl.read_csv("data/classification/data_results_v9_ger.csv")
@@ -10,10 +13,20 @@ data_results.write_csv("data/data_classified.csv")
 
 
 # 2. combine classified and filtered data
-data_filtered = pl.read_csv("data/data_filtered_language.csv")
+data_filtered = pl.read_csv(
+    "data/data_filtered_language.csv", schema_overrides={"cluster_id": pl.Int64}
+)
 
 data_aggregated = (
     pl.concat([data_filtered, data_results], how="horizontal")
+    # count the labels of representatives also for their near duplicates
+    .pipe(
+        fan_out,
+        pl.read_csv(
+            "data/scraping/near_duplicates.csv",
+            schema_overrides={"cluster_id": pl.Int64},
+        ),
+    )
     # set prediction to NULL of probability < 0.5
     .with_columns(
         token_1=pl.when(pl.col("linprob_1") <= 50)
@@ -45,5 +58,10 @@ data_aggregated = (
     )
 )
 
-data_aggregated.write_excel("data/classifications_aggregated.xlsx")
-data_aggregated.write_csv("data/classifications_aggregated.csv")
+write_workbooks(
+    export(
+        data_aggregated,
+        "data/classifications_aggregated.xlsx",
+        csv="data/classifications_aggregated.csv",
+    )
+)
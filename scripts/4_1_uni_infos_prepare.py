@@ -1,10 +1,6 @@
 import polars as pl
-import tldextract
 
-
-def extract_domain(url):
-    extracted = tldextract.extract(url)
-    return f"{extracted.domain}.{extracted.suffix}"
+from scraping.domains import domain_expr
 
 
 # define names
@@ -71,7 +67,7 @@ for country in ["ger", "usa", "uk", "ind"]:
         pl.read_excel(f"data/uni_infos/university_infos_{country}.xlsx")
         .pipe(lambda d: d.rename({old: new for old, new in zip(d.columns, cols)}))
         .with_columns(
-            domain=pl.col("url").map_elements(extract_domain, return_dtype=pl.Utf8),
+            domain=domain_expr("url"),
             country=pl.lit(country),
             elite=(
                 pl.col("elite")
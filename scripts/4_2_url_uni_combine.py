@@ -1,12 +1,11 @@
 import pandas as pd
 import pickle
-import tldextract
+import polars as pl
 
-
-# helper function: extract the domain from a given url
-def extract_domain(url):
-    extracted = tldextract.extract(url)
-    return f"{extracted.domain}.{extracted.suffix}"
+from scraping.dataset import scan_scraped_errors
+from scraping.domains import extract_domains
+from scraping.export import export, write_workbooks
+from scraping.storage import scan_store_texts, scan_store_urls
 
 
 # 1. get list of all start urls from pickle files and number of texts scraped
@@ -19,29 +18,32 @@ for country in ["USA", "UK", "India", "Germany"]:
     print(f"Country: {country}")
 
     path_urls = f"data/scraping/{country}/homepage_urls_{country.lower()}.pkl"
-    path_scraped = f"data/scraping/{country}/scraped_data.csv"
-    path_errors = f"data/scraping/{country}/scraped_data_errors.csv"
 
     # Load the pickle file (assuming it's a list of URLs)
     with open(path_urls, "rb") as file:
         urls_all = pickle.load(file)
 
-    # Load csv file with scraped data
-    with open(path_scraped, "rb") as file:
-        urls_scraped = (
-            pd.read_csv(file)
-            .groupby("url", as_index=False)
-            .agg(texts_all=("text", "count"))
-        )
+    # Load scraped data (normalized store, just the url ids) and count texts per
+    # url
+    urls_scraped = (
+        scan_store_texts()
+        .filter(pl.col("country") == country)
+        .group_by("url_id")
+        .agg(texts_all=pl.len())  # references (null text) count as texts too
+        .join(scan_store_urls().select("url_id", "url"), on="url_id")
+        .group_by("url")
+        .agg(pl.col("texts_all").sum())
+        .collect()
+        .to_pandas()
+    )
 
-    # Load csv file with errors
-    with open(path_errors, "rb") as file:
-        urls_errors = pd.read_csv(file)
+    # Load errors
+    urls_errors = scan_scraped_errors(country).collect().to_pandas()
 
     # Convert list to DataFrame and add a 'country' column
     df_temp = pd.DataFrame(urls_all, columns=["url"])
     df_temp["country"] = country.lower()
-    df_temp["domain"] = df_temp["url"].map(extract_domain)
+    df_temp["domain"] = extract_domains(df_temp["url"])
 
     # merge scraped by url
     df_temp = pd.merge(df_temp, urls_scraped, how="left", on="url")
@@ -104,4 +106,6 @@ data_uni_classified_infos = data_uni_classified.merge(
 ).dropna(subset=["name"])
 
 data_uni_classified_infos.to_csv("data/uni_classified_infos.csv", sep=";", index=False)
-data_uni_classified_infos.to_excel("data/uni_classified_infos.xlsx", index=False)
+write_workbooks(
+    export(pl.from_pandas(data_uni_classified_infos), "data/uni_classified_infos.xlsx")
+)
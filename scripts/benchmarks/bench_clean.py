@@ -0,0 +1,89 @@
+"""
+Benchmark of the partitioned 1_2 cleaning (peak memory vs corpus size).
+
+For synthetic corpora of growing size (benchmarks/corpus.py) the store is
+built once, then the cleaning plan runs in a fresh process twice: collected
+as one query over the whole store, and per partition of whole domains (as
+1_2_scrape_clean_data.py does) with the results appended to a csv file:
+
+    python scripts/benchmarks/bench_clean.py --urls 5000 10000 20000 40000
+
+The peak RSS of the single query grows with the corpus, the partitioned one
+with `--rows-max` (text rows per partition).
+"""
+
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import polars as pl  # noqa: E402
+
+from bench_storage import clean_store, clean_texts, run_isolated  # noqa: E402
+from corpus import countries, make_scraped_corpus  # noqa: E402
+from scraping.storage import (  # noqa: E402
+    build_store,
+    domain_partitions,
+    partition_filter,
+    scan_store_texts,
+    scan_store_urls,
+)
+
+
+class Rows:
+    # result of `clean_partitioned` for run_isolated (just the row count)
+    def __init__(self, height):
+        self.height = height
+
+
+def clean_partitioned(args):
+    # as 1_2_scrape_clean_data.py: one partition of whole domains at a time
+    store_dir, rows_max = args
+    urls = scan_store_urls(store_dir)
+    texts = scan_store_texts(store_dir).join(
+        urls.filter(pl.col("url").str.contains(r"^http")), on="url_id", how="semi"
+    )
+    partitions = domain_partitions(rows_max, store_dir=store_dir)
+    rows = 0
+    with open(f"{store_dir}/clean.csv", "w", encoding="utf-8") as file:
+        for i, (_, part) in enumerate(partitions.group_by("part", maintain_order=True)):
+            in_part = partition_filter(part["url_id"])
+            data_clean = clean_texts(
+                texts.filter(in_part), urls.filter(in_part)
+            ).collect()
+            data_clean.write_csv(file, include_header=i == 0)
+            rows += data_clean.height
+    return Rows(rows)
+
+
+def main(args):
+    print(f"{'urls':>8} {'rows':>9} | {'query':>16} | {'partitioned':>16}")
+    for urls_num in args.urls:
+        with tempfile.TemporaryDirectory() as tmp:
+            make_scraped_corpus(f"{tmp}/scraping", urls_num, args.rows)
+            build_store(list(countries), f"{tmp}/scraping", f"{tmp}/store")
+
+            results = []
+            for func, arg in [
+                (clean_store, f"{tmp}/store"),
+                (clean_partitioned, (f"{tmp}/store", args.rows_max)),
+            ]:
+                rows, seconds, rss = run_isolated(func, arg)
+                results.append(f"{rss:>6.0f} MB {seconds:>5.1f}s")
+            print(
+                f"{urls_num * len(countries):>8} {rows:>9} | {results[0]} | {results[1]}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--urls", type=int, nargs="+", default=[5000, 10000, 20000, 40000]
+    )
+    parser.add_argument("--rows", type=int, default=10, help="rows per url")
+    parser.add_argument(
+        "--rows-max", type=int, default=250_000, help="text rows per partition"
+    )
+    main(parser.parse_args())
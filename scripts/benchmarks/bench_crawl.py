@@ -0,0 +1,74 @@
+"""
+Offline throughput benchmark of the scraping pipeline.
+
+Starts the local test server and scrapes it with the same pipeline as
+1_1_scrape_texts_by_country.py (fetch, parse, write), once sequentially (one
+request and one parser at a time, like the old requests.get loop) and once with
+the concurrent settings:
+
+    python scripts/benchmarks/bench_crawl.py --hosts 20 --pages 50 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from scraping.output import CsvOutput  # noqa: E402
+from scraping.pipeline import run_pipeline  # noqa: E402
+from scraping.state import CrawlState  # noqa: E402
+from test_server import make_urls, start_test_server  # noqa: E402
+
+
+async def run(urls, outdir, **pipeline_args):
+    file_good = os.path.join(outdir, "scraped_data.csv")
+    file_bad = os.path.join(outdir, "scraped_data_errors.csv")
+    with CrawlState(os.path.join(outdir, "crawl_state.sqlite")) as state:
+        with CsvOutput(file_good, file_bad) as output:
+            stats = await run_pipeline(
+                urls, output, state, report_every=0, **pipeline_args
+            )
+    return stats.written - stats.errors, stats.seconds()
+
+
+async def main(args):
+    runner, base_urls = await start_test_server(args.hosts, args.port, args.latency)
+    urls = make_urls(base_urls, args.pages)
+    settings = {
+        "sequential": dict(
+            concurrency=1, host_concurrency=1, host_delay=0, parse_workers=1
+        ),
+        "concurrent": dict(
+            concurrency=args.concurrency,
+            host_concurrency=args.host_concurrency,
+            host_delay=args.host_delay,
+            parse_workers=args.parse_workers,
+        ),
+    }
+    try:
+        for name, pipeline_args in settings.items():
+            with tempfile.TemporaryDirectory() as outdir:
+                pages, seconds = await run(urls, outdir, **pipeline_args)
+            print(
+                f"{name:>10}: {pages} pages in {seconds:.2f}s "
+                f"({pages / seconds:.1f} pages/s)"
+            )
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=50, help="pages per host")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--host-concurrency", type=int, default=2)
+    parser.add_argument("--host-delay", type=float, default=0.0)
+    parser.add_argument("--parse-workers", type=int, default=None)
+    asyncio.run(main(parser.parse_args()))
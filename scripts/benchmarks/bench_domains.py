@@ -0,0 +1,71 @@
+"""
+Benchmark of the domain extraction (scraping.domains).
+
+Compares tldextract called for every text row (map_elements, as the cleaning
+and aggregation scripts did) with the column resolver that looks up every
+distinct url once and every host once:
+
+    python scripts/benchmarks/bench_domains.py --urls 25000
+
+A synthetic corpus (benchmarks/corpus.py) is written to a temporary folder
+unless --data points to an existing data/scraping folder.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import polars as pl  # noqa: E402
+import tldextract  # noqa: E402
+
+from corpus import countries, make_scraped_corpus  # noqa: E402
+from scraping.dataset import scan_scraped_data  # noqa: E402
+from scraping.domains import domain_expr, domain_of_host  # noqa: E402
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.data
+        if directory is None:
+            directory = f"{tmp}/scraping"
+            make_scraped_corpus(directory, args.urls, args.rows)
+        urls = pl.concat(
+            [
+                scan_scraped_data(country, directory).select(
+                    url=pl.coalesce("url_redirect", "url")
+                )
+                for country in countries
+            ]
+        ).collect()
+    print(f"{urls.height} rows, {urls['url'].n_unique()} distinct urls")
+
+    # per row, as before (offline suffix list, so no download is timed)
+    extract = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+    def extract_domain(url):
+        extracted = extract(url)
+        return f"{extracted.domain}.{extracted.suffix}"
+
+    time_start = time.perf_counter()
+    per_row = urls.select(
+        domain=pl.col("url").map_elements(extract_domain, return_dtype=pl.Utf8)
+    )
+    print(f"per row (map_elements): {time.perf_counter() - time_start:.2f}s")
+
+    domain_of_host.cache_clear()
+    time_start = time.perf_counter()
+    resolved = urls.select(domain=domain_expr("url"))
+    print(f"column resolver (cold cache): {time.perf_counter() - time_start:.2f}s")
+    print(f"same result: {per_row.equals(resolved)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", default=None, help="existing data/scraping folder")
+    parser.add_argument("--urls", type=int, default=25000, help="urls per country")
+    parser.add_argument("--rows", type=int, default=10, help="rows per url")
+    main(parser.parse_args())
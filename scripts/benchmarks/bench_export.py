@@ -0,0 +1,116 @@
+"""
+Benchmark of the Excel export (scraping.export).
+
+Writes the review workbook of the keyword filter (one sheet per country) and
+a second workbook of a synthetic corpus (benchmarks/corpus.py) like the
+former 2_1 did (a filter and write_excel per sheet, xlsxwriter in memory)
+and with scraping.export (partitioned once, constant memory, serial and with
+--processes workbooks at a time):
+
+    python scripts/benchmarks/bench_export.py --urls 25000
+
+Prints the time of each and, with --memory, the peak of the memory allocated
+by Python (tracemalloc, in a second run: tracing slows down allocations).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import polars as pl  # noqa: E402
+import xlsxwriter  # noqa: E402
+
+from corpus import countries, make_scraped_corpus  # noqa: E402
+from scraping.dataset import scan_scraped_data  # noqa: E402
+from scraping.export import export, write_workbooks  # noqa: E402
+
+
+sheets = {country[:3].lower(): country for country in countries}
+
+
+def write_former(data, directory):
+    with xlsxwriter.Workbook(f"{directory}/countries.xlsx") as workbook:
+        for code, sheet in sheets.items():
+            (
+                data.filter(pl.col("country") == code)
+                .select(["keywords", "text", "domain"])
+                .with_columns(keywords=pl.col("keywords").list.join(", "))
+                .write_excel(workbook=workbook, worksheet=sheet)
+            )
+    with xlsxwriter.Workbook(f"{directory}/tags.xlsx") as workbook:
+        for tag in ["p", "li"]:
+            data.filter(pl.col("tag") == tag).with_columns(
+                keywords=pl.col("keywords").list.join(", ")
+            ).write_excel(workbook=workbook, worksheet=tag)
+
+
+def write_export(data, directory, processes):
+    workbooks = export(
+        data,
+        f"{directory}/countries.xlsx",
+        by="country",
+        names=sheets,
+        columns=["keywords", "text", "domain"],
+    )
+    workbooks |= export(
+        data, f"{directory}/tags.xlsx", by="tag", names={"p": "p", "li": "li"}
+    )
+    write_workbooks(workbooks, processes)
+
+
+def measure(name, function, *args, memory=False):
+    time_start = time.perf_counter()
+    function(*args)
+    print(f"{name}: {time.perf_counter() - time_start:.2f}s")
+    if memory:
+        tracemalloc.start()
+        function(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  peak {peak / 2**20:.0f} MB (Python, this process)")
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        make_scraped_corpus(f"{tmp}/scraping", args.urls, args.rows)
+        data = pl.concat(
+            [
+                scan_scraped_data(country, f"{tmp}/scraping")
+                .select("text", "tag", "url")
+                .with_columns(country=pl.lit(country[:3].lower()))
+                for country in countries
+            ]
+        ).collect()
+    data = data.with_columns(
+        domain=pl.col("url").str.extract(r"//([^/]+)"),
+        keywords=pl.col("text").str.to_lowercase().str.extract_all(r"divers\w*"),
+    )
+    print(f"{data.height} rows")
+    # write_excel turns the urls into links, up to the limit of Excel
+    warnings.filterwarnings("ignore", message="Ignoring URL")
+
+    for name, function, *rest in [
+        ("write_excel per filtered sheet", write_former),
+        ("export (serial)", write_export, 1),
+        (f"export ({args.processes} processes)", write_export, args.processes),
+    ]:
+        with tempfile.TemporaryDirectory() as tmp:
+            measure(name, function, data, tmp, *rest, memory=args.memory)
+            size = sum(os.path.getsize(f"{tmp}/{file}") for file in os.listdir(tmp))
+            print(f"  {size / 2**20:.1f} MB of xlsx")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--urls", type=int, default=25000, help="urls per country")
+    parser.add_argument("--rows", type=int, default=10, help="rows per url")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--memory", action="store_true", help="measure memory")
+    main(parser.parse_args())
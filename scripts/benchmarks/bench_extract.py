@@ -0,0 +1,68 @@
+"""
+Benchmark of the html parser backends in scraping.extract.
+
+Parses a corpus of saved university pages with every backend, prints pages per
+second and checks that each backend yields the same rows as the BeautifulSoup
+reference:
+
+    python scripts/benchmarks/bench_extract.py --pages-dir data/scraping/pages
+
+Without --pages-dir, synthetic pages from the local test server are used.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from scraping.extract import backends, extract_rows  # noqa: E402
+from test_server import make_page  # noqa: E402
+
+
+def load_pages(pages_dir=None, num_pages=500):
+    """
+    Returns a list of (name, raw html) for all .html/.htm files in a folder.
+    """
+    if pages_dir is None:
+        return [
+            (f"synthetic/{i}", make_page(f"synthetic/{i}", 40).encode("utf-8"))
+            for i in range(num_pages)
+        ]
+    files = sorted(
+        f for f in Path(pages_dir).rglob("*") if f.suffix in (".html", ".htm")
+    )
+    return [(str(f), f.read_bytes()) for f in files]
+
+
+def main(args):
+    pages = load_pages(args.pages_dir, args.num_pages)
+    print(f"Pages: {len(pages)} ({sum(len(c) for _, c in pages) / 1e6:.1f} MB)")
+
+    results = {}
+    for backend in backends:
+        time_start = time.perf_counter()
+        for _ in range(args.repeat):
+            rows = [
+                extract_rows(content, name, backend=backend) for name, content in pages
+            ]
+        seconds = (time.perf_counter() - time_start) / args.repeat
+        results[backend] = rows
+        print(f"{backend:>6}: {len(pages) / seconds:8.1f} pages/s")
+
+    reference = results["bs4"]
+    for backend, rows in results.items():
+        differ = [name for (name, _), a, b in zip(pages, reference, rows) if a != b]
+        print(f"{backend:>6}: {len(differ)} pages differ from bs4")
+        for name in differ[: args.show]:
+            print(f"        {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages-dir", default=None)
+    parser.add_argument("--num-pages", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--show", type=int, default=5, help="list differing pages")
+    main(parser.parse_args())
@@ -0,0 +1,96 @@
+"""
+Benchmark of the inverted keyword index (scraping.keyword_index).
+
+Builds the index over the text rows of a synthetic corpus
+(benchmarks/corpus.py), in two updates, and compares re-filtering with the
+keyword lists (index lookup, then the keyword matcher on the candidates) with
+running the matcher on every text:
+
+    python scripts/benchmarks/bench_keyword_index.py --urls 25000 --keywords 400
+
+Checks that every text with keywords is among the candidates of the index.
+The synthetic keywords match most rows of the corpus; with --rare just the
+two phrases of the strict list are kept of the corpus words (in the scraped
+data, few texts have keywords).
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import polars as pl  # noqa: E402
+
+from bench_keywords import make_keywords, read_keywords  # noqa: E402
+from corpus import countries, make_scraped_corpus, words_eng, words_ger  # noqa: E402
+from scraping.dataset import scan_scraped_data  # noqa: E402
+from scraping.keyword_index import KeywordIndex, text_key  # noqa: E402
+from scraping.keywords import KeywordMatcher  # noqa: E402
+
+
+def main(args):
+    if args.strict and args.compound:
+        keywords_strict = read_keywords(args.strict)
+        keywords_compound = read_keywords(args.compound)
+    else:
+        keywords_strict, keywords_compound = make_keywords(args.keywords)
+        if args.rare:
+            # just the phrases and the filler words (which match nothing)
+            keywords_strict = keywords_strict[len(words_eng[::2]) :]
+            keywords_compound = keywords_compound[len(words_ger[::2]) :]
+    matcher = KeywordMatcher(keywords_strict, keywords_compound)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        make_scraped_corpus(f"{tmp}/scraping", args.urls, args.rows)
+        texts = pl.concat(
+            [
+                scan_scraped_data(country, f"{tmp}/scraping").select("text")
+                for country in countries
+            ]
+        ).collect()["text"]
+        print(f"{len(texts)} rows, {texts.n_unique()} unique texts")
+
+        index = KeywordIndex(f"{tmp}/keyword_index")
+        half = len(texts) // 2
+        time_start = time.perf_counter()
+        index.update(texts[:half])
+        print(f"index first half: {time.perf_counter() - time_start:.2f}s")
+        time_start = time.perf_counter()
+        index.update(texts)
+        print(f"index update (second half): {time.perf_counter() - time_start:.2f}s")
+        time_start = time.perf_counter()
+        index.update(texts)
+        print(f"index update (nothing new): {time.perf_counter() - time_start:.2f}s")
+
+        time_start = time.perf_counter()
+        matched = matcher.extract_all(texts.str.to_lowercase())
+        print(f"matcher on every text: {time.perf_counter() - time_start:.2f}s")
+
+        time_start = time.perf_counter()
+        candidates = index.candidates(keywords_strict, keywords_compound)
+        time_lookup = time.perf_counter() - time_start
+        texts_candidates = texts.filter(text_key(texts).is_in(candidates.implode()))
+        matcher.extract_all(texts_candidates.str.to_lowercase())
+        print(
+            f"index lookup ({time_lookup:.2f}s) and matcher on "
+            f"{len(texts_candidates)} candidates: "
+            f"{time.perf_counter() - time_start:.2f}s"
+        )
+
+    keys = text_key(texts.filter(matched.list.len() > 0))
+    print(f"texts with keywords: {len(keys)}")
+    print(f"all are candidates: {keys.is_in(candidates.implode()).all()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--urls", type=int, default=25000, help="urls per country")
+    parser.add_argument("--rows", type=int, default=10, help="rows per url")
+    parser.add_argument("--keywords", type=int, default=400, help="per list")
+    parser.add_argument("--strict", default=None, help="keywords_strict.txt")
+    parser.add_argument("--compound", default=None, help="keywords_compound.txt")
+    parser.add_argument("--rare", action="store_true", help="few corpus words")
+    main(parser.parse_args())
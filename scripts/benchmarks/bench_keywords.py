@@ -0,0 +1,102 @@
+"""
+Benchmark of the keyword matcher (scraping.keywords) against the regex of the
+keyword filter (2_1_filter_by_keywords.py).
+
+Extracts the keywords of the text rows of a synthetic corpus
+(benchmarks/corpus.py) with both and checks that every row gets the same
+list of keywords:
+
+    python scripts/benchmarks/bench_keywords.py --urls 25000 --keywords 400
+
+The keyword files (--strict, --compound) default to a synthetic list: the
+diversity words of the corpus plus filler words up to --keywords each.
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import polars as pl  # noqa: E402
+
+from corpus import countries, make_scraped_corpus, words_eng, words_ger  # noqa: E402
+from scraping.dataset import scan_scraped_data  # noqa: E402
+from scraping.keywords import KeywordMatcher  # noqa: E402
+
+
+def read_keywords(file):
+    with open(file, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def make_keywords(num, seed=0):
+    # strict: corpus words and phrases; compound: word stems (German compounds)
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyzäöüß"
+
+    def filler(length):
+        return "".join(rng.choice(letters) for _ in range(length))
+
+    strict = words_eng[::2] + ["equal opportunities", "gender equality"]
+    compound = [word[: max(4, len(word) - 3)] for word in words_ger[::2]]
+    strict += [filler(rng.randint(5, 12)) for _ in range(num - len(strict))]
+    compound += [filler(rng.randint(4, 8)) for _ in range(num - len(compound))]
+    return strict, compound
+
+
+def main(args):
+    if args.strict and args.compound:
+        keywords_strict = read_keywords(args.strict)
+        keywords_compound = read_keywords(args.compound)
+    else:
+        keywords_strict, keywords_compound = make_keywords(args.keywords)
+    matcher = KeywordMatcher(keywords_strict, keywords_compound)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        make_scraped_corpus(f"{tmp}/scraping", args.urls, args.rows)
+        texts = pl.concat(
+            [
+                scan_scraped_data(country, f"{tmp}/scraping").select("text")
+                for country in countries
+            ]
+        ).collect()["text"]
+    texts = texts.str.to_lowercase()
+    print(
+        f"{len(texts)} rows, {len(keywords_strict)} strict and "
+        f"{len(keywords_compound)} compound keywords"
+    )
+
+    time_start = time.perf_counter()
+    regex = texts.str.extract_all(matcher.pattern)
+    print(f"regex (extract_all): {time.perf_counter() - time_start:.2f}s")
+
+    time_start = time.perf_counter()
+    matched = matcher.extract_all(texts)
+    print(f"Aho-Corasick: {time.perf_counter() - time_start:.2f}s")
+    print(f"same keywords: {regex.equals(matched)}")
+
+    with ProcessPoolExecutor(args.workers) as executor:
+        time_start = time.perf_counter()
+        matched = matcher.extract_all(texts, executor)
+        print(
+            f"Aho-Corasick ({args.workers} workers): "
+            f"{time.perf_counter() - time_start:.2f}s"
+        )
+    print(f"same keywords: {regex.equals(matched)}")
+    print(f"rows with keywords: {(regex.list.len() > 0).sum()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--urls", type=int, default=25000, help="urls per country")
+    parser.add_argument("--rows", type=int, default=10, help="rows per url")
+    parser.add_argument("--keywords", type=int, default=400, help="per list")
+    parser.add_argument("--strict", default=None, help="keywords_strict.txt")
+    parser.add_argument("--compound", default=None, help="keywords_compound.txt")
+    parser.add_argument("--workers", type=int, default=2)
+    main(parser.parse_args())
@@ -0,0 +1,80 @@
+"""
+Benchmark of the language detection (scraping.language).
+
+Detects the languages of the text rows of a synthetic corpus
+(benchmarks/corpus.py, German and English texts) like the former 2_2 did
+(langdetect per row, map_elements) and with detect_languages: each distinct
+text once, in chunks, serial and on --workers processes, then again with the
+cache of the first run:
+
+    python scripts/benchmarks/bench_language.py --urls 2500
+
+Checks that all runs give the same languages (langdetect is seeded).
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import polars as pl  # noqa: E402
+
+from corpus import countries, make_scraped_corpus  # noqa: E402
+from scraping.dataset import scan_scraped_data  # noqa: E402
+from scraping.language import detect_language, detect_languages  # noqa: E402
+
+
+def report(name, seconds, rows):
+    print(f"{name}: {seconds:.2f}s ({rows / seconds:,.0f} rows/s)")
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        make_scraped_corpus(f"{tmp}/scraping", args.urls, args.rows)
+        texts = pl.concat(
+            [
+                scan_scraped_data(country, f"{tmp}/scraping").select("text")
+                for country in countries
+            ]
+        ).collect()["text"]
+    print(f"{len(texts)} rows, {texts.n_unique()} distinct texts")
+
+    time_start = time.perf_counter()
+    per_row = texts.map_elements(detect_language, return_dtype=pl.Utf8)
+    report("per row (map_elements)", time.perf_counter() - time_start, len(texts))
+
+    time_start = time.perf_counter()
+    serial = detect_languages(texts)
+    report("detect_languages (serial)", time.perf_counter() - time_start, len(texts))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_cache = f"{tmp}/language_cache.parquet"
+        with ProcessPoolExecutor(args.workers) as executor:
+            time_start = time.perf_counter()
+            parallel = detect_languages(texts, executor, file_cache=file_cache)
+            report(
+                f"detect_languages ({args.workers} workers)",
+                time.perf_counter() - time_start,
+                len(texts),
+            )
+        time_start = time.perf_counter()
+        cached = detect_languages(texts, file_cache=file_cache)
+        report(
+            "detect_languages (cached)", time.perf_counter() - time_start, len(texts)
+        )
+
+    same = per_row.equals(serial) and serial.equals(parallel) and serial.equals(cached)
+    print(f"same languages: {same}")
+    print(serial.value_counts(sort=True))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--urls", type=int, default=2500, help="urls per country")
+    parser.add_argument("--rows", type=int, default=10, help="rows per url")
+    parser.add_argument("--workers", type=int, default=2)
+    main(parser.parse_args())
@@ -0,0 +1,73 @@
+"""
+Benchmark of the near-duplicate index (scraping.neardup).
+
+Adds the text rows of a synthetic corpus (benchmarks/corpus.py) in batches
+and clusters them; the corpus has boilerplate repeated on every page of a
+domain and templated copyright lines that differ just by the domain name:
+
+    python scripts/benchmarks/bench_neardup.py --urls 25000
+
+Prints the time of the signatures and of the clustering, the number of
+clusters and rows that would be removed, and a few of the largest clusters.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import polars as pl  # noqa: E402
+
+from corpus import countries, make_scraped_corpus  # noqa: E402
+from scraping.dataset import scan_scraped_data  # noqa: E402
+from scraping.neardup import NearDuplicateIndex  # noqa: E402
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        make_scraped_corpus(f"{tmp}/scraping", args.urls, args.rows)
+        texts = pl.concat(
+            [
+                scan_scraped_data(country, f"{tmp}/scraping").select("text", "tag")
+                for country in countries
+            ]
+        ).collect()
+    include = (texts["tag"] != "title") & (
+        texts["text"].str.split(" ").list.len() >= args.words_min
+    )
+    print(f"{texts.height} rows, {include.sum()} with at least {args.words_min} words")
+
+    index = NearDuplicateIndex(num_perm=args.num_perm, bands=args.bands)
+    time_start = time.perf_counter()
+    for i in range(0, texts.height, args.batch):
+        index.add(texts["text"][i : i + args.batch], include[i : i + args.batch])
+    print(f"signatures: {time.perf_counter() - time_start:.2f}s")
+
+    time_start = time.perf_counter()
+    with index:
+        clusters = index.clusters()
+    print(f"clusters: {time.perf_counter() - time_start:.2f}s")
+
+    sizes = clusters.group_by("cluster_id").len().sort("len", descending=True)
+    exact = include.sum() - texts["text"].filter(include).n_unique()
+    print(
+        f"{sizes.height} clusters, {clusters.height - sizes.height} rows removed "
+        f"(exact duplicates: {exact})"
+    )
+    for cluster_id, size in sizes.head(args.show).iter_rows():
+        print(f"  {size:>7}  {texts['text'][cluster_id][:70]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--urls", type=int, default=25000, help="urls per country")
+    parser.add_argument("--rows", type=int, default=10, help="rows per url")
+    parser.add_argument("--words-min", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=250_000, help="rows per batch")
+    parser.add_argument("--num-perm", type=int, default=64)
+    parser.add_argument("--bands", type=int, default=16)
+    parser.add_argument("--show", type=int, default=5, help="largest clusters")
+    main(parser.parse_args())
@@ -0,0 +1,171 @@
+"""
+Benchmark of the normalized parquet store (scraping.storage).
+
+Builds the store from the scraped csv files and compares the size on disk and
+the peak memory (RSS) of the 1_2 cleaning plan on the csv files with
+per-row domain extraction against the same plan on the store:
+
+    python scripts/benchmarks/bench_storage.py --urls 20000
+
+A synthetic corpus (benchmarks/corpus.py) is written to a temporary folder
+unless --data points to an existing data/scraping folder.
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import polars as pl  # noqa: E402
+
+from corpus import countries, make_scraped_corpus  # noqa: E402
+from scraping.domains import extract_domain  # noqa: E402
+from scraping.storage import (  # noqa: E402
+    build_store,
+    scan_store_texts,
+    scan_store_urls,
+)
+
+
+def clean(data):
+    # steps 2-10 of 1_2_scrape_clean_data.py (domain already in `data`)
+    return (
+        data.filter(pl.col("url").str.contains(r"^http"))
+        .filter(~pl.col("text").str.contains(r"(?i)cookies"))
+        .filter(~pl.col("text").str.contains(r"No title"))
+        .with_columns(pl.col("text").str.strip_chars().str.replace_all(r"\s+", " "))
+        .with_columns(text_words=pl.col("text").str.split(" ").list.len())
+        .with_columns((pl.cum_count("text").over("url") + 1).alias("order"))
+        .unique(subset=["domain", "text"])
+        .sort(["country", "domain", "url", "order"])
+        .filter(~pl.col("url").str.contains(r"(?i)datenschutz"))
+        .filter(pl.col("text_length") < 4000)
+        .collect()
+    )
+
+
+def clean_csv(directory):
+    data = pl.concat(
+        [
+            pl.scan_csv(f"{directory}/{country}/scraped_data.csv").with_columns(
+                country=pl.lit(country)
+            )
+            for country in countries
+        ]
+    ).with_columns(
+        domain=pl.coalesce("url_redirect", "url").map_elements(
+            extract_domain, return_dtype=pl.Utf8
+        )
+    )
+    return clean(data)
+
+
+def clean_texts(texts, urls):
+    # steps 2-10 of 1_2_scrape_clean_data.py on store text rows (any subset of
+    # whole domains, e.g. a partition)
+    is_removed = pl.col("text").str.contains(r"(?i)cookies") | pl.col(
+        "text"
+    ).str.contains(r"No title")
+    removed = (
+        texts.filter(pl.col("text").is_not_null() & pl.col("text_hash").is_not_null())
+        .select("domain_id", "text_hash", removed=is_removed)
+        .unique(subset=["domain_id", "text_hash"])
+    )
+    return (
+        texts.join(
+            removed, on=["domain_id", "text_hash"], how="left", maintain_order="left"
+        )
+        .filter(~pl.coalesce(is_removed, "removed"))
+        .with_columns((pl.cum_count("url_id").over("url_id") + 1).alias("order"))
+        .filter(pl.col("text").is_not_null())
+        .with_columns(pl.col("text").str.strip_chars().str.replace_all(r"\s+", " "))
+        .with_columns(text_words=pl.col("text").str.split(" ").list.len())
+        .unique(subset=["domain_id", "text"], keep="first", maintain_order=True)
+        .sort(["country", "domain_id", "url_id", "order"])
+        .join(
+            urls.select("url_id", "url", "url_redirect", "domain"),
+            on="url_id",
+            how="left",
+            maintain_order="left",
+        )
+        .filter(~pl.col("url").str.contains(r"(?i)datenschutz"))
+        .filter(pl.col("text_length") < 4000)
+    )
+
+
+def clean_store(store_dir):
+    # same steps as 1_2_scrape_clean_data.py: dedup and sort on the ids
+    urls = scan_store_urls(store_dir)
+    texts = scan_store_texts(store_dir).join(
+        urls.filter(pl.col("url").str.contains(r"^http")), on="url_id", how="semi"
+    )
+    return clean_texts(texts, urls).collect()
+
+
+def measure(func, arg, queue):
+    time_start = time.perf_counter()
+    rows = func(arg).height
+    seconds = time.perf_counter() - time_start
+    queue.put((rows, seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def run_isolated(func, arg):
+    """
+    Runs func(arg) in a fresh process and returns (rows, seconds, peak RSS in MB).
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=measure, args=(func, arg, queue))
+    process.start()
+    rows, seconds, maxrss = queue.get()
+    process.join()
+    return rows, seconds, maxrss / 1024  # ru_maxrss is in KB on Linux
+
+
+def folder_size(paths):
+    return sum(os.path.getsize(p) for p in paths) / 1e6
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.data
+        if directory is None:
+            directory = f"{tmp}/scraping"
+            make_scraped_corpus(directory, args.urls, args.rows)
+        store_dir = f"{tmp}/store"
+
+        time_start = time.perf_counter()
+        build_store(list(countries), directory, store_dir)
+        print(f"build store: {time.perf_counter() - time_start:.1f}s")
+
+        size_csv = folder_size(
+            [f"{directory}/{country}/scraped_data.csv" for country in countries]
+        )
+        size_store = folder_size(Path(store_dir).glob("*.parquet"))
+        print(
+            f"on disk: csv {size_csv:.1f} MB, store {size_store:.1f} MB "
+            f"({size_csv / size_store:.1f}x smaller)"
+        )
+
+        for name, func, arg in [
+            ("csv", clean_csv, directory),
+            ("store", clean_store, store_dir),
+        ]:
+            rows, seconds, rss = run_isolated(func, arg)
+            print(
+                f"clean {name:>5}: {rows} rows in {seconds:.1f}s, peak RSS {rss:.0f} MB"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", default=None, help="existing data/scraping folder")
+    parser.add_argument("--urls", type=int, default=20000, help="urls per country")
+    parser.add_argument("--rows", type=int, default=10, help="rows per url")
+    main(parser.parse_args())
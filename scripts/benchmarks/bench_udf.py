@@ -0,0 +1,97 @@
+"""
+Benchmark of the Python UDFs replaced by native polars expressions.
+
+Times each stage on the text rows of a synthetic corpus (benchmarks/corpus.py,
+4 countries x --urls x --rows, 1M rows by default) with the former
+map_elements call and with the native expression, checks that both give the
+same column and prints the UDF audit (scraping.plans) of the native plan:
+
+    python scripts/benchmarks/bench_udf.py --urls 25000
+
+The umlaut replacements are timed without ftfy (which has no native
+equivalent): as a chain of literal replaces every row is scanned once per
+pattern, which is slower than the Python loop.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import polars as pl  # noqa: E402
+
+from corpus import countries, make_scraped_corpus  # noqa: E402
+from scraping.dataset import scan_scraped_data  # noqa: E402
+from scraping.domains import domain_expr, domain_of_host, extract_domain  # noqa: E402
+from scraping.plans import udf_report  # noqa: E402
+from scraping.umlaute import replacement_dict  # noqa: E402
+
+
+def replace_umlaute(text):
+    # scraping.umlaute.correct_umlaute without ftfy
+    for wrong, right in replacement_dict.items():
+        text = text.replace(wrong, right)
+    return text
+
+
+def replace_umlaute_expr(expr):
+    for wrong, right in replacement_dict.items():
+        expr = expr.str.replace_all(wrong, right, literal=True)
+    return expr
+
+
+stages = {
+    "text_words": (
+        pl.col("text")
+        .str.split(" ")
+        .map_elements(lambda lst: len(lst), return_dtype=pl.Int64),
+        pl.col("text").str.split(" ").list.len().cast(pl.Int64),
+    ),
+    "domain": (
+        pl.col("url").map_elements(extract_domain, return_dtype=pl.Utf8),
+        domain_expr("url"),
+    ),
+    "umlaute (replacements)": (
+        pl.col("text").map_elements(replace_umlaute, return_dtype=pl.Utf8),
+        replace_umlaute_expr(pl.col("text")),
+    ),
+}
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        make_scraped_corpus(f"{tmp}/scraping", args.urls, args.rows)
+        data = pl.concat(
+            [
+                scan_scraped_data(country, f"{tmp}/scraping").select("text", "url")
+                for country in countries
+            ]
+        ).collect()
+    print(f"{data.height} rows")
+    print(f"{'stage':<24} {'map_elements':>12} {'native':>8}  same")
+
+    reports = []
+    for name, (udf, native) in stages.items():
+        results = []
+        for expr in [udf, native]:
+            domain_of_host.cache_clear()
+            time_start = time.perf_counter()
+            results.append(data.select(expr.alias(name)))
+            results.append(time.perf_counter() - time_start)
+        print(
+            f"{name:<24} {results[1]:>11.2f}s {results[3]:>7.2f}s  "
+            f"{results[0].equals(results[2])}"
+        )
+        reports.append(udf_report(data.lazy().select(native), name))
+    print()
+    print("\n".join(reports))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--urls", type=int, default=25000, help="urls per country")
+    parser.add_argument("--rows", type=int, default=10, help="rows per url")
+    main(parser.parse_args())
@@ -0,0 +1,78 @@
+"""
+Benchmark of the umlaut repair (scraping.umlaute).
+
+Compares the former per row repair (ftfy and one str.replace per key on every
+text, map_elements) with repair_texts, which screens the texts with one
+vectorized regex, runs ftfy only on the suspicious ones (on --workers
+processes) and does all replacements in one leftmost-longest pass:
+
+    python scripts/benchmarks/bench_umlaute.py --urls 25000 --broken 0.02
+
+The German texts of a synthetic corpus (benchmarks/corpus.py) get a broken
+umlaut (a key of replacement_dict) in the share --broken of the rows.
+"""
+
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import polars as pl  # noqa: E402
+
+from corpus import make_country  # noqa: E402
+from scraping.umlaute import (  # noqa: E402
+    correct_umlaute,
+    pattern_suspicious,
+    repair_texts,
+    replacement_dict,
+)
+
+
+def make_texts(urls_num, rows_per_url, broken, seed=0):
+    rng = random.Random(seed)
+    keys = list(replacement_dict)
+    texts = make_country("Germany", "de", urls_num, rows_per_url, urls_num // 80)
+    return pl.Series(
+        "text",
+        [
+            (
+                f"{text[:20]}{rng.choice(keys)}{text[20:]}"
+                if rng.random() < broken
+                else text
+            )
+            for text in texts["text"]
+        ],
+    )
+
+
+def main(args):
+    texts = make_texts(args.urls, args.rows, args.broken)
+    suspicious = texts.str.contains(pattern_suspicious).sum()
+    print(f"{len(texts)} rows, {suspicious} suspicious")
+
+    time_start = time.perf_counter()
+    per_row = texts.map_elements(correct_umlaute, return_dtype=pl.Utf8)
+    per_row = per_row.str.replace_all("Maönahme", "Maßnahme", literal=True)
+    print(f"per row (map_elements): {time.perf_counter() - time_start:.2f}s")
+
+    with ProcessPoolExecutor(args.workers) as executor:
+        time_start = time.perf_counter()
+        repaired = repair_texts(texts, executor)
+        print(
+            f"repair_texts ({args.workers} workers): "
+            f"{time.perf_counter() - time_start:.2f}s"
+        )
+    print(f"same result: {per_row.equals(repaired)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--urls", type=int, default=25000)
+    parser.add_argument("--rows", type=int, default=10, help="rows per url")
+    parser.add_argument("--broken", type=float, default=0.02, help="share of rows")
+    parser.add_argument("--workers", type=int, default=2)
+    main(parser.parse_args())
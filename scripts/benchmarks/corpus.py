@@ -0,0 +1,98 @@
+"""
+Synthetic scraped corpus in the layout of 1_1_scrape_texts_by_country.py.
+
+Writes data/scraping/<country>/scraped_data.csv for the four countries with
+university-like domains, titles, headings, paragraphs, boilerplate repeated on
+every page of a domain and a few redirected urls, so the later steps can be
+benchmarked without the real data:
+
+    python scripts/benchmarks/corpus.py --out /tmp/corpus --urls 10000
+"""
+
+import argparse
+import os
+import random
+
+import polars as pl
+
+
+countries = {"Germany": "de", "USA": "edu", "UK": "ac.uk", "India": "ac.in"}
+
+words_eng = (
+    "university students diversity equality inclusion research teaching campus "
+    "faculty programme international support gender family career office staff "
+    "application degree study semester library courses department science women "
+    "equal opportunities disability accessibility minority culture community"
+).split()
+words_ger = (
+    "universität studierende vielfalt gleichstellung forschung lehre campus "
+    "fakultät studium beratung familie karriere büro mitarbeitende bewerbung "
+    "frauen chancengleichheit behinderung barrierefreiheit kultur gemeinschaft "
+    "förderung maßnahmen hochschule diversität internationale"
+).split()
+boilerplate = [
+    "We use cookies to give you the best experience on our website. By continuing "
+    "to browse the site you agree to our use of cookies and our privacy policy.",
+    "Copyright {domain}. All rights reserved. Imprint, privacy, accessibility "
+    "statement and contact information for the university and its faculties.",
+]
+
+
+def make_text(rng, words, num_words):
+    return " ".join(rng.choices(words, k=num_words))
+
+
+def make_country(country, suffix, num_urls, rows_per_url, domains_num, seed=0):
+    """
+    Returns the scraped rows of a country as a DataFrame (scraper columns).
+    """
+    rng = random.Random(f"{seed}{country}")
+    words = words_ger if country == "Germany" else words_eng
+    rows = {name: [] for name in ["text", "text_length", "tag", "url", "url_redirect"]}
+
+    def add(text, tag, url, url_redirect):
+        rows["text"].append(text)
+        rows["text_length"].append(len(text))
+        rows["tag"].append(tag)
+        rows["url"].append(url)
+        rows["url_redirect"].append(url_redirect)
+
+    for i in range(num_urls):
+        domain = f"uni-{rng.randrange(domains_num)}.{suffix}"
+        url = f"https://www.{domain}/{make_text(rng, words, 2).replace(' ', '/')}/{i}"
+        url_redirect = url.replace("https://www.", "https://") if i % 20 == 0 else None
+        add(
+            f"{make_text(rng, words, 4).title()} | {domain}", "title", url, url_redirect
+        )
+        for j in range(rows_per_url - 1):
+            if j == rows_per_url - 3:
+                add(boilerplate[0], "p", url, url_redirect)
+            elif j == rows_per_url - 2:
+                add(boilerplate[1].format(domain=domain), "p", url, url_redirect)
+            elif j % 4 == 0:
+                add(make_text(rng, words, 4).capitalize(), "h2", url, url_redirect)
+            else:
+                add(make_text(rng, words, rng.randint(25, 90)), "p", url, url_redirect)
+
+    return pl.DataFrame(rows)
+
+
+def make_scraped_corpus(directory, urls_per_country=1000, rows_per_url=10, seed=0):
+    """
+    Writes a scraped_data.csv for each country into `directory`/<country>/.
+    """
+    for country, suffix in countries.items():
+        os.makedirs(f"{directory}/{country}", exist_ok=True)
+        domains_num = max(urls_per_country // 80, 1)
+        make_country(
+            country, suffix, urls_per_country, rows_per_url, domains_num, seed
+        ).write_csv(f"{directory}/{country}/scraped_data.csv")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--out", default="data/scraping")
+    parser.add_argument("--urls", type=int, default=1000, help="urls per country")
+    parser.add_argument("--rows", type=int, default=10, help="rows per url")
+    args = parser.parse_args()
+    make_scraped_corpus(args.out, args.urls, args.rows)
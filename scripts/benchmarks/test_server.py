@@ -0,0 +1,181 @@
+"""
+Local HTTP test server that imitates a set of university websites.
+
+Every port is a separate "host" for the scraper's per-host limits. Pages are
+generated deterministically from the path, so a benchmark can be repeated
+without network access:
+
+    python scripts/benchmarks/test_server.py --hosts 20 --latency 0.05
+
+serves http://127.0.0.1:8800/page/0 ... http://127.0.0.1:8819/page/<n>.
+Paths starting with /status/<code> answer with that status code, /pdf/ and
+*.pdf with a PDF, /large/<bytes> with a streamed page of that size and /slow/<seconds> after
+that many seconds (a tarpitting host). /redirect/<path> answers with a
+permanent redirect to /<path>. Pages under /page/ have an ETag and
+answer conditional requests with 304, pages under /changing/ differ on every
+request and all other paths serve the same page without validators. Every page
+links to three other pages of its host; /robots.txt disallows /private/.
+"""
+
+import argparse
+import asyncio
+import random
+import textwrap
+import time
+import zlib
+
+from aiohttp import web
+
+
+words = (
+    "university students diversity equality inclusion research teaching campus "
+    "faculty programme international support gender family career office staff "
+    "application degree study semester library courses department science"
+).split()
+
+
+def make_page(path, paragraphs=12):
+    """
+    Returns a html page with a title, headings and paragraphs for a path.
+    """
+    rng = random.Random(path)
+    # links to other pages of the host (for link discovery) and a file
+    links = [f"/page/{rng.randrange(1000)}" for _ in range(3)] + ["/files/a.pdf"]
+    nav = "".join(f"<a href='{link}'>Link</a>" for link in links)
+    body = []
+    for i in range(paragraphs):
+        if i % 4 == 0:
+            body.append(f"<h2>{' '.join(rng.choices(words, k=4))}</h2>")
+        text = " ".join(rng.choices(words, k=rng.randint(10, 80)))
+        body.append(f"<div><p>{text}</p></div>")
+    # same footer on every page (boilerplate)
+    body.append("<footer><p>" + " ".join(words) * 2 + "</p></footer>")
+    return (
+        f"<html><head><title>Test page {path}</title></head>"
+        f"<body><nav><a href='/'>Home</a>{nav}</nav>{''.join(body)}</body></html>"
+    )
+
+
+def make_pdf(path, paragraphs=12):
+    """
+    Returns a one page PDF (bytes) with a title and paragraphs for a path.
+    """
+    rng = random.Random(path)
+    lines = []
+    for _ in range(paragraphs):
+        text = " ".join(rng.choices(words, k=rng.randint(10, 80))) + "."
+        lines += textwrap.wrap(text, 90) + [""]
+    stream = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({line}) ' " for line in lines)
+    stream = (stream + "ET").encode("latin-1")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842]"
+        b" /Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Title (Test document %s) >>" % path.encode("latin-1", "replace"),
+    ]
+    pdf, offsets = b"%PDF-1.4\n", []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (i, obj)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\n" % (
+        len(objects) + 1,
+        len(objects),
+    )
+    return pdf + b"startxref\n%d\n%%%%EOF\n" % xref
+
+
+def make_app(latency=0.0, paragraphs=12):
+    """
+    Creates the aiohttp application answering every request with a test page.
+    """
+
+    async def handle(request):
+        if latency:
+            await asyncio.sleep(latency)
+        path = request.path
+        if path == "/robots.txt":
+            return web.Response(text="User-agent: *\nDisallow: /private/\n")
+        if path.startswith("/status/"):
+            return web.Response(status=int(path.split("/")[2]))
+        if path.startswith("/redirect/"):
+            raise web.HTTPMovedPermanently(path[len("/redirect") :])
+        if path.startswith("/slow/"):
+            await asyncio.sleep(float(path.split("/")[2]))
+        if path.startswith("/pdf/") or path.endswith(".pdf"):
+            return web.Response(
+                body=make_pdf(f"{request.host}{path}", paragraphs),
+                headers={"Content-Type": "application/pdf; charset=binary"},
+            )
+        if path.startswith("/large/"):
+            # chunked, so the size is not known from the headers
+            response = web.StreamResponse(headers={"Content-Type": "text/html"})
+            await response.prepare(request)
+            for _ in range(int(path.split("/")[2]) // 10_000):
+                await response.write(b"<p>" + b"x" * 9_993 + b"</p>")
+            return response
+        html = make_page(f"{request.host}{path}", paragraphs)
+        if path.startswith("/changing/"):
+            html = html.replace("</body>", f"<h1>Updated {time.time_ns()}</h1></body>")
+        if not path.startswith("/page/"):
+            return web.Response(text=html, content_type="text/html")
+        # pages have an ETag and answer conditional requests
+        etag = f'"{zlib.crc32(html.encode())}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(text=html, content_type="text/html", headers={"ETag": etag})
+
+    app = web.Application()
+    app.router.add_route("GET", "/{tail:.*}", handle)
+    return app
+
+
+async def start_test_server(hosts=20, port=8800, latency=0.0, paragraphs=12):
+    """
+    Starts the test server on `hosts` consecutive ports starting at `port`.
+
+    Returns
+    -------
+    runner : web.AppRunner
+        Call `await runner.cleanup()` to stop the server.
+    base_urls : list of str
+        One base url per simulated host.
+    """
+    runner = web.AppRunner(make_app(latency, paragraphs), access_log=None)
+    await runner.setup()
+    base_urls = []
+    for p in range(port, port + hosts):
+        await web.TCPSite(runner, "127.0.0.1", p).start()
+        base_urls.append(f"http://127.0.0.1:{p}")
+    return runner, base_urls
+
+
+def make_urls(base_urls, pages_per_host):
+    """
+    Returns the list of page urls for all simulated hosts.
+    """
+    return [f"{base}/page/{i}" for base in base_urls for i in range(pages_per_host)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    async def serve():
+        runner, base_urls = await start_test_server(args.hosts, args.port, args.latency)
+        print(f"Serving {len(base_urls)} hosts: {base_urls[0]} ... {base_urls[-1]}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(serve())
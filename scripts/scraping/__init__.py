@@ -0,0 +1,8 @@
+"""
+Helpers for the scraping step (1_1_scrape_texts_by_country.py).
+
+The numbered scripts can't be imported, so everything the scraper and the
+benchmarks share lives in this package. Scripts are run from the project root
+(e.g. `python scripts/1_1_scrape_texts_by_country.py`), which puts `scripts/`
+on the import path.
+"""
@@ -0,0 +1,277 @@
+import io
+import json
+import os
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from http import HTTPStatus
+
+import zstandard
+
+from scraping.extract import default_backend
+from scraping.fetch import FetchResult, mime_type
+from scraping.pdf import content_types_pdf, parse_pdf
+from scraping.pipeline import PipelineStats, parse_page
+
+
+# headers that describe the transfer, not the stored (decoded) body
+headers_transfer = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def make_record(result):
+    """
+    Returns a fetched page as a WARC/1.1 response record (bytes).
+
+    The record holds the HTTP status line, the headers and the decoded body of
+    the final response. The requested url is the WARC-Target-URI; the final url
+    and the redirect chain are kept in WARC-X-Final-URI and WARC-X-Redirects.
+    """
+    try:
+        phrase = HTTPStatus(result.status).phrase
+    except ValueError:
+        phrase = ""
+    http = [f"HTTP/1.1 {result.status} {phrase}"]
+    http += [
+        f"{name}: {value}"
+        for name, value in result.headers or []
+        if name.lower() not in headers_transfer
+    ]
+    block = ("\r\n".join(http) + "\r\n\r\n").encode("utf-8", "backslashreplace")
+    block += result.content
+
+    warc = [
+        "WARC/1.1",
+        "WARC-Type: response",
+        f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+        f"WARC-Date: {datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}",
+        f"WARC-Target-URI: {result.url}",
+        f"WARC-X-Final-URI: {result.url_final}",
+        f"WARC-X-Redirects: {json.dumps(result.redirects or [])}",
+        "Content-Type: application/http;msgtype=response",
+        f"Content-Length: {len(block)}",
+    ]
+    warc = ("\r\n".join(warc) + "\r\n\r\n").encode("utf-8", "backslashreplace")
+    return warc + block + b"\r\n\r\n"
+
+
+def parse_record(stream):
+    """
+    Reads the next record of a WARC stream and returns it as a FetchResult
+    (None at the end of the stream).
+    """
+    line = stream.readline()
+    while line == b"\r\n":  # separator of the previous record
+        line = stream.readline()
+    if not line:
+        return None
+
+    warc = {}
+    for line in iter(stream.readline, b"\r\n"):
+        name, _, value = line.decode("utf-8", "replace").partition(":")
+        warc[name.strip().lower()] = value.strip()
+    block = stream.read(int(warc["content-length"]))
+
+    head, _, content = block.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("utf-8", "replace").split("\r\n")
+    headers = [tuple(s.strip() for s in h.split(":", 1)) for h in header_lines]
+    redirects = [tuple(r) for r in json.loads(warc.get("warc-x-redirects", "[]"))]
+    content_type = next(
+        (value for name, value in headers if name.lower() == "content-type"), None
+    )
+    return FetchResult(
+        warc["warc-target-uri"],
+        url_final=warc.get("warc-x-final-uri"),
+        status=int(status_line.split()[1]),
+        content_type=content_type,
+        content=content,
+        redirected=bool(redirects),
+        headers=headers,
+        redirects=redirects,
+    )
+
+
+class ArchiveWriter:
+    """
+    Writes the raw responses of a crawl as zstd compressed WARC files.
+
+    Every record is a separate zstd frame, so a file stays readable up to the
+    last complete record after a crash (like per record gzip in .warc.gz). A
+    new file is started when the current one reaches `max_bytes`:
+
+        {directory}/archive-<ns>.warc.zst
+
+    Parameters
+    ----------
+    directory : str
+        The folder of the archive files.
+    max_bytes : int
+        Compressed size after which a new file is started.
+    level : int
+        The zstd compression level.
+    """
+
+    def __init__(self, directory, max_bytes=1_000_000_000, level=3):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, result):
+        """
+        Archives a successfully fetched page (other results are skipped).
+        """
+        if result.error is not None or result.content is None:
+            return
+        if self._file is None or self._file.tell() >= self.max_bytes:
+            self.close()
+            name = f"archive-{time.time_ns()}.warc.zst"
+            self._file = open(os.path.join(self.directory, name), "ab")
+        self._file.write(self._compressor.compress(make_record(result)))
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_archive(directory):
+    """
+    Yields the archived responses of a folder (oldest file first) as
+    FetchResult. A truncated last record (crash while writing) is skipped.
+    """
+    files = sorted(f for f in os.listdir(directory) if f.endswith(".warc.zst"))
+    decompressor = zstandard.ZstdDecompressor()
+    for name in files:
+        with open(os.path.join(directory, name), "rb") as f:
+            reader = decompressor.stream_reader(f, read_across_frames=True)
+            stream = io.BufferedReader(reader)
+            while True:
+                try:
+                    result = parse_record(stream)
+                except (KeyError, ValueError, IndexError, zstandard.ZstdError):
+                    break
+                if result is None:
+                    break
+                yield result
+
+
+def parse_batch(batch, parser):
+    # worker: parse a batch of archived pages (fewer round trips than per page)
+    return [
+        (
+            url,
+            url_redirect,
+            *(
+                parse_pdf(content, url, url_redirect)
+                if pdf
+                else parse_page(content, url, url_redirect, parser)
+            ),
+        )
+        for url, url_redirect, content, pdf in batch
+    ]
+
+
+def write_batch(items, output, stats, dedup):
+    # same bookkeeping as the writer stage of scraping.pipeline.run_pipeline
+    for url, url_redirect, rows, error, seconds in items:
+        stats.parsed += 1
+        stats.metrics.record_parse(seconds, len(rows))
+        if error is None and dedup is not None:
+            references = dedup.references
+            rows = dedup.apply(url, url_redirect, rows)
+            stats.references += dedup.references - references
+        output.add(url, url_redirect, rows, error)
+        if error is None:
+            stats.rows += len(rows)
+        else:
+            stats.errors += 1
+    stats.written += len(output.flush())
+
+
+def reextract_archive(
+    directory,
+    output,
+    parser=default_backend,
+    parse_workers=None,
+    dedup=None,
+    batch_size=64,
+):
+    """
+    Replays an archive through the extraction without any network access.
+
+    The pages are parsed in batches by `parse_workers` processes (all cores by
+    default) and written to `output` like in a crawl, so changed extraction
+    rules (`tags_to_keep`, `min_length`, heading rules) can be applied to all
+    scraped pages again. Archived PDFs are extracted with scraping.pdf. A url
+    archived more than once (crawl resumed after a crash, page re-fetched) is
+    extracted just once, from its latest record; finding it takes a first
+    pass over the archive.
+
+    Parameters
+    ----------
+    directory : str
+        The folder of the archive files (see ArchiveWriter).
+    output : scraping.output.CsvOutput or scraping.output.ParquetOutput
+        Where the text rows and errors are written to.
+    parser : str
+        The html parser backend (see scraping.extract.backends).
+    parse_workers : int or None
+        Number of parser processes (None for all cores).
+    dedup : scraping.dedup.TextDedup or None
+        Writes texts repeated within a domain as references (None to write all).
+    batch_size : int
+        Number of pages sent to a worker at once.
+
+    Returns
+    -------
+    stats : scraping.pipeline.PipelineStats
+        The counters of the finished run.
+    """
+    stats = PipelineStats()
+    # records left per url: the files are read oldest first, so the last one
+    # is the latest
+    records = Counter(result.url for result in read_archive(directory))
+
+    def batches():
+        batch = []
+        for result in read_archive(directory):
+            records[result.url] -= 1
+            if records[result.url] > 0:
+                continue
+            stats.fetched += 1
+            url_redirect = result.url_final if result.redirected else None
+            pdf = mime_type(result.content_type) in content_types_pdf
+            batch.append((result.url, url_redirect, result.content, pdf))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    parse_workers = parse_workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=parse_workers) as pool:
+        # keep at most two batches per worker in flight (bounded memory)
+        pending = []
+        for batch in batches():
+            pending.append(pool.submit(parse_batch, batch, parser))
+            if len(pending) >= parse_workers * 2:
+                write_batch(pending.pop(0).result(), output, stats, dedup)
+        for future in pending:
+            write_batch(future.result(), output, stats, dedup)
+
+    output.flush(force=True)
+    print(stats.report())
+    return stats
@@ -0,0 +1,120 @@
+import os
+
+import polars as pl
+
+
+schema_scraped = {
+    "text": pl.Utf8,
+    "text_length": pl.Int64,
+    "tag": pl.Utf8,
+    "url": pl.Utf8,
+    "url_redirect": pl.Utf8,
+    "text_hash": pl.Int64,
+}
+
+
+def scraped_files(country, directory="data/scraping"):
+    """
+    Returns the files of a country the scraper wrote text rows to: the csv
+    file and the parquet parts (whichever exist).
+    """
+    files = []
+    file_csv = f"{directory}/{country}/scraped_data.csv"
+    if os.path.isfile(file_csv):
+        files.append(file_csv)
+    dir_parquet = f"{directory}/parquet/scraped_data/country={country}"
+    if os.path.isdir(dir_parquet):
+        files += [
+            f"{dir_parquet}/{name}"
+            for name in sorted(os.listdir(dir_parquet))
+            if name.endswith(".parquet")
+        ]
+    return files
+
+
+def scan_scraped_file(file, file_format=None):
+    """
+    Returns a LazyFrame over the text rows of one csv file or parquet part of
+    the scraper (`file_format` "csv" or "parquet", by default from the file
+    name).
+    """
+    if file_format is None:
+        file_format = "csv" if ".csv" in os.path.basename(file) else "parquet"
+    if file_format == "csv":
+        data = pl.scan_csv(file, schema_overrides=schema_scraped)
+        if "text_hash" not in data.collect_schema():
+            data = data.with_columns(text_hash=pl.lit(None, pl.Int64))
+        return data.select(list(schema_scraped))
+    return pl.scan_parquet(
+        file, schema=schema_scraped, hive_partitioning=False, missing_columns="insert"
+    )
+
+
+def scan_scraped_data(country, directory="data/scraping"):
+    """
+    Returns a LazyFrame over the scraped text rows of a country.
+
+    Combines the csv file of the scraper's csv output with the parquet parts of
+    its parquet output (whichever exist), so later steps don't need to know
+    which one was used. Parquet parts get projection and predicate pushdown.
+    Rows already moved into the normalized store (see
+    scraping.storage.compact_store) are not in these files any more.
+
+    Texts written as references by the scraper's dedup (see
+    scraping.dedup.TextDedup) have a null text and just their `text_hash`;
+    files written without dedup have a null `text_hash`.
+
+    Parameters
+    ----------
+    country : str
+        The country folder name (e.g. "Germany").
+    directory : str
+        The scraping data folder.
+    """
+    frames = []
+
+    file_csv = f"{directory}/{country}/scraped_data.csv"
+    if os.path.isfile(file_csv):
+        frames.append(scan_scraped_file(file_csv, "csv"))
+
+    dir_parquet = f"{directory}/parquet/scraped_data/country={country}"
+    if os.path.isdir(dir_parquet) and any(
+        f.endswith(".parquet") for f in os.listdir(dir_parquet)
+    ):
+        frames.append(
+            pl.scan_parquet(
+                f"{dir_parquet}/*.parquet",
+                schema=schema_scraped,
+                hive_partitioning=False,
+                missing_columns="insert",
+            )
+        )
+
+    if not frames:
+        raise FileNotFoundError(f"No scraped data for {country} in {directory}")
+
+    return pl.concat(frames, how="vertical_relaxed")
+
+
+def scan_scraped_errors(country, directory="data/scraping"):
+    """
+    Returns a LazyFrame over all urls with errors of a country (url, error).
+    """
+    frames = []
+
+    file_csv = f"{directory}/{country}/scraped_data_errors.csv"
+    if os.path.isfile(file_csv):
+        frames.append(pl.scan_csv(file_csv, schema_overrides={"error": pl.Utf8}))
+
+    dir_parquet = f"{directory}/parquet/scraped_data_errors/country={country}"
+    if os.path.isdir(dir_parquet) and any(
+        f.endswith(".parquet") for f in os.listdir(dir_parquet)
+    ):
+        frames.append(
+            pl.scan_parquet(f"{dir_parquet}/*.parquet", hive_partitioning=False)
+        )
+
+    if not frames:
+        return pl.LazyFrame(schema={"url": pl.Utf8, "error": pl.Utf8})
+
+    return pl.concat(frames, how="vertical_relaxed")
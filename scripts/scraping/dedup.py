@@ -0,0 +1,101 @@
+import hashlib
+
+import numpy as np
+
+from scraping.domains import extract_domain
+
+
+def text_hash(text):
+    """
+    Returns a 64-bit hash of a text as a signed integer (fits an Int64 column).
+    """
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class HashSet:
+    """
+    Set of 64-bit hashes in a sorted int64 array (8 bytes per hash instead of
+    ~70 for a Python set of ints).
+
+    New hashes go to a small Python set first, which is merged into the array
+    once it has grown to a quarter of it, so adding n hashes costs
+    O(n log n) overall.
+    """
+
+    def __init__(self):
+        self._sorted = np.empty(0, dtype=np.int64)
+        self._recent = set()
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    def contains(self, hashes):
+        """
+        Returns a boolean array: which of the `hashes` are in the set.
+        """
+        if not len(self._sorted):
+            return np.array([hash_ in self._recent for hash_ in hashes], dtype=bool)
+        hashes_array = np.asarray(hashes, dtype=np.int64)
+        i = np.searchsorted(self._sorted, hashes_array)
+        found = self._sorted[np.minimum(i, len(self._sorted) - 1)] == hashes_array
+        if self._recent:
+            found |= [hash_ in self._recent for hash_ in hashes]
+        return found
+
+    def update(self, hashes):
+        """
+        Adds hashes (not in the set yet).
+        """
+        self._recent.update(hashes)
+        if len(self._recent) >= max(len(self._sorted) // 4, 64):
+            recent = np.fromiter(self._recent, np.int64, len(self._recent))
+            self._sorted = np.union1d(self._sorted, recent)
+            self._recent = set()
+
+
+class TextDedup:
+    """
+    Per-domain store of the text elements the scraper has already written.
+
+    University sites repeat the same footer, navigation and legal paragraphs on
+    thousands of pages. For every domain (registered domain of the final url,
+    see scraping.domains, so www.x.de and x.de share it) a set of 64-bit text
+    hashes is kept; the first occurrence of a text is written in full and
+    every repeat just as a reference: the row keeps its tag, length, url and
+    position on the page, but the text is None and only `text_hash` points to
+    the stored text of the same domain.
+
+    The hashes are kept in memory (see `HashSet`) for one crawl, so a resumed
+    crawl writes every text once more; later steps dedup on (domain, text)
+    anyway.
+    """
+
+    def __init__(self):
+        self._hashes = {}
+        self.texts = 0
+        self.references = 0
+
+    def apply(self, url, url_redirect, rows):
+        """
+        Returns the rows of one url with `text_hash` appended and the text of
+        repeated elements replaced by None.
+        """
+        if not rows:
+            return []
+        domain = extract_domain(url_redirect or url)
+        hashes = self._hashes.setdefault(domain, HashSet())
+        hashes_page = [text_hash(text) for text, *_ in rows]
+        known = hashes.contains(hashes_page)
+        hashes_new = set()
+        rows_dedup = []
+        for (text, *other), hash_, is_known in zip(rows, hashes_page, known):
+            if is_known or hash_ in hashes_new:
+                rows_dedup.append((None, *other, hash_))
+                self.references += 1
+            else:
+                hashes_new.add(hash_)
+                rows_dedup.append((text, *other, hash_))
+                self.texts += 1
+        hashes.update(hashes_new)
+        return rows_dedup
@@ -0,0 +1,65 @@
+from functools import lru_cache
+
+import pandas as pd
+import polars as pl
+import tldextract
+from tldextract.remote import lenient_netloc
+
+
+# the public suffix list snapshot bundled with tldextract: no download, no
+# cache folder, the same result on every machine
+_extract = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+
+@lru_cache(maxsize=1_000_000)
+def domain_of_host(host):
+    """
+    Returns the registered domain ("domain.suffix") of a host.
+    """
+    extracted = _extract(host)
+    return f"{extracted.domain}.{extracted.suffix}"
+
+
+def extract_domain(url):
+    """
+    Returns the registered domain of a url ("https://www.tu-berlin.de/x" ->
+    "tu-berlin.de"). Urls without scheme work as well.
+
+    The public suffix list is resolved once per host (cached), so calling this
+    for every url of a site costs just the host parsing.
+    """
+    return domain_of_host(lenient_netloc(url))
+
+
+def extract_domains(urls):
+    """
+    Returns the registered domains of a column of urls (polars or pandas
+    Series, nulls stay null).
+
+    Every distinct url is resolved once and the result is mapped back, so a
+    column with ~1M text rows of ~100k urls costs ~100k lookups.
+    """
+    if isinstance(urls, pd.Series):
+        unique = urls.dropna().unique()
+        return urls.map(dict(zip(unique, map(extract_domain, unique))))
+
+    unique = urls.drop_nulls().unique()
+    return urls.replace_strict(
+        unique,
+        [extract_domain(url) for url in unique],
+        default=None,
+        return_dtype=pl.Utf8,
+    )
+
+
+def domain_expr(expr):
+    """
+    Returns a polars expression with the registered domains of a url column
+    (see `extract_domains`), for use in select / with_columns of a DataFrame
+    or LazyFrame:
+
+        data.with_columns(domain=domain_expr(pl.col("url")))
+    """
+    if isinstance(expr, str):
+        expr = pl.col(expr)
+    return expr.map_batches(extract_domains, return_dtype=pl.Utf8, is_elementwise=True)
@@ -0,0 +1,190 @@
+"""
+Excel export of the analysis scripts (2_1, 3_2, 4_2).
+
+Workbooks are written by xlsxwriter in constant memory mode: each row is
+written to a temporary file as soon as it's complete, so memory doesn't grow
+with the size of the sheet. Several workbooks can be written in parallel
+processes. Each process runs this module on the sheets saved as Arrow IPC
+files. No process pool is needed, so the calling scripts need no main guard
+(Windows starts processes by re-importing the main script):
+
+    python -m scraping.export spec.json
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import polars as pl
+import xlsxwriter
+
+
+width_max = 80  # characters (long texts are cut off in the cell display)
+
+workbook_options = {
+    "constant_memory": True,
+    "strings_to_numbers": False,
+    "strings_to_formulas": False,
+    "strings_to_urls": False,
+    "nan_inf_to_errors": True,
+    "default_date_format": "yyyy-mm-dd",
+}
+
+
+def partition_sheets(data, by, names=None, columns=None):
+    """
+    Returns the sheets of a DataFrame as a dict: sheet name -> DataFrame,
+    partitioned once (partition_by) by a column or an expression `by`.
+
+    `names` maps the values of `by` to sheet names, in sheet order; values
+    not in it are left out, names without rows get an empty sheet. Without
+    `names` every value (in order of appearance, nulls left out) is a sheet.
+    `columns` are the columns of the sheets (default: all but `by`).
+    """
+    if isinstance(by, str):
+        by = pl.col(by)
+    data = data.with_columns(by.alias("__sheet"))
+    columns = columns or [column for column in data.columns if column != "__sheet"]
+    parts = data.filter(pl.col("__sheet").is_not_null()).partition_by(
+        "__sheet", as_dict=True, maintain_order=True
+    )
+    parts = {key[0]: part.select(columns) for key, part in parts.items()}
+    if names is None:
+        names = {key: key for key in parts}
+    empty = data.select(columns).clear()
+    return {str(name): parts.get(key, empty) for key, name in names.items()}
+
+
+def cell_values(data):
+    """
+    Returns a DataFrame with cell values: lists joined with ", ", other
+    nested or object types as strings.
+    """
+    columns = []
+    for name, dtype in data.schema.items():
+        column = pl.col(name)
+        if isinstance(dtype, (pl.List, pl.Array)):
+            column = column.cast(pl.List(pl.Utf8)).list.join(", ")
+        elif isinstance(dtype, (pl.Struct, pl.Categorical, pl.Enum, pl.Object)):
+            column = column.cast(pl.Utf8)
+        columns.append(column)
+    return data.select(columns)
+
+
+def write_sheet(workbook, name, data):
+    """
+    Writes a DataFrame to a new worksheet: a bold header row (frozen, with
+    autofilter) and one row per data row, nulls left blank.
+    """
+    data = cell_values(data)
+    worksheet = workbook.add_worksheet(name)
+    bold = workbook.add_format({"bold": True})
+
+    # column widths from the longest value (vectorized, before writing rows)
+    lengths = data.select(
+        pl.all().cast(pl.Utf8).str.len_chars().max().fill_null(0)
+    ).row(0)
+    for col, (column, length) in enumerate(zip(data.columns, lengths)):
+        worksheet.set_column(col, col, min(max(len(column), length) + 2, width_max))
+    worksheet.write_row(0, 0, data.columns, bold)
+    worksheet.freeze_panes(1, 0)
+    worksheet.autofilter(0, 0, data.height, max(data.width - 1, 0))
+
+    # the typed write method of each column (skips the dispatch of write())
+    writers = []
+    for dtype in data.dtypes:
+        if dtype == pl.Utf8:
+            writers.append(worksheet.write_string)
+        elif dtype == pl.Boolean:
+            writers.append(worksheet.write_boolean)
+        elif dtype.is_numeric():
+            writers.append(worksheet.write_number)
+        else:
+            writers.append(worksheet.write)
+    for row, values in enumerate(data.iter_rows(), start=1):
+        for col, (write, value) in enumerate(zip(writers, values)):
+            if value is not None:
+                write(row, col, value)
+    return worksheet
+
+
+def write_workbook(file, sheets):
+    """
+    Writes a workbook (constant memory) with the sheets of a dict: sheet name
+    -> DataFrame.
+    """
+    with xlsxwriter.Workbook(file, workbook_options) as workbook:
+        for name, data in sheets.items():
+            write_sheet(workbook, name, data)
+
+
+def _run_export(spec):
+    environment = dict(os.environ)
+    path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [path, environment.get("PYTHONPATH")])
+    )
+    subprocess.run(
+        [sys.executable, "-m", "scraping.export", spec], env=environment, check=True
+    )
+
+
+def write_workbooks(workbooks, processes=1):
+    """
+    Writes workbooks given as a dict: file -> sheets (see write_workbook),
+    with up to `processes` workbooks written at the same time.
+    """
+    if processes <= 1 or len(workbooks) <= 1:
+        for file, sheets in workbooks.items():
+            write_workbook(file, sheets)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        specs = []
+        for i, (file, sheets) in enumerate(workbooks.items()):
+            files_sheets = []
+            for j, (name, data) in enumerate(sheets.items()):
+                file_sheet = os.path.join(tmp, f"{i}_{j}.arrow")
+                data.write_ipc(file_sheet)
+                files_sheets.append([name, file_sheet])
+            spec = os.path.join(tmp, f"{i}.json")
+            with open(spec, "w", encoding="utf-8") as f:
+                json.dump({"file": os.path.abspath(file), "sheets": files_sheets}, f)
+            specs.append(spec)
+        with ThreadPoolExecutor(processes) as executor:
+            list(executor.map(_run_export, specs))
+
+
+def export(data, file, by=None, names=None, columns=None, csv=None, parquet=None):
+    """
+    Prepares the workbook of a DataFrame and writes its companion files.
+
+    The sheets are partitioned once by `by` (see partition_sheets; one sheet
+    "Sheet1" without). The whole DataFrame is also written to `csv` and
+    `parquet` (if given) now.
+
+    Returns
+    -------
+    dict
+        file -> sheets, to write with write_workbooks (several at once).
+    """
+    if csv:
+        data.write_csv(csv)
+    if parquet:
+        data.write_parquet(parquet, compression="zstd")
+    if by is None:
+        sheets = {"Sheet1": data.select(columns or data.columns)}
+    else:
+        sheets = partition_sheets(data, by, names, columns)
+    return {file: sheets}
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1], encoding="utf-8") as f:
+        spec = json.load(f)
+    write_workbook(
+        spec["file"],
+        {name: pl.read_ipc(file) for name, file in spec["sheets"]},
+    )
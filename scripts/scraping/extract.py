@@ -0,0 +1,232 @@
+import re
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+import pandas as pd
+from bs4 import BeautifulSoup, UnicodeDammit
+from lxml import etree
+
+
+# define variables used in the functions
+variables = [
+    "text",
+    "text_length",
+    "tag",
+    "url",
+    "url_redirect",
+]  # names for the extracted text dataframe
+min_length = 150  # minimum text length of paragraphs
+tags_to_keep = ["p", "h1", "h2", "h3"]  # keep just the text elements in this list
+default_backend = "bs4"  # parser used by the scraper (see `backends`)
+
+
+def elements_bs4(content):
+    """
+    Parses a html page with BeautifulSoup (reference backend).
+
+    Returns
+    -------
+    title : str or None
+        The text of the first title tag (None if missing or not a single string).
+    elements : list of (str, str)
+        Tag name and text of all elements in `tags_to_keep`, in document order.
+    """
+    # Parse the content of the response with BeautifulSoup
+    soup = BeautifulSoup(content, "html.parser")
+
+    title = soup.title.string if soup.title else None
+
+    elements = [
+        (tag.name, tag.get_text(separator=" ", strip=True))
+        for tag in soup.find_all(tags_to_keep, recursive=True)
+    ]
+    return title, elements
+
+
+# text nodes as in BeautifulSoup's get_text (no comments, scripts and styles)
+_xpath_text = etree.XPath(
+    "descendant::text()[not(ancestor::script or ancestor::style or ancestor::template)]"
+)
+
+
+def decode_html(content):
+    """
+    Decodes raw html with the same guess as BeautifulSoup: byte order mark,
+    declared charset, the encoding detected by charset_normalizer (for pages
+    without a usable declaration), then utf-8 and windows-1252.
+    """
+    if isinstance(content, str):
+        return content
+    return UnicodeDammit(content, is_html=True).unicode_markup
+
+
+def _string(element):
+    """
+    Returns the text of an lxml element like BeautifulSoup's `Tag.string`: its
+    only child string, also through single child tags (None if the element
+    has no or several children).
+    """
+    while True:
+        children = [element.text] if element.text else []
+        for child in element:
+            children += [child, child.tail] if child.tail else [child]
+        if len(children) != 1:
+            return None
+        child = children[0]
+        if isinstance(child, str):
+            return child
+        if child.tag is etree.Comment:
+            return child.text
+        element = child
+
+
+def elements_lxml(content):
+    """
+    Parses a html page with lxml (libxml2, fast backend).
+
+    Returns the same (title, elements) as `elements_bs4`. Both differ only for
+    broken markup that the parsers repair differently (e.g. an unclosed <p>
+    followed by another <p>, which html.parser nests and libxml2 closes).
+    """
+    parser = etree.HTMLParser(encoding="utf-8")
+    html = decode_html(content).encode("utf-8")
+    root = etree.fromstring(html, parser)
+    if root is None:  # empty document
+        return None, []
+
+    title = root.find(".//title")
+    if title is not None:
+        if len(title) == 0 and title.text and "<" in title.text:
+            # libxml2 (>= 2.14) keeps markup in <title> as raw text, html.parser
+            # parses it into tags
+            fragment = f"<div>{title.text}</div>".encode("utf-8")
+            title = etree.fromstring(fragment, parser).find(".//div")
+        title = _string(title)
+
+    elements = [
+        (element.tag, " ".join(s.strip() for s in _xpath_text(element) if s.strip()))
+        for element in root.iter(tags_to_keep)
+    ]
+    return title, elements
+
+
+backends = {"bs4": elements_bs4, "lxml": elements_lxml}
+
+# links to files that are never html pages (not worth a request); PDFs are
+# only worth one if they are extracted (see scraping.pdf)
+_extensions_binary = (
+    r"docx?|xlsx?|pptx?|zip|rar|gz|jpe?g|png|gif|svg|webp|ico|mp[34]|avi"
+    r"|mov|wmv|css|js|xml|rss|ics|exe|dmg|iso"
+)
+_pattern_binary = re.compile(rf"\.(pdf|{_extensions_binary})$", re.I)
+_pattern_binary_keep_pdf = re.compile(rf"\.({_extensions_binary})$", re.I)
+
+
+def extract_links(content, url, keep_pdf=False):
+    """
+    Returns the absolute http(s) urls of all links (<a href>) of a html page,
+    without fragments, duplicates and links to non-html files.
+
+    Parameters
+    ----------
+    content : bytes
+        The raw html of the page.
+    url : str
+        The final url of the page, base of relative links (unless the page
+        sets a <base href>).
+    keep_pdf : bool
+        Whether to keep links to PDFs (if they are extracted).
+    """
+    pattern_binary = _pattern_binary_keep_pdf if keep_pdf else _pattern_binary
+    html = decode_html(content).encode("utf-8")
+    root = etree.fromstring(html, etree.HTMLParser(encoding="utf-8"))
+    if root is None:
+        return []
+    base = root.find(".//base[@href]")
+    if base is not None:
+        url = urljoin(url, base.get("href").strip())
+
+    links = {}
+    for element in root.iter("a"):
+        href = element.get("href")
+        if not href:
+            continue
+        try:
+            link, _ = urldefrag(urljoin(url, href.strip()))
+        except ValueError:  # e.g. invalid IPv6 host
+            continue
+        if link.startswith(("http://", "https://")) and not pattern_binary.search(
+            urlsplit(link).path
+        ):
+            links[link] = None
+    return list(links)
+
+
+def extract_rows(content, url, url_redirect=None, backend=default_backend):
+    """
+    Extracts the main text from a html page and keeps just useful text elements.
+
+    The parsing is done by one of the `backends`; the rules which elements to
+    keep are the same for all of them.
+
+    Parameters
+    ----------
+    content : bytes
+        The raw html of the page.
+    url : str
+        The requested url, stored with every text element.
+    url_redirect : str or None
+        The final url if the request was redirected, None otherwise.
+    backend : str
+        The name of the parser in `backends`.
+
+    Returns
+    -------
+    rows : list of tuple
+        One tuple (in the order of `variables`) per text element.
+    """
+    title, elements = backends[backend](content)
+
+    # Get the title and add as first row for this url
+    title = title if title is not None else "No title"
+    title = " ".join(title.split())
+    text_elements = [(title, len(title), "title", url, url_redirect)]
+
+    # Loop over valid tags and keep paragraphs with min length and all headings
+    for tag, text in elements:
+        text = " ".join(text.split())
+        text_length = len(text)
+        if (tag == "p" and text_length >= min_length) or (
+            tag.startswith("h") and text_length > 0
+        ):
+            # Store the text with its tag, and length as meta information
+            text_elements.append((text, text_length, tag, url, url_redirect))
+
+    # Drop duplicates (because of nested structure)
+    texts_seen = set()
+    rows = []
+    for row in text_elements:
+        if row[0] not in texts_seen:
+            texts_seen.add(row[0])
+            rows.append(row)
+
+    # Drop rows with headlines that follow other headlines
+    headings = ("h1", "h2", "h3")
+    return [
+        row
+        for i, row in enumerate(rows)
+        if not (row[2] in headings and i > 0 and rows[i - 1][2] in headings)
+    ]
+
+
+def extract_html_text(content, url, url_redirect=None, backend=default_backend):
+    """
+    Extracts the main text from a html page as a DataFrame (see `extract_rows`).
+
+    Returns
+    -------
+    texts_df : pd.DataFrame
+        A DataFrame containing the extracted text.
+    """
+    return pd.DataFrame(
+        extract_rows(content, url, url_redirect, backend), columns=variables
+    )
@@ -0,0 +1,521 @@
+import asyncio
+import hashlib
+import socket
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import aiohttp
+
+
+headers = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/118.0"
+}
+content_types_html = ("text/html", "application/xhtml+xml")  # default allow-list
+max_bytes_default = 5_000_000  # larger bodies are aborted (no university page)
+chunk_size = 64 * 1024
+
+
+@dataclass
+class FetchResult:
+    """
+    Outcome of a single request.
+
+    `error` is None for a successful response, the status code for HTTP errors
+    and the exception for everything else (same values the csv error log used
+    with `requests`). Bodies rejected before or while downloading get a reason
+    code with a detail, e.g. "content_type:application/pdf" or
+    "too_large:5000000" (see `reason`).
+    """
+
+    url: str
+    url_final: str = None
+    status: int = None
+    content_type: str = None
+    content: bytes = None
+    redirected: bool = False
+    error: object = None
+    seconds: float = None  # time until the response headers (or the failure)
+    headers: list = None  # (name, value) pairs of the final response
+    redirects: list = None  # (status, url) of every redirect response
+
+    def header(self, name):
+        """
+        Returns the value of a response header (None if missing).
+        """
+        name = name.lower()
+        return next((v for k, v in self.headers or [] if k.lower() == name), None)
+
+
+class HostThrottle:
+    """
+    Politeness limit for a single host: at most `concurrency` open requests
+    and at least `delay` seconds between the start of two requests.
+    """
+
+    def __init__(self, concurrency=2, delay=1.0):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.delay = delay
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            wait = self._next_start - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_start = max(now, self._next_start) + self.delay
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
+
+
+class HostHealth:
+    """
+    Rolling latency estimate and circuit breaker of a single host.
+
+    The latency until the response headers is smoothed like a TCP round trip
+    time (mean and mean deviation); the adaptive timeout is mean + 4 deviations,
+    between `timeout_min` and the configured timeout. After `failures_max`
+    consecutive failures (timeouts, connection errors, 5xx) the breaker opens
+    and the host is paused for `cooldown` seconds. Results of requests that
+    were started before it opened are ignored, so the other requests in flight
+    don't open it again. After the pause it is half-open: exactly one request
+    (the probe) is let through, its success closes the breaker and its failure
+    opens it again (with twice the cooldown). After `trips_max` openings the
+    host counts as dead.
+    """
+
+    def __init__(
+        self, timeout=10.0, timeout_min=2.0, failures_max=5, cooldown=30.0, trips_max=2
+    ):
+        self.timeout_max = timeout
+        self.timeout_min = timeout_min
+        self.failures_max = failures_max
+        self.cooldown = cooldown
+        self.trips_max = trips_max
+        self.latency = None
+        self.deviation = None
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.opened_at = float("-inf")
+        self.half_open = False
+        self.probing = False
+
+    @property
+    def dead(self):
+        return self.trips >= self.trips_max
+
+    def timeout(self):
+        """
+        Returns the read timeout in seconds for the next request.
+        """
+        if self.latency is None:
+            return self.timeout_max
+        timeout = self.latency + 4 * self.deviation
+        return min(self.timeout_max, max(self.timeout_min, timeout))
+
+    def pause(self, now, poll=0.1):
+        """
+        Returns the seconds to wait before the next request may start (0 if it
+        may start now). A request let through while half-open is the probe;
+        the other requests wait (polling every `poll` seconds) for its result.
+        """
+        if now < self.open_until:
+            return self.open_until - now
+        if self.half_open:
+            if self.probing:
+                return poll
+            self.probing = True
+        return 0.0
+
+    def record_success(self, seconds, started):
+        """
+        Records a result that says the host works (`seconds` until the
+        response headers, None if unknown) of a request started at `started`.
+        """
+        if started < self.opened_at:
+            return
+        if seconds is not None:
+            if self.latency is None:
+                self.latency, self.deviation = seconds, seconds / 2
+            else:
+                self.deviation = 0.75 * self.deviation + 0.25 * abs(
+                    self.latency - seconds
+                )
+                self.latency = 0.875 * self.latency + 0.125 * seconds
+        self.failures = 0
+        self.half_open = self.probing = False
+
+    def record_failure(self, now, started):
+        """
+        Records a transient failure at `now` of a request started at `started`.
+        """
+        if started < self.opened_at:
+            return
+        self.failures += 1
+        if self.half_open or self.failures >= self.failures_max:
+            self.trips += 1
+            self.open_until = now + self.cooldown * 2 ** (self.trips - 1)
+            self.opened_at = now
+            self.failures = 0
+            self.half_open = True
+            self.probing = False
+
+
+# client errors that won't go away by trying again (bad certificate, unknown
+# host name, redirect loop), logged as errors instead of pausing the host
+errors_permanent = tuple(
+    getattr(aiohttp, name)
+    for name in [
+        "InvalidURL",
+        "ClientSSLError",
+        "ServerFingerprintMismatch",
+        "ClientConnectorDNSError",
+        "TooManyRedirects",
+    ]
+    if hasattr(aiohttp, name)
+)
+errors_dns = tuple(
+    getattr(aiohttp, name)
+    for name in ["ClientConnectorDNSError"]
+    if hasattr(aiohttp, name)
+)
+
+
+def is_dns_error(error):
+    """
+    Tells whether a request failed because the host name couldn't be resolved.
+    """
+    if isinstance(error, errors_dns):
+        return True
+    # aiohttp versions without a class of its own for DNS errors
+    return isinstance(error, aiohttp.ClientConnectorError) and isinstance(
+        error.os_error, socket.gaierror
+    )
+
+
+def is_transient(result):
+    """
+    Tells whether a failed request says something about the host's health
+    (timeouts, connection errors, server errors) and may succeed later.
+    Certificate, DNS and redirect loop errors are permanent (see
+    `errors_permanent`).
+    """
+    error = result.error
+    if isinstance(error, int):
+        return error >= 500
+    if isinstance(error, errors_permanent) or is_dns_error(error):
+        return False
+    return error == "Timeout" or isinstance(error, (aiohttp.ClientError, OSError))
+
+
+def reason(code, detail):
+    """
+    Returns the error of an aborted transfer as "<code>:<detail>" (the code is
+    the part a later analysis groups by).
+    """
+    return f"{code}:{detail}"
+
+
+def mime_type(content_type):
+    """
+    Returns the lower case media type of a Content-Type header without its
+    parameters ("application/pdf; charset=binary" -> "application/pdf").
+    """
+    return content_type.split(";")[0].strip().lower() if content_type else None
+
+
+def content_hash(content):
+    """
+    Returns a 64-bit hash of a response body as a signed integer.
+    """
+    digest = hashlib.blake2b(content, digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def conditional_headers(etag, last_modified):
+    """
+    Returns the request headers that make a GET conditional on the validators
+    of an earlier response (the server answers 304 if nothing changed).
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def host_of(url):
+    """
+    Returns the key used for the per-host limits (host and port, lower case).
+    """
+    return urlsplit(url).netloc.lower()
+
+
+async def fetch_url(
+    session,
+    url,
+    verify=True,
+    content_types=content_types_html,
+    max_bytes=max_bytes_default,
+    timeout=None,
+    request_headers=None,
+    max_bytes_types=None,
+):
+    """
+    Downloads a single url and returns a FetchResult (never raises).
+
+    The body is streamed: the headers are checked first, so responses that
+    will never yield text (PDFs, images, office documents, videos) are aborted
+    before their body is downloaded. A body growing past `max_bytes` (announced
+    by Content-Length or while streaming) is aborted as well.
+
+    Parameters
+    ----------
+    session : aiohttp.ClientSession
+        The shared session (holds headers, timeouts and the connection pool).
+    url : str
+        The url to download.
+    verify : bool
+        Verify SSL certificates.
+    content_types : tuple of str or None
+        Allowed media types (None to allow all). Responses without a
+        Content-Type header are allowed.
+    max_bytes : int or None
+        Maximum body size in bytes (None for no limit).
+    timeout : aiohttp.ClientTimeout or None
+        Overrides the timeouts of the session for this request.
+    request_headers : dict or None
+        Extra headers of this request (e.g. `conditional_headers`). A 304 Not
+        Modified answer is a result without error and without content.
+    max_bytes_types : dict or None
+        Maximum body size by media type, overrides `max_bytes` (e.g. a larger
+        limit for PDFs).
+    """
+    loop = asyncio.get_running_loop()
+    time_start = loop.time()
+    try:
+        async with session.get(
+            url, ssl=verify, timeout=timeout, headers=request_headers
+        ) as response:
+            seconds = loop.time() - time_start
+            if response.status >= 400:
+                return FetchResult(
+                    url,
+                    status=response.status,
+                    error=response.status,
+                    seconds=seconds,
+                )
+
+            result = FetchResult(
+                url,
+                url_final=str(response.url),
+                status=response.status,
+                content_type=response.headers.get("Content-Type"),
+                redirected=bool(response.history),
+                seconds=seconds,
+                headers=list(response.headers.items()),
+                redirects=[(r.status, str(r.url)) for r in response.history],
+            )
+
+            if response.status == 304:
+                return result
+
+            mime = mime_type(result.content_type)
+            if content_types is not None and mime and mime not in content_types:
+                result.error = reason("content_type", mime)
+                return result
+
+            if max_bytes_types and mime in max_bytes_types:
+                max_bytes = max_bytes_types[mime]
+            if max_bytes is not None and (response.content_length or 0) > max_bytes:
+                result.error = reason("too_large", response.content_length)
+                return result
+
+            content = bytearray()
+            async for chunk in response.content.iter_chunked(chunk_size):
+                content += chunk
+                if max_bytes is not None and len(content) > max_bytes:
+                    result.error = reason("too_large", max_bytes)
+                    return result
+            result.content = bytes(content)
+
+            return result
+    except asyncio.TimeoutError:
+        return FetchResult(url, error="Timeout", seconds=loop.time() - time_start)
+    except Exception as err:
+        return FetchResult(url, error=err, seconds=loop.time() - time_start)
+
+
+async def crawl(
+    urls,
+    handle_result,
+    concurrency=64,
+    host_concurrency=2,
+    host_delay=1.0,
+    timeout=(5, 10),
+    verify=True,
+    content_types=content_types_html,
+    max_bytes=max_bytes_default,
+    host_failures=5,
+    host_cooldown=30.0,
+    retries=1,
+    validators=None,
+    skip=None,
+    max_bytes_types=None,
+    metrics=None,
+):
+    """
+    Fetches all urls concurrently while staying polite to every single host.
+
+    The urls are grouped by host. Each host gets `host_concurrency` workers that
+    share one HostThrottle, and all workers share a global limit of
+    `concurrency` open requests. So a large university can't block the others,
+    and no host sees more than `host_concurrency` parallel requests.
+
+    Every host also has a HostHealth: requests get an adaptive timeout from the
+    host's latency, and a host failing `host_failures` times in a row is paused
+    (circuit breaker). Urls failing with a transient error are retried up to
+    `retries` times after the host's other urls. Urls of a host that stays
+    broken are not reported as errors but returned as deferred, so a later run
+    can try them again.
+
+    Parameters
+    ----------
+    urls : iterable of str
+        The urls to fetch.
+    handle_result : callable
+        Coroutine function called with every FetchResult as soon as it's done.
+    concurrency : int
+        Maximum number of open requests over all hosts.
+    host_concurrency : int
+        Maximum number of open requests per host.
+    host_delay : float
+        Minimum seconds between two request starts on the same host.
+    timeout : tuple of (float, float)
+        Connect and read timeout in seconds (as for `requests.get`).
+    verify : bool
+        Verify SSL certificates.
+    content_types : tuple of str or None
+        Allowed media types, others are aborted after the headers (see
+        `fetch_url`).
+    max_bytes : int or None
+        Maximum body size in bytes, larger bodies are aborted.
+    host_failures : int
+        Consecutive transient failures that pause a host (see HostHealth).
+    host_cooldown : float
+        Seconds a host is paused after its first series of failures.
+    retries : int
+        Number of retries of a url after a transient failure.
+    validators : dict or None
+        (etag, last_modified, content hash) of earlier responses by url; these
+        urls are requested conditionally (see `conditional_headers`).
+    skip : callable or None
+        Called with every url right before its request; a url it returns True
+        for is not fetched (e.g. a variant of a page fetched meanwhile, see
+        scraping.urls.SeenUrls).
+    max_bytes_types : dict or None
+        Maximum body size by media type (see `fetch_url`).
+    metrics : scraping.telemetry.CrawlMetrics or None
+        Records every request, also the ones retried or deferred afterwards
+        (timeouts with the seconds until they timed out).
+
+    Returns
+    -------
+    deferred : list of str
+        The urls not tried (or not retried) because their host was broken.
+    """
+    queues = defaultdict(deque)
+    for url in urls:
+        queues[host_of(url)].append(url)
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    client_timeout = aiohttp.ClientTimeout(
+        total=None, sock_connect=timeout[0], sock_read=timeout[1]
+    )
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=0)
+    attempts = defaultdict(int)
+    deferred = []
+
+    async def host_worker(session, queue, retry, throttle, health):
+        while (queue or retry) and not health.dead:
+            url = queue.popleft() if queue else retry.popleft()
+            if skip is not None and skip(url):
+                continue
+            async with throttle:
+                # the breaker may have opened while waiting for the throttle
+                while not health.dead and (pause := health.pause(loop.time())) > 0:
+                    await asyncio.sleep(pause)
+                if health.dead:
+                    deferred.append(url)
+                    break
+                timeout_host = health.timeout()
+                started = loop.time()
+                async with semaphore:
+                    result = await fetch_url(
+                        session,
+                        url,
+                        verify,
+                        content_types,
+                        max_bytes,
+                        aiohttp.ClientTimeout(
+                            total=None,
+                            sock_connect=min(timeout[0], timeout_host),
+                            sock_read=timeout_host,
+                        ),
+                        (
+                            conditional_headers(*validators[url][:2])
+                            if validators and url in validators
+                            else None
+                        ),
+                        max_bytes_types,
+                    )
+
+            if metrics is not None:
+                metrics.record_fetch(result)
+            if not is_transient(result):
+                # the time until a failure isn't the host's latency
+                seconds = result.seconds if result.status is not None else None
+                health.record_success(seconds, started)
+            else:
+                health.record_failure(loop.time(), started)
+                attempts[url] += 1
+                if health.dead:
+                    deferred.append(url)
+                    continue
+                if attempts[url] <= retries:
+                    retry.append(url)
+                    continue
+            await handle_result(result)
+
+        if health.dead:
+            # leave the rest of a broken host to a later run
+            deferred.extend(queue)
+            deferred.extend(retry)
+            queue.clear()
+            retry.clear()
+
+    async with aiohttp.ClientSession(
+        headers=headers, timeout=client_timeout, connector=connector
+    ) as session:
+        workers = []
+        for queue in queues.values():
+            throttle = HostThrottle(host_concurrency, host_delay)
+            health = HostHealth(
+                timeout=timeout[1], failures_max=host_failures, cooldown=host_cooldown
+            )
+            retry = deque()
+            workers.extend(
+                host_worker(session, queue, retry, throttle, health)
+                for _ in range(min(host_concurrency, len(queue)))
+            )
+        await asyncio.gather(*workers)
+
+    return deferred
@@ -0,0 +1,337 @@
+import asyncio
+import hashlib
+import math
+import os
+import sqlite3
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+
+from scraping.fetch import headers, host_of
+from scraping.urls import canonical_url
+
+
+class BloomFilter:
+    """
+    Compact set of strings with false positives but no false negatives.
+
+    Takes about 1.8 bytes per item at a 0.1% error rate (18 MB for 10 million
+    urls), so the seen-set of a large crawl has a fixed size in memory.
+
+    Parameters
+    ----------
+    capacity : int
+        Number of items the error rate holds for.
+    error_rate : float
+        Probability that `add` takes a new item for a seen one.
+    """
+
+    def __init__(self, capacity=10_000_000, error_rate=0.001):
+        self.bits_num = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes_num = max(1, round(self.bits_num / capacity * math.log(2)))
+        self.bits = bytearray((self.bits_num + 7) // 8)
+        self.items = 0
+
+    def _positions(self, item):
+        # k positions from two 64-bit hashes (Kirsch-Mitzenmacher)
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits_num for i in range(self.hashes_num)]
+
+    def __contains__(self, item):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def add(self, item):
+        """
+        Adds an item; returns False if it was (probably) in the set already.
+        """
+        new = False
+        for p in self._positions(item):
+            if not self.bits[p >> 3] & (1 << (p & 7)):
+                self.bits[p >> 3] |= 1 << (p & 7)
+                new = True
+        self.items += new
+        return new
+
+
+def in_scope(host, domains):
+    """
+    Returns whether a host belongs to one of the domains (or a subdomain).
+    """
+    host = host.split(":")[0].removeprefix("www.")
+    return any(host == d or host.endswith(f".{d}") for d in domains)
+
+
+class RobotsCache:
+    """
+    Fetches and evaluates the robots.txt of every host once.
+
+    The files are kept in a SQLite table for `max_age` seconds, so a resumed
+    or repeated crawl doesn't request them again. As in RFC 9309 a missing
+    robots.txt (4xx) allows everything; an unreachable one (5xx, timeout)
+    disallows the host for this run and is not cached: its urls are deferred
+    (see `unreachable`), not given up.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        The database of the cache (see Frontier).
+    max_age : float
+        Seconds a robots.txt is reused.
+    user_agent : str
+        The user agent the rules are evaluated for.
+    """
+
+    def __init__(self, connection, max_age=86_400, user_agent=headers["User-Agent"]):
+        self.connection = connection
+        self.max_age = max_age
+        self.user_agent = user_agent
+        self.parsers = {}
+        self.hosts_unreachable = set()
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS robots (
+                host TEXT PRIMARY KEY,
+                body TEXT,
+                fetched_at REAL
+            )
+            """
+        )
+
+    def _parser(self, host, body):
+        parser = RobotFileParser()
+        if body is None:
+            parser.allow_all = True
+        else:
+            parser.parse(body.splitlines())
+        self.parsers[host] = parser
+
+    async def _fetch(self, session, url):
+        scheme = urlsplit(url).scheme
+        host = host_of(url)
+        try:
+            async with session.get(f"{scheme}://{host}/robots.txt") as response:
+                if response.status >= 500:
+                    raise aiohttp.ClientResponseError(
+                        response.request_info, (), status=response.status
+                    )
+                body = await response.text(errors="replace")
+                body = body if response.status < 400 else None
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            parser = RobotFileParser()
+            parser.disallow_all = True
+            self.parsers[host] = parser
+            self.hosts_unreachable.add(host)
+            return
+        self._parser(host, body)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO robots (host, body, fetched_at) VALUES (?, ?, ?)",
+            (host, body, time.time()),
+        )
+
+    async def load(self, urls, concurrency=32, timeout=10):
+        """
+        Makes sure the robots.txt of the hosts of all urls is loaded (from the
+        cache or fetched, at most `concurrency` at a time).
+        """
+        todo = {}
+        for url in urls:
+            host = host_of(url)
+            if host not in self.parsers and host not in todo:
+                todo[host] = url
+        cached = self.connection.execute(
+            "SELECT host, body FROM robots WHERE fetched_at > ?",
+            (time.time() - self.max_age,),
+        )
+        for host, body in cached:
+            if host in todo:
+                self._parser(host, body)
+                del todo[host]
+        if not todo:
+            return
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(url):
+            async with semaphore:
+                await self._fetch(session, url)
+
+        async with aiohttp.ClientSession(
+            headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as session:
+            await asyncio.gather(*(fetch(url) for url in todo.values()))
+        self.connection.commit()
+
+    def unreachable(self, url):
+        """
+        Returns whether the robots.txt of the host of the url couldn't be
+        fetched in this run.
+        """
+        return host_of(url) in self.hosts_unreachable
+
+    def allowed(self, url):
+        """
+        Returns whether the rules allow the url (its host must be loaded).
+        """
+        return self.parsers[host_of(url)].can_fetch(self.user_agent, url)
+
+
+class Frontier:
+    """
+    Disk-backed queue of the urls a link-discovery crawl still has to fetch.
+
+    Urls are kept in a SQLite table with their country, depth (links from the
+    seed) and a per-host rank. `next_batch` returns the lowest depth first and
+    interleaves the hosts (rank 0 of every host, then rank 1, ...), so a batch
+    spreads over many hosts. Which urls were queued once is decided by a
+    BloomFilter over their canonical form (see scraping.urls): a link that is
+    (probably) known is dropped without touching the disk. A false positive
+    just loses a link; the filter is rebuilt from the table when a crawl is
+    resumed.
+
+    Only links within the domains of the seeds are followed, up to `depth_max`
+    links away from a seed and `pages_max` urls per host. Queued links are
+    committed right away, before the pipeline records the page they were
+    found on as done, so a crash doesn't lose them. Urls that are `defer`red
+    stay queued for the next run.
+
+    Parameters
+    ----------
+    path : str
+        The SQLite file of the queue (and of the robots.txt cache).
+    depth_max : int
+        Maximum number of links between a seed and a queued url.
+    pages_max : int
+        Maximum number of urls queued per host.
+    capacity : int
+        Expected number of queued urls (size of the Bloom filter).
+    """
+
+    def __init__(self, path, depth_max=3, pages_max=1000, capacity=10_000_000):
+        self.depth_max = depth_max
+        self.pages_max = pages_max
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS frontier (
+                url TEXT PRIMARY KEY,
+                host TEXT NOT NULL,
+                country TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                rank INTEGER NOT NULL,
+                taken INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS frontier_next ON frontier (taken, depth, rank)"
+        )
+        self.robots = RobotsCache(self.connection)
+        self.domains = {}  # seed domains by country
+
+        # a batch taken before a crash and deferred urls are queued again (the
+        # crawl state skips finished urls)
+        self.connection.execute("UPDATE frontier SET taken = 0 WHERE taken IN (1, 3)")
+        self.connection.commit()
+        self.seen = BloomFilter(capacity)
+        for (url,) in self.connection.execute("SELECT url FROM frontier"):
+            self.seen.add(canonical_url(url))
+        self.pages = Counter(
+            dict(
+                self.connection.execute(
+                    "SELECT host, COUNT(*) FROM frontier GROUP BY host"
+                )
+            )
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_seeds(self, urls, country):
+        """
+        Queues the seed urls (depth 0) of a country; their domains are the
+        scope of the links followed.
+        """
+        domains = self.domains.setdefault(country, set())
+        for url in urls:
+            domains.add(host_of(url).split(":")[0].removeprefix("www."))
+        return self.add(urls, country, 0)
+
+    def add(self, urls, country, depth):
+        """
+        Queues the new urls in scope and commits them; returns their number.
+        """
+        if depth > self.depth_max:
+            return 0
+        rows = []
+        for url in urls:
+            host = host_of(url)
+            if self.pages[host] >= self.pages_max:
+                continue
+            if not in_scope(host, self.domains.get(country, ())):
+                continue
+            if not self.seen.add(canonical_url(url)):
+                continue
+            rows.append((url, host, country, depth, self.pages[host]))
+            self.pages[host] += 1
+        self.connection.executemany(
+            """
+            INSERT OR IGNORE INTO frontier (url, host, country, depth, rank)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        self.connection.commit()
+        return len(rows)
+
+    def next_batch(self, size=10_000):
+        """
+        Takes up to `size` queued urls of the lowest depth (hosts interleaved).
+
+        Returns a list of (url, country, depth).
+        """
+        batch = self.connection.execute(
+            """
+            SELECT url, country, depth FROM frontier
+            WHERE taken = 0 ORDER BY depth, rank LIMIT ?
+            """,
+            (size,),
+        ).fetchall()
+        self.connection.executemany(
+            "UPDATE frontier SET taken = 1 WHERE url = ?", [(b[0],) for b in batch]
+        )
+        self.connection.commit()
+        return batch
+
+    def finish_batch(self, batch):
+        """
+        Marks the urls of a batch as fetched (not queued again on resume),
+        except the deferred ones.
+        """
+        self.connection.executemany(
+            "UPDATE frontier SET taken = 2 WHERE url = ? AND taken = 1",
+            [(b[0],) for b in batch],
+        )
+        self.connection.commit()
+
+    def defer(self, urls):
+        """
+        Leaves urls of the current batch queued for the next run.
+        """
+        self.connection.executemany(
+            "UPDATE frontier SET taken = 3 WHERE url = ?", [(url,) for url in urls]
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,240 @@
+import json
+import os
+import shutil
+
+import polars as pl
+
+from scraping.keywords import KeywordMatcher
+from scraping.output import write_parquet_atomic
+
+
+index_dir_default = "data/scraping/keyword_index"
+
+
+def text_key(expr):
+    """
+    Returns the key of texts in the keyword index (a 64-bit hash of the text),
+    e.g. `data.with_columns(text_key=text_key(pl.col("text")))`.
+    """
+    return expr.hash(seed=0)
+
+
+def word_tokens(expr):
+    """
+    Returns the distinct words (\\w runs, as in the keyword regex) of a
+    lowercased text column as a list column.
+    """
+    return expr.str.to_lowercase().str.extract_all(r"\w+").list.unique()
+
+
+class KeywordIndex:
+    """
+    A persistent inverted index from the words of the cleaned texts to the
+    texts containing them, so a changed keyword list doesn't rescan every text.
+
+    The folder has the vocabulary (`vocab.parquet`: token, token_id) and
+    segments written by `update`: `texts-{n}.parquet` (text_id, text_key) and
+    `postings-{n}.parquet` (token_id, text_id, sorted by token_id, so lookups
+    read only the row groups of the tokens asked for). `meta.json` counts the
+    complete segments; an interrupted update leaves files that aren't counted
+    and are overwritten by the next one. Texts are keyed by their hash
+    (`text_key`), which polars doesn't keep stable across versions, so the
+    index is rebuilt when the polars version changes.
+
+    A keyword can only match a text if each of its words (\\w runs) is part of
+    a word of the text, and a strict keyword that is a single word only if it
+    is a word of the text. `candidates` looks this up for whole keyword lists;
+    the texts it returns are a superset of the texts with matches, which
+    `KeywordMatcher` then resolves exactly.
+
+    Parameters
+    ----------
+    directory : str
+        The index folder (created if missing).
+    """
+
+    def __init__(self, directory=index_dir_default):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        meta = {"polars": pl.__version__, "segments": 0}
+        file_meta = os.path.join(directory, "meta.json")
+        if os.path.isfile(file_meta):
+            with open(file_meta, encoding="utf-8") as f:
+                meta_saved = json.load(f)
+            if meta_saved["polars"] == meta["polars"]:
+                meta = meta_saved
+            else:
+                # text keys of another polars version: start over
+                shutil.rmtree(directory)
+                os.makedirs(directory)
+        self.segments = meta["segments"]
+
+    def _files(self, table):
+        return [
+            os.path.join(self.directory, f"{table}-{i:05d}.parquet")
+            for i in range(self.segments)
+        ]
+
+    def scan_texts(self):
+        """
+        Returns a LazyFrame with text_id and text_key of the indexed texts.
+        """
+        if not self.segments:
+            return pl.LazyFrame(schema={"text_id": pl.UInt32, "text_key": pl.UInt64})
+        return pl.scan_parquet(self._files("texts"))
+
+    def scan_postings(self):
+        """
+        Returns a LazyFrame with token_id and text_id, one row per distinct
+        word of each indexed text.
+        """
+        if not self.segments:
+            return pl.LazyFrame(schema={"token_id": pl.UInt32, "text_id": pl.UInt32})
+        return pl.scan_parquet(self._files("postings"))
+
+    def vocab(self):
+        """
+        Returns the vocabulary as a DataFrame: token, token_id.
+        """
+        file = os.path.join(self.directory, "vocab.parquet")
+        if not self.segments or not os.path.isfile(file):
+            return pl.DataFrame(schema={"token": pl.Utf8, "token_id": pl.UInt32})
+        return pl.read_parquet(file)
+
+    def update(self, texts):
+        """
+        Adds the texts (polars Series) that aren't indexed yet as a new segment
+        and returns their number. Texts no longer in the corpus stay in the
+        index; lookups are joined with the current corpus.
+        """
+        new = (
+            pl.DataFrame({"text": texts})
+            .drop_nulls()
+            .with_columns(text_key=text_key(pl.col("text")))
+            .unique(subset="text_key", keep="first", maintain_order=True)
+            .join(self.scan_texts().collect(), on="text_key", how="anti")
+        )
+        if not new.height:
+            return 0
+        text_id_start = self.scan_texts().select(pl.len()).collect().item()
+        new = new.with_columns(
+            text_id=pl.int_range(pl.len(), dtype=pl.UInt32) + text_id_start
+        )
+
+        # new words get ids after the known ones
+        vocab = self.vocab()
+        words = new.select("text_id", token=word_tokens(pl.col("text"))).explode(
+            "token"
+        )
+        words = words.drop_nulls("token")
+        tokens_new = (
+            words.select("token")
+            .unique(maintain_order=True)
+            .join(vocab, on="token", how="anti")
+            .with_columns(
+                token_id=pl.int_range(pl.len(), dtype=pl.UInt32) + vocab.height
+            )
+        )
+        vocab = pl.concat([vocab, tokens_new])
+        postings = (
+            words.join(vocab, on="token", how="left")
+            .select("token_id", "text_id")
+            .sort("token_id", "text_id")
+        )
+
+        name = f"{self.segments:05d}.parquet"
+        write_parquet_atomic(
+            new.select("text_id", "text_key").to_arrow(),
+            self.directory,
+            f"texts-{name}",
+        )
+        write_parquet_atomic(postings.to_arrow(), self.directory, f"postings-{name}")
+        write_parquet_atomic(vocab.to_arrow(), self.directory, "vocab.parquet")
+        self.segments += 1
+        file_meta = os.path.join(self.directory, "meta.json")
+        with open(f"{file_meta}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"polars": pl.__version__, "segments": self.segments}, f)
+        os.replace(f"{file_meta}.tmp", file_meta)
+        return new.height
+
+    def _lookup(self, parts):
+        # text_keys of the texts with all parts (part, exact: whole word) of
+        # a keyword: DataFrame keyword_id, text_key
+        vocab = self.vocab()
+        found = (
+            vocab.select(
+                "token",
+                "token_id",
+                part=pl.col("token").str.extract_many(
+                    parts["part"].unique().to_list(), overlapping=True
+                ),
+            )
+            .explode("part")
+            .drop_nulls("part")
+            .unique(subset=["token_id", "part"])
+            .join(parts, on="part")
+            .filter(~pl.col("exact") | (pl.col("token") == pl.col("part")))
+        )
+        postings = (
+            self.scan_postings()
+            .filter(pl.col("token_id").is_in(found["token_id"].unique().implode()))
+            .collect()
+        )
+        parts_num = parts.group_by("keyword_id").agg(
+            parts_num=pl.col("part").n_unique()
+        )
+        return (
+            found.join(postings, on="token_id")
+            .group_by("keyword_id", "text_id")
+            .agg(parts_num=pl.col("part").n_unique())
+            .join(parts_num, on=["keyword_id", "parts_num"], how="semi")
+            .join(self.scan_texts().collect(), on="text_id")
+            .select("keyword_id", "text_key")
+        )
+
+    def query(self, keyword, compound=False):
+        """
+        Returns the text_keys of the indexed texts that may contain a keyword
+        (strict: as a whole word, compound: as part of a word), for ad-hoc
+        exploration:
+
+            texts = data.filter(text_key(pl.col("text")).is_in(
+                index.query("gleichstellung", compound=True).implode()
+            ))
+        """
+        return self.candidates(
+            [] if compound else [keyword], [keyword] if compound else []
+        )
+
+    def candidates(self, keywords_strict, keywords_compound):
+        """
+        Returns the text_keys (polars Series) of the indexed texts in which the
+        keyword regex (scraping.keywords.keyword_pattern) can match, or None
+        if every text can (keywords with regex syntax or without any word).
+        """
+        matcher = KeywordMatcher(keywords_strict, keywords_compound)
+        if not matcher.is_literal:
+            return None
+        keywords = pl.DataFrame(
+            {
+                "keyword": list(matcher.rank_strict) + list(matcher.rank_compound),
+                "strict": [True] * len(matcher.rank_strict)
+                + [False] * len(matcher.rank_compound),
+            },
+            schema={"keyword": pl.Utf8, "strict": pl.Boolean},
+        )
+        parts = (
+            keywords.with_row_index("keyword_id")
+            .with_columns(part=pl.col("keyword").str.extract_all(r"\w+"))
+            .with_columns(
+                exact=pl.col("strict")
+                & (pl.col("part").list.join("") == pl.col("keyword"))
+            )
+        )
+        if parts["part"].list.len().min() == 0:
+            return None
+        return (
+            self._lookup(parts.explode("part").select("keyword_id", "part", "exact"))
+            .get_column("text_key")
+            .unique()
+        )
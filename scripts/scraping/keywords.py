@@ -0,0 +1,199 @@
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from itertools import chain
+
+import polars as pl
+
+
+_metachars = set(".^$*+?{}[]\\|()")
+
+
+def keyword_pattern(keywords_strict, keywords_compound):
+    """
+    Returns the regex of the keyword filter (2_1_filter_by_keywords.py):
+    strict keywords as whole words, compound keywords with the whole word
+    they are part of.
+    """
+    pattern_strict = r"\b(?:" + "|".join(keywords_strict) + r")\b"
+    pattern_compound = r"\w*(?:" + "|".join(keywords_compound) + r")\w*"
+    return f"(?i){pattern_strict}|{pattern_compound}"
+
+
+@lru_cache(maxsize=None)
+def is_word_char(char):
+    """
+    Returns whether a character is matched by \\w of the polars regex engine
+    (Unicode), so word boundaries are the same as in `keyword_pattern`.
+    """
+    return pl.Series([char]).str.contains(r"^\w$").item()
+
+
+_word_table = {}  # character -> "w" (word character) or " "
+
+
+def _word_mask(text):
+    # the text with "w" for word characters and " " for the others, so word
+    # boundaries and ends of words are found with str.find
+    for char in set(text).difference(map(chr, _word_table)):
+        _word_table[ord(char)] = "w" if is_word_char(char) else " "
+    return text.translate(_word_table)
+
+
+def _occurrences(text, keywords):
+    # (start, keyword) of all occurrences (overlapping) of the keywords
+    for keyword in keywords:
+        start = text.find(keyword)
+        while start >= 0:
+            yield start, keyword
+            start = text.find(keyword, start + 1)
+
+
+class KeywordMatcher:
+    """
+    Extracts the keywords of the keyword filter with an Aho-Corasick automaton
+    instead of the regex of `keyword_pattern`, with the same result.
+
+    The keywords occurring in each text are found by the polars Aho-Corasick
+    search (native, multi-threaded); texts without any are done. For the
+    others the occurrences of these keywords are resolved like the regex
+    does (leftmost-first, non-overlapping): at the first position where a match starts, a strict
+    keyword with word boundaries on both sides wins (the first one in list
+    order); otherwise the compound match runs from there over word
+    characters to the last compound keyword within that word (greedy \\w*)
+    and on to the end of the word.
+
+    Texts have to be lowercase (as in 2_1, the keywords are lowercased). If a
+    keyword isn't a plain string (regex syntax), the regex is used.
+
+    Parameters
+    ----------
+    keywords_strict : list of str
+        Keywords matched as whole words.
+    keywords_compound : list of str
+        Keywords matched as part of a word (the whole word is extracted).
+    """
+
+    def __init__(self, keywords_strict, keywords_compound):
+        self.pattern = keyword_pattern(keywords_strict, keywords_compound)
+        self.is_literal = not any(
+            _metachars.intersection(keyword)
+            for keyword in chain(keywords_strict, keywords_compound)
+        )
+        self.rank_strict, self.rank_compound = {}, {}
+        for keywords, rank in [
+            (keywords_strict, self.rank_strict),
+            (keywords_compound, self.rank_compound),
+        ]:
+            for i, keyword in enumerate(keywords):
+                rank.setdefault(keyword.lower(), i)
+        self.keywords = sorted(set(self.rank_strict) | set(self.rank_compound))
+
+    def resolve(self, text, found):
+        """
+        Returns the matches of the regex in a text, given the keywords that
+        occur in it.
+        """
+        mask, length = _word_mask(text), len(text)
+
+        def is_boundary(i):
+            return (i > 0 and mask[i - 1] == "w") != (i < length and mask[i] == "w")
+
+        def word_end(i):
+            end = mask.find(" ", i)
+            return length if end < 0 else end
+
+        strict, compound = {}, {}
+        for start, keyword in _occurrences(text, set(found)):
+            end = start + len(keyword)
+            rank = self.rank_strict.get(keyword)
+            if (
+                rank is not None
+                and rank < strict.get(start, (rank + 1,))[0]
+                and is_boundary(start)
+                and is_boundary(end)
+            ):
+                strict[start] = (rank, end)
+            rank = self.rank_compound.get(keyword)
+            if rank is not None and rank < compound.get(start, (rank + 1,))[0]:
+                compound[start] = (rank, end)
+        starts_strict, starts_compound = sorted(strict), sorted(compound)
+
+        matches, pos = [], 0
+        while True:
+            i_strict = bisect_left(starts_strict, pos)
+            i_compound = bisect_left(starts_compound, pos)
+            start_strict = start_compound = None
+            if i_strict < len(starts_strict):
+                start_strict = starts_strict[i_strict]
+            if i_compound < len(starts_compound):
+                # the first position a compound match can start: the start of
+                # the word in front of the next compound keyword
+                start_compound = mask.rfind(" ", pos, starts_compound[i_compound]) + 1
+                start_compound = max(start_compound, pos)
+
+            if start_strict is not None and (
+                start_compound is None or start_strict <= start_compound
+            ):
+                start, end = start_strict, strict[start_strict][1]
+            elif start_compound is not None:
+                # the last compound keyword within the word (greedy \w*), then
+                # on to the end of the word
+                start = start_compound
+                last = bisect_right(starts_compound, word_end(start)) - 1
+                end = word_end(compound[starts_compound[last]][1])
+            else:
+                return matches
+            matches.append(text[start:end])
+            pos = end
+
+    def _resolve_chunk(self, rows):
+        return [self.resolve(*row) for row in rows]
+
+    def extract_all(self, texts, executor=None, chunk_size=10_000):
+        """
+        Returns the list of matches of each text of a polars Series, like
+        `texts.str.extract_all(pattern)`. The texts with occurrences are
+        resolved in chunks of `chunk_size` (on the processes of `executor` if
+        given).
+        """
+        if not self.is_literal:
+            return texts.str.extract_all(self.pattern)
+
+        index = texts.str.contains_any(self.keywords).fill_null(False).arg_true()
+        found = pl.DataFrame({"text": texts.gather(index)}).select(
+            "text",
+            found=pl.col("text").str.extract_many(self.keywords, overlapping=True),
+        )
+        rows = list(found.iter_rows())
+        chunks = [rows[i : i + chunk_size] for i in range(0, len(rows), chunk_size)]
+        matches = (executor.map if executor else map)(self._resolve_chunk, chunks)
+
+        matches = pl.DataFrame(
+            {"index": index, "matches": list(chain.from_iterable(matches))},
+            schema={"index": index.dtype, "matches": pl.List(pl.Utf8)},
+        )
+        return (
+            pl.DataFrame({"text": texts})
+            .with_row_index("index")
+            .join(matches, on="index", how="left", maintain_order="left")
+            .select(
+                pl.when(pl.col("text").is_not_null()).then(
+                    pl.col("matches").fill_null(pl.lit([], pl.List(pl.Utf8)))
+                )
+            )
+            .to_series()
+            .alias(texts.name)
+        )
+
+    def expr(self, expr, executor=None):
+        """
+        Returns a polars expression with the keywords of a (lowercase) text
+        column (see `extract_all`), for use in select / with_columns:
+
+            data.with_columns(keywords=matcher.expr(pl.col("text").str.to_lowercase()))
+        """
+        return expr.map_batches(
+            lambda texts: self.extract_all(texts, executor),
+            return_dtype=pl.List(pl.Utf8),
+            is_elementwise=True,
+        )
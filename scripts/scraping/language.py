@@ -0,0 +1,102 @@
+import os
+
+import polars as pl
+from langdetect import DetectorFactory, detect
+from langdetect.lang_detect_exception import LangDetectException
+
+from scraping.dedup import text_hash
+from scraping.output import write_parquet_atomic
+
+
+# langdetect draws random samples of the text; with a seed every text gets the
+# same language on every run and in every process
+DetectorFactory.seed = 0
+
+schema_cache = {"text_hash": pl.Int64, "language": pl.Utf8}
+
+
+def detect_language(text: str) -> str:
+    """
+    Detects the language of a given text.
+    Returns 'eng', 'ger', 'Other', or 'Error'.
+    """
+    # Handle empty or invalid input
+    if not text or not isinstance(text, str) or text.isspace():
+        return "Other"
+
+    try:
+        lang = detect(text)
+        if lang == "en":
+            return "eng"
+        elif lang == "de":
+            return "ger"
+        else:
+            return "Other"
+    except LangDetectException:
+        # This exception is thrown for texts that are too short or ambiguous
+        return "Error"
+
+
+def detect_chunk(texts):
+    return [detect_language(text) for text in texts]
+
+
+def read_cache(file):
+    """
+    Returns the language cache (text_hash, language) of a parquet file, empty
+    if it doesn't exist yet.
+    """
+    if not os.path.isfile(file):
+        return pl.DataFrame(schema=schema_cache)
+    return pl.read_parquet(file)
+
+
+def detect_languages(texts, executor=None, chunk_size=1_000, file_cache=None):
+    """
+    Returns the language (see detect_language) of each text of a polars
+    Series.
+
+    Each distinct text is detected once, in chunks of `chunk_size` texts (on
+    the processes of `executor` if given). With `file_cache`, the languages
+    are kept in a parquet file by text hash (scraping.dedup.text_hash), so
+    texts of earlier runs aren't detected again; new ones are added. Delete
+    the file after changing the detection.
+    """
+    data = pl.DataFrame(
+        {
+            "text": texts,
+            "text_hash": [None if text is None else text_hash(text) for text in texts],
+        },
+        schema={"text": pl.Utf8, "text_hash": pl.Int64},
+    )
+    cache = read_cache(file_cache) if file_cache else pl.DataFrame(schema=schema_cache)
+    todo = (
+        data.drop_nulls("text_hash")
+        .unique(subset="text_hash", keep="first", maintain_order=True)
+        .join(cache, on="text_hash", how="anti")
+    )
+
+    if todo.height:
+        texts_todo = todo["text"].to_list()
+        chunks = [
+            texts_todo[i : i + chunk_size]
+            for i in range(0, len(texts_todo), chunk_size)
+        ]
+        languages = (executor.map if executor else map)(detect_chunk, chunks)
+        detected = todo.select(
+            "text_hash",
+            language=pl.Series([lang for chunk in languages for lang in chunk]),
+        )
+        cache = pl.concat([cache, detected])
+        if file_cache:
+            write_parquet_atomic(
+                cache.to_arrow(),
+                os.path.dirname(file_cache) or ".",
+                os.path.basename(file_cache),
+            )
+
+    return (
+        data.join(cache, on="text_hash", how="left", maintain_order="left")
+        .select(pl.col("language").fill_null("Other"))
+        .to_series()
+    )
@@ -0,0 +1,317 @@
+import os
+import tempfile
+
+import numpy as np
+import polars as pl
+
+
+def shingle_hashes(texts, shingle_words=3, seed=0):
+    """
+    Returns the hashed word shingles of a polars Series of texts.
+
+    Texts are lowercased and numbers replaced by "0" (so texts differing just
+    by a date or a number share their shingles). Every text has at least one
+    shingle (a text with fewer words than `shingle_words` is one shingle).
+
+    Returns
+    -------
+    hashes : numpy.ndarray of uint64
+        The shingle hashes, grouped by text (in order).
+    starts : numpy.ndarray of int64
+        The index of the first shingle of each text in `hashes`.
+    """
+    words = (
+        pl.DataFrame({"text": texts})
+        .select(
+            row=pl.int_range(pl.len(), dtype=pl.UInt32),
+            word=pl.col("text")
+            .str.to_lowercase()
+            .str.replace_all(r"\d+", "0")
+            .str.split(" "),
+        )
+        .explode("word")
+    )
+    same_row = [pl.col("row").shift(-i) == pl.col("row") for i in range(shingle_words)]
+    shingles = words.select(
+        "row",
+        first=(pl.col("row") != pl.col("row").shift(1)).fill_null(True),
+        complete=same_row[-1].fill_null(False),
+        shingle=pl.concat_str(
+            [
+                pl.when(same).then(pl.col("word").shift(-i))
+                for i, same in enumerate(same_row)
+            ],
+            separator=" ",
+            ignore_nulls=True,
+        ),
+    ).filter(pl.col("first") | pl.col("complete"))
+    hashes = shingles["shingle"].hash(seed).to_numpy()
+    starts = np.flatnonzero(shingles["first"].to_numpy())
+    return hashes, starts
+
+
+def minhash_signatures(texts, num_perm=64, shingle_words=3, seed=0):
+    """
+    Returns the MinHash signatures (num_perm uint32 values per text) of a
+    polars Series of texts, computed for the whole batch at once.
+
+    The permutations are random affine maps (a * x + b mod 2**32, a odd) of
+    the 32 bit shingle hashes, one vectorized pass over all shingles each; the
+    share of equal values of two signatures estimates the Jaccard similarity
+    of the shingle sets of the two texts.
+    """
+    hashes, starts = shingle_hashes(texts, shingle_words, seed)
+    hashes = (hashes >> np.uint64(32)).astype(np.uint32)
+    rng = np.random.default_rng(seed)
+    mult = rng.integers(0, 2**32, num_perm, dtype=np.uint32) | np.uint32(1)
+    add = rng.integers(0, 2**32, num_perm, dtype=np.uint32)
+
+    signatures = np.empty((len(starts), num_perm), dtype=np.uint32)
+    permuted = np.empty_like(hashes)
+    for i in range(num_perm):
+        np.multiply(hashes, mult[i], out=permuted)
+        np.add(permuted, add[i], out=permuted)
+        signatures[:, i] = np.minimum.reduceat(permuted, starts)
+    return signatures
+
+
+def band_keys(signatures, bands):
+    """
+    Returns one uint64 key per text and band (LSH banding): texts with equal
+    signature values in all rows of a band share the key of that band.
+    """
+    rows = signatures.shape[1] // bands
+    keys = np.zeros((len(signatures), bands), dtype=np.uint64)
+    for band in range(bands):
+        for value in signatures[:, band * rows : (band + 1) * rows].T:
+            keys[:, band] = keys[:, band] * np.uint64(1_000_003) + value
+    return keys
+
+
+def connected_components(edges_a, edges_b, num):
+    """
+    Returns the smallest node of the component of each node 0..num-1 of an
+    undirected graph given as edge arrays.
+    """
+    labels = np.arange(num)
+    while True:
+        labels_before = labels.copy()
+        np.minimum.at(labels, edges_a, labels[edges_b])
+        np.minimum.at(labels, edges_b, labels[edges_a])
+        labels = labels[labels]  # pointer jumping
+        if np.array_equal(labels, labels_before):
+            return labels
+
+
+class NearDuplicateIndex:
+    """
+    Finds near-identical texts (cookie banners, teasers, templated program
+    descriptions differing by a date or a name) within and across domains.
+
+    Texts are added in batches and get consecutive ids (`text_id`, from 0 in
+    the order added). For each batch the MinHash signatures are computed
+    vectorized and split into `bands` LSH bands; texts sharing a band key are
+    candidates, which are compared with the first text of their bucket. Pairs
+    with an estimated Jaccard similarity (of their word shingles) of at least
+    `threshold` are near duplicates, and their connected components are the
+    clusters.
+
+    With 64 permutations in 16 bands of 4, pairs with a similarity of 0.8
+    become candidates with a probability above 0.99, pairs of 0.3 with ~0.12
+    and unrelated texts hardly ever, so few pairs have to be compared.
+
+    The signatures and band keys of every batch are written to parquet files
+    in a temporary folder, not kept in memory. `clusters` groups the band keys
+    one of `key_parts` parts of the key space at a time (the files are sorted
+    by part, so a scan reads just the row groups of the part) and reads the
+    signatures of the candidates only, so the memory doesn't grow with the
+    number of texts added.
+
+    Parameters
+    ----------
+    num_perm : int
+        The length of the MinHash signatures.
+    bands : int
+        The number of LSH bands (num_perm must be a multiple of it).
+    threshold : float
+        The minimum estimated similarity of near duplicates.
+    shingle_words : int
+        The number of words per shingle.
+    seed : int
+        The seed of the shingle hashes and the permutations.
+    directory : str or None
+        The folder the temporary folder is created in (None for the system's
+        temporary folder).
+    key_parts : int
+        The number of parts of the key space grouped one after the other.
+    """
+
+    def __init__(
+        self,
+        num_perm=64,
+        bands=16,
+        threshold=0.8,
+        shingle_words=3,
+        seed=0,
+        directory=None,
+        key_parts=32,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.threshold = threshold
+        self.shingle_words = shingle_words
+        self.seed = seed
+        self.key_parts = key_parts
+        self.num = 0
+        self.batches = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._tmp = tempfile.TemporaryDirectory(dir=directory)
+        self.directory = self._tmp.name
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Deletes the files of the index.
+        """
+        self._tmp.cleanup()
+
+    def add(self, texts, include=None, batch_size=50_000):
+        """
+        Adds texts (polars Series). Texts where the boolean Series `include`
+        is false get an id but are never clustered. The signatures are
+        computed for `batch_size` texts at a time (the shingles of a batch
+        are in memory at once).
+        """
+        ids = np.arange(self.num, self.num + len(texts))
+        self.num += len(texts)
+        if include is not None:
+            include = include.fill_null(False).to_numpy()
+            ids, texts = ids[include], texts.filter(include)
+        for i in range(0, len(texts), batch_size):
+            signatures = minhash_signatures(
+                texts[i : i + batch_size], self.num_perm, self.shingle_words, self.seed
+            )
+            self._write_batch(ids[i : i + batch_size], signatures)
+
+    def _write_batch(self, ids, signatures):
+        name = f"{self.batches:06d}.parquet"
+        self.batches += 1
+        pl.DataFrame(
+            {"text_id": ids, "signature": signatures},
+            schema={
+                "text_id": pl.Int64,
+                "signature": pl.Array(pl.UInt32, self.num_perm),
+            },
+        ).write_parquet(
+            f"{self.directory}/signatures-{name}", compression="uncompressed"
+        )
+
+        keys = band_keys(signatures, self.bands)
+        (
+            pl.DataFrame(
+                {
+                    "text_id": np.repeat(ids, self.bands),
+                    "band": np.tile(np.arange(self.bands, dtype=np.uint8), len(ids)),
+                    "key": keys.ravel(),
+                },
+                schema={"text_id": pl.Int64, "band": pl.UInt8, "key": pl.UInt64},
+            )
+            .with_columns(part=(pl.col("key") % self.key_parts).cast(pl.UInt16))
+            .sort("part")
+            .write_parquet(
+                f"{self.directory}/keys-{name}",
+                compression="uncompressed",
+                row_group_size=16_384,
+            )
+        )
+
+    def _candidates(self):
+        # every text of a bucket with the first (smallest id) text of the
+        # bucket, one part of the key space at a time
+        keys = pl.scan_parquet(f"{self.directory}/keys-*.parquet")
+        edges = []
+        for part in range(self.key_parts):
+            keys_part = keys.filter(pl.col("part") == part).collect()
+            edges.append(
+                keys_part.join(
+                    keys_part.group_by("band", "key").agg(
+                        first=pl.col("text_id").min()
+                    ),
+                    on=["band", "key"],
+                )
+                .filter(pl.col("first") != pl.col("text_id"))
+                .select("first", "text_id")
+            )
+        edges = pl.concat(edges).unique()
+        return edges["first"].to_numpy(), edges["text_id"].to_numpy()
+
+    def clusters(self):
+        """
+        Returns the clusters of near duplicates as a DataFrame with the
+        `text_id` of every text in a cluster and the `cluster_id`, the
+        smallest text_id of its cluster (its representative).
+        """
+        schema = {"text_id": pl.Int64, "cluster_id": pl.Int64}
+        if not self.batches:
+            return pl.DataFrame(schema=schema)
+        edges_a, edges_b = self._candidates()
+
+        # the signatures of the candidates only
+        nodes = np.union1d(edges_a, edges_b)
+        signatures = (
+            pl.scan_parquet(f"{self.directory}/signatures-*.parquet")
+            .filter(pl.col("text_id").is_in(pl.Series(nodes).implode()))
+            .sort("text_id")
+            .collect()
+        )
+        signatures = signatures["signature"].to_numpy()
+        positions_a = np.searchsorted(nodes, edges_a)
+        positions_b = np.searchsorted(nodes, edges_b)
+
+        similar = np.zeros(len(edges_a), dtype=bool)
+        chunk_size = 100_000
+        for i in range(0, len(edges_a), chunk_size):
+            a = positions_a[i : i + chunk_size]
+            b = positions_b[i : i + chunk_size]
+            equal = (signatures[a] == signatures[b]).mean(axis=1)
+            similar[i : i + chunk_size] = equal >= self.threshold
+
+        # every text of a similar pair is in a cluster
+        nodes = np.union1d(edges_a[similar], edges_b[similar])
+        labels = connected_components(
+            np.searchsorted(nodes, edges_a[similar]),
+            np.searchsorted(nodes, edges_b[similar]),
+            len(nodes),
+        )
+        return pl.DataFrame(
+            {"text_id": nodes, "cluster_id": nodes[labels]}, schema=schema
+        )
+
+
+def fan_out(data, near_duplicates, columns=("country", "domain", "url")):
+    """
+    Fans rows of representatives back out to the near duplicates removed
+    while cleaning (1_2_scrape_clean_data.py), e.g. to count classification
+    labels per domain.
+
+    Every row of `data` with a `cluster_id` is repeated for each member of
+    the cluster in `near_duplicates`, with the member's `columns`; other rows
+    are kept as they are.
+    """
+    if "cluster_id" not in data.columns:
+        return data
+    # an all-null cluster_id column is read from csv as strings
+    data = data.with_columns(pl.col("cluster_id").cast(pl.Int64))
+    members = data.drop(columns).join(
+        near_duplicates.select(pl.col("cluster_id").cast(pl.Int64), *columns),
+        on="cluster_id",
+    )
+    return pl.concat([data, members.select(data.columns)], how="vertical_relaxed")
@@ -0,0 +1,226 @@
+import csv
+import os
+import shutil
+import time
+from itertools import zip_longest
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+schema_texts = pa.schema(
+    [
+        ("text", pa.string()),
+        ("text_length", pa.int64()),
+        ("tag", pa.string()),
+        ("url", pa.string()),
+        ("url_redirect", pa.string()),
+        ("text_hash", pa.int64()),
+    ]
+)
+schema_errors = pa.schema([("url", pa.string()), ("error", pa.string())])
+
+
+def init_csv(file, columns):
+    """
+    Writes a csv file with just the header row (if not existing yet).
+
+    Returns the columns of the file (the header of an existing file).
+    """
+    if not os.path.isfile(file):
+        with open(file, mode="w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+        return list(columns)
+    with open(file, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), list(columns))
+
+
+def fit_row(row, columns_num):
+    """
+    Pads (optional `text_hash` missing) or cuts a row to the number of columns.
+    """
+    return tuple(row[:columns_num]) + (None,) * (columns_num - len(row))
+
+
+class CsvOutput:
+    """
+    Appends extracted text rows and errors to the csv files of a country.
+
+    Both outputs share the same interface: `add` takes the result of one url,
+    `flush` makes everything added so far durable and returns the
+    (url, url_redirect, error) of these urls, so the crawl state never gets
+    ahead of the data on disk. The csv files stay open for the whole crawl and
+    are flushed on every call.
+
+    Text rows may carry a `text_hash` (see scraping.dedup.TextDedup). A csv
+    file started before that column existed keeps its header; `keeps_references`
+    tells whether repeated texts can be written as references.
+
+    Parameters
+    ----------
+    file_good : str
+        The path to the csv file to write extracted text to.
+    file_bad : str
+        The path to the csv file to write errors to.
+    """
+
+    def __init__(self, file_good, file_bad):
+        self.columns = init_csv(file_good, schema_texts.names)
+        self.keeps_references = "text_hash" in self.columns
+        init_csv(file_bad, ["url", "error"])
+        self._file_good = open(file_good, mode="a", newline="", encoding="utf-8")
+        self._file_bad = open(file_bad, mode="a", newline="", encoding="utf-8")
+        self._writer_good = csv.writer(self._file_good, lineterminator="\n")
+        self._writer_bad = csv.writer(self._file_bad, lineterminator="\n")
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, url, url_redirect, rows, error):
+        """
+        Adds the text rows (tuples in the order of `schema_texts`, the
+        `text_hash` is optional) or the error (code or message) of one url.
+        """
+        if error is None:
+            columns_num = len(self.columns)
+            self._writer_good.writerows(fit_row(row, columns_num) for row in rows)
+        else:
+            self._writer_bad.writerow([url, error])
+        self._pending.append((url, url_redirect, error))
+
+    def flush(self, force=False):
+        self._file_good.flush()
+        self._file_bad.flush()
+        committed, self._pending = self._pending, []
+        return committed
+
+    def close(self):
+        self._file_good.close()
+        self._file_bad.close()
+
+
+def write_parquet_atomic(table, directory, name=None):
+    """
+    Writes a table as a new part file of a parquet dataset folder (or replaces
+    the part file `name`).
+
+    The file is written under a temporary name, synced to disk and renamed, so
+    readers (and a crash) never see a half written part.
+    """
+    name = name or f"part-{time.time_ns()}.parquet"
+    file_tmp = os.path.join(directory, f".{name}.tmp")
+    pq.write_table(table, file_tmp, compression="zstd")
+    with open(file_tmp, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(file_tmp, os.path.join(directory, name))
+
+
+def replace_dir(src, dst):
+    """
+    Moves the folder `src` to `dst`, replacing the folder there (just removes
+    `dst` if `src` doesn't exist).
+
+    The old folder is renamed out of the way first, so `dst` is missing just
+    between two renames, never half written.
+    """
+    dst_old = f"{dst}.old"
+    shutil.rmtree(dst_old, ignore_errors=True)  # left by a crash
+    if os.path.isdir(dst):
+        os.replace(dst, dst_old)
+    if os.path.isdir(src):
+        os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+        os.replace(src, dst)
+    shutil.rmtree(dst_old, ignore_errors=True)
+
+
+class ParquetOutput:
+    """
+    Buffers extracted text rows and errors and writes them as parquet files.
+
+    Rows are collected in column buffers and written as one parquet part (one
+    row group) every `rows_per_flush` rows or `seconds_per_flush` seconds. The
+    parts go to hive style folders partitioned by country:
+
+        {directory}/scraped_data/country={country}/part-<ns>.parquet
+        {directory}/scraped_data_errors/country={country}/part-<ns>.parquet
+
+    Every part is durable once `flush` returned; see CsvOutput for the interface.
+
+    Parameters
+    ----------
+    directory : str
+        The root folder of the parquet datasets.
+    country : str
+        The country (partition) the rows belong to.
+    rows_per_flush : int
+        Number of buffered rows (texts and errors) that trigger a flush.
+    seconds_per_flush : float
+        Seconds after the last flush that trigger a flush.
+    """
+
+    def __init__(self, directory, country, rows_per_flush=50_000, seconds_per_flush=60):
+        self.dir_good = os.path.join(directory, "scraped_data", f"country={country}")
+        self.dir_bad = os.path.join(
+            directory, "scraped_data_errors", f"country={country}"
+        )
+        os.makedirs(self.dir_good, exist_ok=True)
+        os.makedirs(self.dir_bad, exist_ok=True)
+        self.rows_per_flush = rows_per_flush
+        self.seconds_per_flush = seconds_per_flush
+        self._texts = {name: [] for name in schema_texts.names}
+        self._errors = {name: [] for name in schema_errors.names}
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self.keeps_references = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, url, url_redirect, rows, error):
+        if error is None:
+            for row in rows:
+                for name, value in zip_longest(schema_texts.names, row):
+                    self._texts[name].append(value)
+        else:
+            self._errors["url"].append(url)
+            self._errors["error"].append(str(error))
+        self._pending.append((url, url_redirect, error))
+
+    def _buffered(self):
+        return len(self._texts["text"]) + len(self._errors["url"])
+
+    def flush(self, force=False):
+        due = (
+            force
+            or self._buffered() >= self.rows_per_flush
+            or time.monotonic() - self._last_flush >= self.seconds_per_flush
+        )
+        if not due or not self._pending:
+            return []
+
+        if self._texts["text"]:
+            write_parquet_atomic(
+                pa.Table.from_pydict(self._texts, schema=schema_texts), self.dir_good
+            )
+        if self._errors["url"]:
+            write_parquet_atomic(
+                pa.Table.from_pydict(self._errors, schema=schema_errors), self.dir_bad
+            )
+
+        self._texts = {name: [] for name in schema_texts.names}
+        self._errors = {name: [] for name in schema_errors.names}
+        self._last_flush = time.monotonic()
+        committed, self._pending = self._pending, []
+        return committed
+
+    def close(self):
+        # the last rows are flushed (and recorded) by the pipeline's writer
+        pass
@@ -0,0 +1,97 @@
+import io
+import re
+import signal
+import time
+
+from pypdf import PdfReader
+
+from scraping.extract import min_length
+
+
+content_types_pdf = ("application/pdf",)
+pdf_max_bytes = 20_000_000  # larger PDFs are aborted while downloading
+pdf_pages_max = 50  # just the first pages of long documents are extracted
+pdf_timeout = 30  # seconds per document
+
+_pattern_hyphen = re.compile(r"(\w)-\n(\w)")
+_pattern_sentence_end = re.compile(r"[.!?:;]\s*$")
+
+
+class PdfTimeout(Exception):
+    pass
+
+
+def pdf_paragraphs(text):
+    """
+    Splits the text of a PDF page into paragraphs.
+
+    The text layer has just lines: a paragraph ends at an empty line or at a
+    line that ends a sentence and is clearly shorter than the longest line
+    of the page (the ragged end of a paragraph).
+    """
+    text = _pattern_hyphen.sub(r"\1\2", text)
+    lines = [line.strip() for line in text.splitlines()]
+    width = max((len(line) for line in lines), default=0)
+
+    paragraphs, paragraph = [], []
+    for line in lines:
+        if line:
+            paragraph.append(line)
+        if paragraph and (
+            not line or (_pattern_sentence_end.search(line) and len(line) < 0.8 * width)
+        ):
+            paragraphs.append(" ".join(paragraph))
+            paragraph = []
+    if paragraph:
+        paragraphs.append(" ".join(paragraph))
+    return paragraphs
+
+
+def _raise_timeout(signum, frame):
+    raise PdfTimeout()
+
+
+def extract_pdf_rows(content, url, url_redirect=None, pages_max=pdf_pages_max):
+    """
+    Extracts the paragraphs of a PDF as text rows in the schema of
+    scraping.extract.extract_rows: a title row (from the document info) and
+    one row per paragraph of at least `min_length` characters with the tag
+    "pdf_p".
+    """
+    reader = PdfReader(io.BytesIO(content))
+    title = reader.metadata.title if reader.metadata else None
+    title = " ".join(str(title).split()) if title else "No title"
+    rows = [(title, len(title), "title", url, url_redirect)]
+
+    texts_seen = {title}
+    for page in reader.pages[:pages_max]:
+        for text in pdf_paragraphs(page.extract_text() or ""):
+            text = " ".join(text.split())
+            if len(text) >= min_length and text not in texts_seen:
+                texts_seen.add(text)
+                rows.append((text, len(text), "pdf_p", url, url_redirect))
+    return rows
+
+
+def parse_pdf(content, url, url_redirect, pages_max=pdf_pages_max, timeout=pdf_timeout):
+    """
+    Extracts the text rows of a PDF in a worker process, like
+    scraping.pipeline.parse_page. A document taking longer than `timeout`
+    seconds is aborted (SIGALRM, on Unix) with the error "pdf_timeout:<s>",
+    so the worker is free for the next one.
+    """
+    time_start = time.perf_counter()
+    alarm = hasattr(signal, "setitimer")
+    if alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        rows, error = extract_pdf_rows(content, url, url_redirect, pages_max), None
+    except PdfTimeout:
+        rows, error = [], f"pdf_timeout:{timeout}"
+    except Exception as err:
+        rows, error = [], f"pdf: {err}"
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return rows, error, time.perf_counter() - time_start
@@ -0,0 +1,401 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from scraping.extract import default_backend, extract_links, extract_rows
+from scraping.fetch import content_hash, content_types_html, crawl, mime_type
+from scraping.pdf import content_types_pdf, parse_pdf, pdf_max_bytes
+from scraping.telemetry import CrawlMetrics
+
+
+# runs in a row a url may be deferred before it is written as an error
+deferrals_max_default = 3
+
+
+class PipelineStats:
+    """
+    Counters of the scraping pipeline (urls per stage, rows, errors).
+
+    `report` returns a one line summary with the throughput of every stage and
+    the current depth of the queues between them.
+    """
+
+    def __init__(self):
+        self.time_start = time.perf_counter()
+        self.fetched = 0
+        self.parsed = 0
+        self.written = 0
+        self.rows = 0
+        self.references = 0
+        self.errors = 0
+        self.deferred = 0
+        self.unchanged = 0
+        self.duplicates = 0
+        self.pdfs = 0
+        self.pdfs_deferred = 0
+        self.urls_deferred = []
+        self.queues = {}
+        self.metrics = CrawlMetrics()
+
+    def seconds(self):
+        return time.perf_counter() - self.time_start
+
+    def report(self):
+        seconds = max(self.seconds(), 1e-9)
+        stages = ", ".join(
+            f"{name} {count} ({count / seconds:.1f}/s)"
+            for name, count in [
+                ("fetched", self.fetched),
+                ("parsed", self.parsed),
+                ("written", self.written),
+            ]
+        )
+        queues = ", ".join(
+            f"{name} {queue.qsize()}/{queue.maxsize}"
+            for name, queue in self.queues.items()
+        )
+        return (
+            f"[{seconds:.0f}s] {stages} | rows {self.rows}"
+            f" ({self.references} references), pdfs {self.pdfs}"
+            f" ({self.pdfs_deferred} deferred), errors {self.errors},"
+            f" deferred {self.deferred}, unchanged {self.unchanged},"
+            f" duplicates {self.duplicates}"
+            f" | queues: {queues}"
+        )
+
+
+def parse_page(content, url, url_redirect, parser):
+    """
+    Extracts the text rows of a page; runs in a worker process, so just the
+    raw page goes in and plain tuples (or the error message) and the parse time
+    in seconds come out.
+    """
+    time_start = time.perf_counter()
+    try:
+        rows, error = extract_rows(content, url, url_redirect, parser), None
+    except Exception as err:
+        rows, error = [], str(err)
+    return rows, error, time.perf_counter() - time_start
+
+
+def parse_page_links(content, url, url_redirect, parser, keep_pdf=False):
+    """
+    Like `parse_page`, but also returns the links of the page (see
+    scraping.extract.extract_links).
+    """
+    rows, error, seconds = parse_page(content, url, url_redirect, parser)
+    try:
+        links = extract_links(content, url_redirect or url, keep_pdf)
+    except Exception:
+        links = []
+    return rows, error, seconds, links
+
+
+async def run_pipeline(
+    urls,
+    output,
+    state,
+    parser=default_backend,
+    parse_workers=None,
+    queue_size=256,
+    report_every=10,
+    dedup=None,
+    metrics_files=None,
+    archive=None,
+    validators=None,
+    seen=None,
+    on_links=None,
+    pdf_workers=0,
+    deferrals_max=deferrals_max_default,
+    **crawl_args,
+):
+    """
+    Scrapes urls as a pipeline of three independent stages.
+
+    1. fetch: `scraping.fetch.crawl` downloads pages and puts them on a bounded
+       queue (blocks when parsing falls behind, so memory stays bounded).
+    2. parse: a ProcessPoolExecutor with `parse_workers` processes extracts the
+       text rows, using all cores independent of the fetch concurrency.
+    3. write: a single task adds rows and errors to `output` and records the
+       urls in the crawl `state` once the output flushed them to disk.
+
+    Urls the crawl deferred (host down or tarpitting) are recorded as deferred
+    in the `state`, not as errors, and are tried again by the next run; a url
+    deferred `deferrals_max` times in a row is written as an error.
+
+    Parameters
+    ----------
+    urls : list of str
+        The urls to scrape.
+    output : scraping.output.CsvOutput or scraping.output.ParquetOutput
+        Where the text rows and errors are written to.
+    state : scraping.state.CrawlState
+        The persistent status of all handled urls.
+    parser : str
+        The html parser backend (see scraping.extract.backends).
+    parse_workers : int or None
+        Number of parser processes (None for all cores).
+    queue_size : int
+        Maximum number of pages waiting in each queue.
+    report_every : float
+        Seconds between two progress lines (0 to disable).
+    dedup : scraping.dedup.TextDedup or None
+        Writes texts repeated within a domain as references (None to write all).
+    metrics_files : tuple of (str, str) or None
+        A json and a csv file the crawl telemetry (scraping.telemetry) is
+        written to every `report_every` seconds and at the end.
+    archive : scraping.archive.ArchiveWriter or None
+        Keeps the raw responses for an offline re-extraction.
+    validators : dict or None
+        (etag, last_modified, content hash) by url from an earlier crawl (see
+        CrawlState.load_validators). These urls are requested conditionally;
+        pages answered with 304 or with an unchanged body are not parsed or
+        written, just recorded as done. The validators of every written page
+        are stored in the `state` in any case.
+    seen : scraping.urls.SeenUrls or None
+        Canonical forms of the fetched pages and the redirect map. A url whose
+        canonical form or known redirect target was fetched already (earlier or
+        in this crawl) is recorded as duplicate without a request; the
+        redirects of every response are added to the map and to the `state`.
+    on_links : callable or None
+        Called with the url and the links of every parsed page (link
+        discovery, see scraping.frontier); links to PDFs are kept if
+        `pdf_workers` > 0.
+    pdf_workers : int
+        Number of processes extracting the text of PDFs (0 to skip PDFs, like
+        any other body that is not html). PDFs go through their own queue and
+        process pool with page, size and time limits (see scraping.pdf), so a
+        large document never blocks the html parsers. A PDF arriving while the
+        queue is full is deferred ("pdf_backlog") instead of waiting, so slow
+        PDFs never hold up the html pages and the crawl.
+    deferrals_max : int
+        Number of runs in a row a url is deferred before it is given up and
+        written as an error ("host_down").
+    **crawl_args
+        Passed on to `scraping.fetch.crawl` (concurrency, host limits, ...).
+
+    Returns
+    -------
+    stats : PipelineStats
+        The counters of the finished run; `urls_deferred` lists the urls
+        deferred to the next run.
+    """
+    loop = asyncio.get_running_loop()
+    parse_workers = parse_workers or os.cpu_count()
+    fetched = asyncio.Queue(maxsize=queue_size)
+    parsed = asyncio.Queue(maxsize=queue_size)
+    stats = PipelineStats()
+    # PDFs waiting for a worker (up to 20 MB each, see scraping.pdf)
+    pdfs = asyncio.Queue(maxsize=max(pdf_workers * 8, 1))
+    stats.queues = {"fetched": fetched, "parsed": parsed}
+    if pdf_workers:
+        stats.queues["pdfs"] = pdfs
+        crawl_args.setdefault("content_types", content_types_html + content_types_pdf)
+        crawl_args.setdefault(
+            "max_bytes_types", {mime: pdf_max_bytes for mime in content_types_pdf}
+        )
+    validators = validators or {}
+    validators_new = {}  # of pages not yet durable in the output
+
+    async def handle_result(result):
+        stats.fetched += 1
+        if seen is not None and result.error is None:
+            state.add_redirects(seen.learn(result))
+        if archive is not None:
+            archive.write(result)
+        await fetched.put(result)
+
+    async def parse_stage(pool):
+        while (result := await fetched.get()) is not None:
+            url = result.url
+            url_redirect = result.url_final if result.redirected else None
+
+            # errors include bodies aborted by content type or size (see fetch)
+            if result.error is not None:
+                item = (url, None, [], result.error)
+            elif unchanged(result):
+                item = (url, url_redirect, None, None)
+            elif pdf_workers and mime_type(result.content_type) in content_types_pdf:
+                try:
+                    pdfs.put_nowait((url, url_redirect, result.content))
+                    continue
+                except asyncio.QueueFull:
+                    stats.pdfs_deferred += 1
+                    if defer(url, "pdf_backlog"):
+                        continue
+                    item = (url, None, [], "pdf_backlog")
+            else:
+                if on_links is None:
+                    rows, error, seconds = await loop.run_in_executor(
+                        pool, parse_page, result.content, url, url_redirect, parser
+                    )
+                else:
+                    rows, error, seconds, links = await loop.run_in_executor(
+                        pool,
+                        parse_page_links,
+                        result.content,
+                        url,
+                        url_redirect,
+                        parser,
+                        pdf_workers > 0,
+                    )
+                    on_links(url, links)
+                stats.metrics.record_parse(seconds, len(rows))
+                if error is not None:
+                    stats.metrics.record_error(url, error)
+                item = (url, url_redirect, rows, error)
+
+            stats.parsed += 1
+            await parsed.put(item)
+
+    async def pdf_stage(pool):
+        while (item := await pdfs.get()) is not None:
+            url, url_redirect, content = item
+            rows, error, seconds = await loop.run_in_executor(
+                pool, parse_pdf, content, url, url_redirect
+            )
+            stats.metrics.record_parse(seconds, len(rows))
+            if error is not None:
+                stats.metrics.record_error(url, error)
+            stats.pdfs += 1
+            stats.parsed += 1
+            await parsed.put((url, url_redirect, rows, error))
+
+    def defer(url, reason):
+        # left for the next run, unless it was deferred too often already
+        stats.metrics.record_error(url, reason)
+        if state.deferrals(url) + 1 >= deferrals_max:
+            return False
+        state.mark_deferred(url, reason)
+        stats.urls_deferred.append(url)
+        stats.deferred += 1
+        return True
+
+    def duplicate(url):
+        # skipped before its request, the state points to the fetched variant
+        url_original = seen.duplicate_of(url)
+        if url_original is None or url_original == url:
+            return False
+        state.mark_duplicate(url, url_original)
+        stats.duplicates += 1
+        return True
+
+    def unchanged(result):
+        # 304 or same body as in the last crawl; keeps the new validators
+        validators_old = validators.get(result.url)
+        if result.status == 304:
+            hash_ = validators_old[2] if validators_old else None
+        else:
+            hash_ = content_hash(result.content)
+        validators_new[result.url] = (
+            result.header("ETag"),
+            result.header("Last-Modified"),
+            hash_,
+        )
+        return result.status == 304 or (
+            validators_old is not None and validators_old[2] == hash_
+        )
+
+    def record(committed):
+        # urls are recorded only after their rows are durable in the output
+        if archive is not None and committed:
+            archive.flush()
+        for url, url_redirect, error in committed:
+            if error is None:
+                state.mark_done(url, url_redirect)
+                if url in validators_new:
+                    state.set_validators(url, *validators_new.pop(url))
+            else:
+                state.mark_error(url, error)
+                validators_new.pop(url, None)
+        stats.written += len(committed)
+
+    async def write_stage():
+        while True:
+            try:
+                item = await asyncio.wait_for(parsed.get(), timeout=1)
+            except asyncio.TimeoutError:
+                record(output.flush())  # time based flush while idle
+                continue
+            if item is None:
+                break
+
+            url, url_redirect, rows, error = item
+            if rows is None:
+                # unchanged since the last crawl: nothing to parse or write
+                state.mark_done(url, url_redirect)
+                state.set_validators(url, *validators_new.pop(url))
+                stats.unchanged += 1
+                continue
+            if error is None and dedup is not None:
+                references = dedup.references
+                rows = dedup.apply(url, url_redirect, rows)
+                stats.references += dedup.references - references
+            output.add(url, url_redirect, rows, error)
+            if error is None:
+                stats.rows += len(rows)
+            else:
+                stats.errors += 1
+
+            # flush once for everything waiting, not once per url
+            if parsed.empty():
+                record(output.flush())
+
+        record(output.flush(force=True))
+
+    async def report_stage():
+        while True:
+            await asyncio.sleep(report_every)
+            print(stats.report())
+            if metrics_files:
+                stats.metrics.write(*metrics_files)
+
+    # one dispatcher per pending job keeps every worker process busy
+    parse_tasks_num = parse_workers * 2
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as pool, ProcessPoolExecutor(
+        max_workers=max(pdf_workers, 1)
+    ) as pdf_pool:
+        parse_tasks = [
+            asyncio.create_task(parse_stage(pool)) for _ in range(parse_tasks_num)
+        ]
+        pdf_tasks = [
+            asyncio.create_task(pdf_stage(pdf_pool)) for _ in range(pdf_workers * 2)
+        ]
+        write_task = asyncio.create_task(write_stage())
+        report_task = asyncio.create_task(report_stage()) if report_every else None
+
+        deferred = await crawl(
+            urls,
+            handle_result,
+            validators=validators,
+            skip=duplicate if seen is not None else None,
+            metrics=stats.metrics,
+            **crawl_args,
+        )
+
+        for _ in parse_tasks:
+            await fetched.put(None)
+        await asyncio.gather(*parse_tasks)
+        for _ in pdf_tasks:
+            await pdfs.put(None)
+        await asyncio.gather(*pdf_tasks)
+        await parsed.put(None)
+        await write_task
+
+        if report_task:
+            report_task.cancel()
+
+    # urls of broken hosts are left for the next run (a few times)
+    for url in deferred:
+        if not defer(url, "host_down"):
+            output.add(url, None, [], "host_down")
+            stats.errors += 1
+    record(output.flush(force=True))
+
+    print(stats.report())
+    print(stats.metrics.summary())
+    if metrics_files:
+        stats.metrics.write(*metrics_files)
+    return stats
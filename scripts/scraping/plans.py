@@ -0,0 +1,41 @@
+import re
+
+
+# how polars prints Python callbacks in a plan: map_elements / map_batches
+# expressions, LazyFrame.map_batches and scans of Python sources
+_pattern_udf = re.compile(r"python_udf|OPAQUE_PYTHON|PYTHON SCAN")
+
+
+def python_udfs(query, optimized=True):
+    """
+    Returns the nodes of a LazyFrame plan that call back into Python (one plan
+    line per node, stripped).
+
+    Such nodes run row by row or batch by batch under the GIL: they are not
+    parallelized and keep the plan from streaming, so a cleaning query should
+    have none of them.
+    """
+    plan = query.explain(optimized=optimized)
+    return [line.strip() for line in plan.splitlines() if _pattern_udf.search(line)]
+
+
+def udf_report(query, name="query"):
+    """
+    Returns a short text listing the Python UDF nodes of a LazyFrame plan (see
+    `python_udfs`).
+    """
+    nodes = python_udfs(query)
+    if not nodes:
+        return f"{name}: no Python UDFs"
+    lines = [f"{name}: {len(nodes)} plan node(s) with Python UDFs"]
+    lines += [f"  {node}" for node in nodes]
+    return "\n".join(lines)
+
+
+def check_native(query, name="query"):
+    """
+    Raises a ValueError if a LazyFrame plan calls back into Python, so a
+    map_elements that slips into a native query is caught before running it.
+    """
+    if python_udfs(query):
+        raise ValueError(udf_report(query, name))
@@ -0,0 +1,128 @@
+class RoutedOutput:
+    """
+    Output of a crawl over several countries: every url's rows and errors go
+    to the output (see scraping.output) of the country the url belongs to.
+
+    Parameters
+    ----------
+    outputs : dict of str to CsvOutput or ParquetOutput
+        The output per country.
+    country_of : dict of str to str
+        The country of every url.
+    """
+
+    def __init__(self, outputs, country_of):
+        self.outputs = outputs
+        self.country_of = country_of
+        self.keeps_references = all(
+            output.keeps_references for output in outputs.values()
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, url, url_redirect, rows, error):
+        self.outputs[self.country_of[url]].add(url, url_redirect, rows, error)
+
+    def flush(self, force=False):
+        committed = []
+        for output in self.outputs.values():
+            committed.extend(output.flush(force))
+        return committed
+
+    def close(self):
+        for output in self.outputs.values():
+            output.close()
+
+
+class RoutedState:
+    """
+    Crawl state of a crawl over several countries: every url is recorded in
+    the CrawlState (see scraping.state) of its country. The redirect map is
+    shared by all countries and kept in every state, so a later run of some
+    of the countries has all of it.
+
+    Parameters
+    ----------
+    states : dict of str to CrawlState
+        The crawl state per country.
+    country_of : dict of str to str
+        The country of every url.
+    """
+
+    def __init__(self, states, country_of):
+        self.states = states
+        self.country_of = country_of
+        # every state gets the redirects known to any of them (learned in runs
+        # with other countries)
+        if len(states) > 1:
+            redirects = {}
+            for state in states.values():
+                redirects.update(state.load_redirects())
+            self.add_redirects(redirects.items())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def mark_done(self, url, url_redirect=None):
+        self.states[self.country_of[url]].mark_done(url, url_redirect)
+
+    def mark_error(self, url, error):
+        self.states[self.country_of[url]].mark_error(url, error)
+
+    def mark_deferred(self, url, reason="host_down"):
+        self.states[self.country_of[url]].mark_deferred(url, reason)
+
+    def deferrals(self, url):
+        return self.states[self.country_of[url]].deferrals(url)
+
+    def mark_duplicate(self, url, url_original):
+        self.states[self.country_of[url]].mark_duplicate(url, url_original)
+
+    def add_redirects(self, redirects):
+        redirects = list(redirects)
+        for state in self.states.values():
+            state.add_redirects(redirects)
+
+    def set_validators(self, url, etag, last_modified, content_hash):
+        self.states[self.country_of[url]].set_validators(
+            url, etag, last_modified, content_hash
+        )
+
+    def close(self):
+        for state in self.states.values():
+            state.close()
+
+
+class RoutedArchive:
+    """
+    Raw response archive of a crawl over several countries: every page goes to
+    the ArchiveWriter (see scraping.archive) of its url's country.
+    """
+
+    def __init__(self, archives, country_of):
+        self.archives = archives
+        self.country_of = country_of
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, result):
+        self.archives[self.country_of[result.url]].write(result)
+
+    def flush(self):
+        for archive in self.archives.values():
+            archive.flush()
+
+    def close(self):
+        for archive in self.archives.values():
+            archive.close()
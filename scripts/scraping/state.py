@@ -0,0 +1,283 @@
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+
+class CrawlState:
+    """
+    Persistent status of every url the scraper has handled (SQLite file).
+
+    Each url is stored once with its status ("done", "error", "deferred" or
+    "duplicate"),
+    the error code, the redirect target and a timestamp. Resuming a crawl just
+    needs the url column of this table, not the scraped texts in the csv files.
+    Deferred urls (their host was down, see scraping.fetch.crawl) are tried
+    again by the next crawl; the number of times in a row a url was deferred
+    is kept, so the pipeline can give it up as an error.
+
+    A second table keeps the HTTP validators (ETag, Last-Modified) and the
+    content hash of the last successful response per url, so a refresh crawl
+    can send conditional requests and skip unchanged pages. A third one is the
+    redirect map (canonical url to canonical target, see scraping.urls) learned
+    from the redirect chains of all responses.
+
+    Parameters
+    ----------
+    path : str
+        The path to the SQLite file (created if missing).
+    commit_every : int
+        Number of updates after which they are committed to disk.
+    """
+
+    def __init__(self, path, commit_every=100):
+        self.path = path
+        self.commit_every = commit_every
+        self._pending = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS urls (
+                url_id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL,
+                error TEXT,
+                url_redirect TEXT,
+                scraped_at REAL,
+                deferrals INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(urls)")]
+        if "deferrals" not in columns:
+            # state file of an earlier version
+            self.connection.execute(
+                "ALTER TABLE urls ADD COLUMN deferrals INTEGER NOT NULL DEFAULT 0"
+            )
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash INTEGER
+            )
+            """
+        )
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS redirects (
+                url TEXT PRIMARY KEY,
+                target TEXT NOT NULL
+            )
+            """
+        )
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def _update(self, url, status, error=None, url_redirect=None):
+        self.connection.execute(
+            """
+            INSERT INTO urls (url, status, error, url_redirect, scraped_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                status = excluded.status,
+                error = excluded.error,
+                url_redirect = excluded.url_redirect,
+                scraped_at = excluded.scraped_at,
+                deferrals = 0
+            """,
+            (url, status, error, url_redirect, time.time()),
+        )
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def mark_done(self, url, url_redirect=None):
+        """
+        Records a successfully scraped url (and its redirect target).
+        """
+        self._update(url, "done", url_redirect=url_redirect)
+
+    def mark_error(self, url, error):
+        """
+        Records a url that failed with the given error (code or message).
+        """
+        self._update(url, "error", error=str(error))
+
+    def mark_deferred(self, url, reason="host_down"):
+        """
+        Records a url left for a later crawl because its host was broken (or
+        its robots.txt unreachable).
+        """
+        self.connection.execute(
+            """
+            INSERT INTO urls (url, status, error, scraped_at, deferrals)
+            VALUES (?, 'deferred', ?, ?, 1)
+            ON CONFLICT(url) DO UPDATE SET
+                status = 'deferred',
+                error = excluded.error,
+                scraped_at = excluded.scraped_at,
+                deferrals = deferrals + 1
+            """,
+            (url, reason, time.time()),
+        )
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def deferrals(self, url):
+        """
+        Returns the number of times in a row the url was deferred.
+        """
+        row = self.connection.execute(
+            "SELECT deferrals FROM urls WHERE url = ?", (url,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def mark_duplicate(self, url, url_original):
+        """
+        Records a url skipped as a variant of an already fetched url.
+        """
+        self._update(url, "duplicate", url_redirect=url_original)
+
+    def add_redirects(self, redirects):
+        """
+        Adds (canonical url, canonical target) pairs to the redirect map.
+        """
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO redirects (url, target) VALUES (?, ?)", redirects
+        )
+
+    def load_redirects(self):
+        """
+        Returns the redirect map as a dict (canonical url to canonical target).
+        """
+        return dict(self.connection.execute("SELECT url, target FROM redirects"))
+
+    def urls_fetched(self):
+        """
+        Returns the (requested url, final url or None) of all successfully
+        scraped urls.
+        """
+        return self.connection.execute(
+            "SELECT url, url_redirect FROM urls WHERE status = 'done'"
+        ).fetchall()
+
+    def set_validators(self, url, etag, last_modified, content_hash):
+        """
+        Records the validators and content hash of a url's latest response.
+        """
+        self.connection.execute(
+            """
+            INSERT OR REPLACE INTO validators (url, etag, last_modified, content_hash)
+            VALUES (?, ?, ?, ?)
+            """,
+            (url, etag, last_modified, content_hash),
+        )
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def load_validators(self, urls):
+        """
+        Returns {url: (etag, last_modified, content_hash)} for the given urls.
+        """
+        urls = set(urls)
+        return {
+            url: tuple(validators)
+            for url, *validators in self.connection.execute(
+                "SELECT url, etag, last_modified, content_hash FROM validators"
+            )
+            if url in urls
+        }
+
+    def urls_scraped(self):
+        """
+        Returns the set of all successfully scraped urls (status done).
+        """
+        return {
+            url
+            for (url,) in self.connection.execute(
+                "SELECT url FROM urls WHERE status = 'done'"
+            )
+        }
+
+    def status(self, url):
+        """
+        Returns the status of a url ("done", "error", "deferred", "duplicate")
+        or None if unknown.
+        """
+        row = self.connection.execute(
+            "SELECT status FROM urls WHERE url = ?", (url,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def urls_done(self):
+        """
+        Returns the set of all urls with a final status (done, error or
+        duplicate).
+        """
+        return {
+            url
+            for (url,) in self.connection.execute(
+                "SELECT url FROM urls WHERE status != 'deferred'"
+            )
+        }
+
+    def filter_todo(self, urls):
+        """
+        Returns the urls without a final status, keeping their order.
+        """
+        urls_done = self.urls_done()
+        return [url for url in urls if url not in urls_done]
+
+    def commit(self):
+        self.connection.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def import_csv(self, file_good, file_bad, chunksize=100_000):
+        """
+        Fills the state from the csv files of an earlier crawl (one time migration).
+
+        Reads just the url columns in chunks, so the texts are never held in memory.
+        """
+        if os.path.isfile(file_good):
+            for chunk in pd.read_csv(
+                file_good, usecols=["url", "url_redirect"], chunksize=chunksize
+            ):
+                chunk = chunk.drop_duplicates(subset=["url"])
+                self.connection.executemany(
+                    """
+                    INSERT OR IGNORE INTO urls (url, status, url_redirect)
+                    VALUES (?, 'done', ?)
+                    """,
+                    chunk.astype(object)
+                    .where(chunk.notna(), None)
+                    .itertuples(index=False, name=None),
+                )
+        if os.path.isfile(file_bad):
+            for chunk in pd.read_csv(file_bad, chunksize=chunksize, dtype=str):
+                self.connection.executemany(
+                    """
+                    INSERT OR IGNORE INTO urls (url, status, error)
+                    VALUES (?, 'error', ?)
+                    """,
+                    chunk[["url", "error"]].itertuples(index=False, name=None),
+                )
+        self.commit()
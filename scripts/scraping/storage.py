@@ -0,0 +1,387 @@
+import glob
+import json
+import os
+import shutil
+import time
+
+import polars as pl
+
+from scraping.dataset import scan_scraped_data, scan_scraped_file, scraped_files
+from scraping.domains import domain_expr
+from scraping.output import replace_dir
+
+
+store_dir_default = "data/scraping/store"
+
+
+def write_store(wide, store_dir, store_old=None, row_group_size=50_000):
+    """
+    Writes text rows in the scraper's columns (plus country) as a normalized
+    parquet store, appended to the rows of the store `store_old` if given.
+
+    Instead of repeating url, redirect, domain and country strings on every text
+    row, the store has three tables:
+
+    - domains.parquet: domain_id, domain
+    - urls.parquet: url_id, url, url_redirect, domain_id, country
+    - texts.parquet: url_id, tag (categorical), text, text_length, text_hash
+
+    The ids are given in sorted order (domains by name, urls by country, domain
+    and url), so within a country sorting by the ids gives the same order as
+    sorting by the strings; the ids of `store_old` are given anew. Text rows
+    are sorted by url_id (the rows of a url in scraped order, those of
+    `store_old` first) and written in row groups of `row_group_size` rows, so a
+    scan of the urls of a partition (see `partition_filter`) reads just the
+    row groups of their id range. The domain (of the redirect if there was
+    one) is extracted once per url, not once per text row. Texts that the
+    scraper wrote as references (see scraping.dedup) stay references; the
+    text_hash is kept only for them and the texts they point to (references
+    point to texts of the same crawl, so the rows of `store_old` are not needed
+    for that).
+    """
+    os.makedirs(store_dir, exist_ok=True)
+
+    # 1. one row per url (small: ~100k urls instead of ~1M text rows)
+    urls = (
+        wide.select("country", "url", "url_redirect")
+        .unique(subset=["country", "url"], keep="first", maintain_order=True)
+        .collect()
+    )
+    if store_old is not None:
+        urls_old = (
+            scan_store_urls(store_old)
+            .select("country", "url", "url_redirect", "domain")
+            .collect()
+        )
+        urls = urls.join(urls_old, on=["country", "url"], how="anti")
+    # the domain of every new url (of the redirect if there was one)
+    urls = urls.with_columns(domain=domain_expr(pl.coalesce("url_redirect", "url")))
+    if store_old is not None:
+        urls = pl.concat([urls_old, urls])
+
+    # 2. ids in sorted order
+    domains = urls.select("domain").unique().sort("domain").with_row_index("domain_id")
+    urls = (
+        urls.join(domains, on="domain", how="left")
+        .sort("country", "domain", "url")
+        .with_row_index("url_id")
+        .select("url_id", "url", "url_redirect", "domain_id", "country")
+    )
+    domains.write_parquet(f"{store_dir}/domains.parquet", compression="zstd")
+    urls.with_columns(pl.col("country").cast(pl.Categorical)).write_parquet(
+        f"{store_dir}/urls.parquet", compression="zstd"
+    )
+
+    # 3. text rows reference their url by id (sorted by it, in file order within
+    # a url); hashes are kept just where needed: references and the texts they
+    # point to
+    hashes_referenced = (
+        wide.filter(pl.col("text").is_null())
+        .select(pl.col("text_hash").unique())
+        .collect()
+        .to_series()
+    )
+    texts = wide.join(
+        urls.lazy().select("url_id", "url", "country"),
+        on=["country", "url"],
+        how="left",
+        maintain_order="left",
+    ).select(
+        "url_id",
+        pl.col("tag").cast(pl.Utf8),
+        "text",
+        pl.col("text_length").cast(pl.Int32),
+        pl.when(pl.col("text_hash").is_in(hashes_referenced.implode()))
+        .then("text_hash")
+        .alias("text_hash"),
+    )
+    if store_old is not None:
+        ids = (
+            scan_store_urls(store_old)
+            .select("country", "url", url_id_old="url_id")
+            .join(urls.lazy().select("url_id", "country", "url"), on=["country", "url"])
+            .select("url_id_old", "url_id")
+        )
+        texts_old = (
+            pl.scan_parquet(f"{store_old}/texts.parquet")
+            .rename({"url_id": "url_id_old"})
+            .join(ids, on="url_id_old", how="left", maintain_order="left")
+            .select(
+                "url_id",
+                pl.col("tag").cast(pl.Utf8),
+                "text",
+                "text_length",
+                "text_hash",
+            )
+        )
+        texts = pl.concat([texts_old, texts])
+    texts.sort("url_id", maintain_order=True).with_columns(
+        pl.col("tag").cast(pl.Categorical)
+    ).sink_parquet(
+        f"{store_dir}/texts.parquet",
+        compression="zstd",
+        statistics=True,
+        row_group_size=row_group_size,
+    )
+
+
+def build_store(countries, directory="data/scraping", store_dir=store_dir_default):
+    """
+    Writes the scraped data of all countries as a new normalized parquet store
+    (see `write_store`), e.g. of the output of a re-extraction. The scraped
+    files are kept; see `compact_store` for moving them into the store.
+
+    Parameters
+    ----------
+    countries : list of str
+        The country folder names (e.g. ["Germany", "USA"]).
+    directory : str
+        The scraping data folder (see scraping.dataset.scan_scraped_data).
+    store_dir : str
+        The folder to write the three tables to.
+    """
+    wide = pl.concat(
+        [
+            scan_scraped_data(country, directory).with_columns(country=pl.lit(country))
+            for country in countries
+        ],
+        how="vertical_relaxed",
+    )
+    write_store(wide, store_dir)
+
+
+def compact_store(countries, directory="data/scraping", store_dir=store_dir_default):
+    """
+    Moves the text rows the scraper wrote since the last call into the
+    normalized store and deletes their files.
+
+    The store is the persisted layout of the scraped texts: the scraper appends
+    the rows of a crawl to its csv file or parquet parts (see scraping.output),
+    and this moves them into the store once, so just the store (about 7 times
+    smaller than the csv files) is kept. Rows of a url scraped again are added
+    to its rows, like appending to the csv file did.
+
+    The files are renamed (*.compacting) before they are read, so a crawl
+    writes new rows to new files, and deleted once the new store replaced the
+    old one. The store lists the files it holds (compacted.json), so after a
+    crash the renamed files are either deleted (already in the store) or moved
+    in by the next call. Don't run this while a crawl of the countries runs.
+
+    Parameters
+    ----------
+    countries : list of str
+        The country folder names (e.g. ["Germany", "USA"]).
+    directory : str
+        The scraping data folder (see scraping.dataset.scan_scraped_data).
+    store_dir : str
+        The folder of the store.
+
+    Returns
+    -------
+    files : int
+        The number of files moved into the store.
+    """
+    file_compacted = f"{store_dir}/compacted.json"
+    compacted = set()
+    if os.path.isfile(file_compacted):
+        with open(file_compacted, encoding="utf-8") as f:
+            compacted = set(json.load(f))
+
+    files = []  # (country, renamed file)
+    for country in countries:
+        for file in sorted(
+            glob.glob(f"{directory}/{country}/*.compacting")
+            + glob.glob(
+                f"{directory}/parquet/scraped_data/country={country}/*.compacting"
+            )
+        ):
+            # left by a crash: moved in already or still to move
+            if os.path.relpath(file, directory) in compacted:
+                os.remove(file)
+            else:
+                files.append((country, file))
+        for file in scraped_files(country, directory):
+            file_renamed = f"{file}.{time.time_ns()}.compacting"
+            os.replace(file, file_renamed)
+            files.append((country, file_renamed))
+    if not files:
+        return 0
+
+    wide = pl.concat(
+        [
+            scan_scraped_file(file).with_columns(country=pl.lit(country))
+            for country, file in files
+        ],
+        how="vertical_relaxed",
+    )
+    store_old = store_dir if os.path.isfile(f"{store_dir}/texts.parquet") else None
+    staging = f"{store_dir}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)  # left by a crash
+    write_store(wide, staging, store_old)
+    with open(f"{staging}/compacted.json", "w", encoding="utf-8") as f:
+        json.dump([os.path.relpath(file, directory) for _, file in files], f)
+    replace_dir(staging, store_dir)
+
+    for _, file in files:
+        os.remove(file)
+    return len(files)
+
+
+def scan_store_urls(store_dir=store_dir_default):
+    """
+    Returns a LazyFrame with one row per url: url_id, url, url_redirect,
+    domain_id, country and domain.
+    """
+    return (
+        pl.scan_parquet(f"{store_dir}/urls.parquet")
+        .join(
+            pl.scan_parquet(f"{store_dir}/domains.parquet"),
+            on="domain_id",
+            how="left",
+            maintain_order="left",
+        )
+        .with_columns(pl.col("country").cast(pl.Utf8))
+    )
+
+
+def scan_store_texts(store_dir=store_dir_default):
+    """
+    Returns a LazyFrame with the narrow text rows: url_id, domain_id, country,
+    tag, text, text_length and text_hash (no url or domain strings).
+
+    Dedup, ordering and sorting can work on the integer ids; the strings are
+    joined (see `scan_store_urls`) just for the rows that are left. Texts
+    repeated within a domain may be references (null text, see
+    `resolve_references`).
+    """
+    return (
+        pl.scan_parquet(f"{store_dir}/texts.parquet")
+        .join(
+            scan_store_urls(store_dir).select("url_id", "domain_id", "country"),
+            on="url_id",
+            how="left",
+            maintain_order="left",
+        )
+        .select(
+            "url_id",
+            "domain_id",
+            "country",
+            pl.col("tag").cast(pl.Utf8),
+            "text",
+            pl.col("text_length").cast(pl.Int64),
+            "text_hash",
+        )
+    )
+
+
+def domain_partitions(
+    rows_max=1_000_000, key=("country",), store_dir=store_dir_default
+):
+    """
+    Splits the urls of the store into partitions of whole domains with about
+    `rows_max` text rows each.
+
+    The partitions are in the order of `key` (columns or expressions on
+    `scan_store_urls`, the same for all urls of a domain) and domain_id, so
+    processing the partitions one after the other and appending the results
+    gives the order of one global sort by (key, domain_id). A domain is never
+    split; a partition is larger than `rows_max` just if a single domain is.
+
+    Returns
+    -------
+    partitions : pl.DataFrame
+        url_id and part (0, 1, ...) of every url.
+    """
+    keys = [f"key_{i}" for i in range(len(key))]
+    urls = scan_store_urls(store_dir).select(
+        "url_id",
+        "domain_id",
+        *[(pl.col(k) if isinstance(k, str) else k).alias(n) for k, n in zip(key, keys)],
+    )
+    rows = (
+        pl.scan_parquet(f"{store_dir}/texts.parquet")
+        .group_by("url_id")
+        .agg(rows=pl.len())
+    )
+    domains = (
+        urls.join(rows, on="url_id", how="left")
+        .group_by("domain_id")
+        .agg(pl.col(keys).first(), rows=pl.col("rows").sum())
+        .sort(*keys, "domain_id")
+        .with_columns(part=(pl.col("rows").cum_sum() - pl.col("rows")) // rows_max)
+        .with_columns(pl.col("part").rank("dense") - 1)
+    )
+    return (
+        urls.join(domains.select("domain_id", "part"), on="domain_id")
+        .select("url_id", "part")
+        .collect()
+    )
+
+
+def partition_filter(url_ids):
+    """
+    Returns the filter on the text rows of the urls `url_ids` (e.g. of one of
+    the `domain_partitions`).
+
+    Besides the ids themselves it has their range, which the parquet scan
+    prunes with the row group statistics: the text rows are sorted by url_id
+    (see `write_store`) and the urls of a partition of one country are a
+    contiguous range of ids, so a partition reads about its own rows instead
+    of all of texts.parquet.
+    """
+    return pl.col("url_id").is_between(url_ids.min(), url_ids.max()) & pl.col(
+        "url_id"
+    ).is_in(url_ids.implode())
+
+
+def resolve_references(texts):
+    """
+    Fills the text of references with the stored text of the same domain.
+
+    `texts` needs the columns domain_id, text and text_hash (see
+    `scan_store_texts`); the rows keep their order.
+    """
+    stored = (
+        texts.filter(pl.col("text").is_not_null() & pl.col("text_hash").is_not_null())
+        .select("domain_id", "text_hash", text_stored="text")
+        .unique(subset=["domain_id", "text_hash"], keep="first", maintain_order=True)
+    )
+    return (
+        texts.join(
+            stored, on=["domain_id", "text_hash"], how="left", maintain_order="left"
+        )
+        .with_columns(pl.coalesce("text", "text_stored").alias("text"))
+        .drop("text_stored")
+    )
+
+
+def scan_store(store_dir=store_dir_default):
+    """
+    Returns a LazyFrame with the wide view of the normalized store.
+
+    Has the columns of the scraped files (text, text_length, tag, url,
+    url_redirect) plus country, domain and the ids, in url_id order (the rows of
+    a url in scraped order), with all references resolved to their text.
+    """
+    return (
+        resolve_references(scan_store_texts(store_dir))
+        .join(
+            scan_store_urls(store_dir).select(
+                "url_id", "url", "url_redirect", "domain"
+            ),
+            on="url_id",
+            how="left",
+            maintain_order="left",
+        )
+        .select(
+            "text",
+            "text_length",
+            "tag",
+            "url",
+            "url_redirect",
+            "country",
+            "domain",
+            "url_id",
+            "domain_id",
+        )
+    )
@@ -0,0 +1,223 @@
+import bisect
+import csv
+import json
+import os
+import ssl
+import time
+from collections import Counter, defaultdict
+
+import aiohttp
+
+from scraping.fetch import host_of, is_dns_error
+
+
+# upper bounds (seconds) of the latency histogram buckets, the last is open
+latency_buckets = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, float("inf")]
+
+
+def error_class(error):
+    """
+    Returns the class of a fetch or parse error for the error counts
+    ("http_404", "timeout", "ssl", "dns", "connection", "pdf", "pdf_timeout",
+    ...).
+    """
+    if isinstance(error, int):
+        return f"http_{error}"
+    if error == "Timeout":
+        return "timeout"
+    if isinstance(error, str):
+        if error == "content_type:application/pdf":
+            return "pdf"
+        if error.split(":")[0] in (
+            "content_type",
+            "too_large",
+            "host_down",
+            "pdf_backlog",
+            "pdf_timeout",
+        ):
+            return error.split(":")[0]
+        if error.startswith("pdf: "):
+            return "pdf_parse"
+        return "parse"
+    if isinstance(error, (aiohttp.ClientSSLError, ssl.SSLError)):
+        return "ssl"
+    if is_dns_error(error):
+        return "dns"
+    if isinstance(error, (aiohttp.ClientConnectionError, OSError)):
+        return "connection"
+    return type(error).__name__
+
+
+class Histogram:
+    """
+    Counts of values in the fixed `latency_buckets` (plus sum and maximum).
+    """
+
+    def __init__(self):
+        self.counts = [0] * len(latency_buckets)
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(latency_buckets, value)] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def quantile(self, q):
+        """
+        Returns the upper bound of the bucket holding the q-quantile.
+        """
+        rank = q * len(self)
+        seen = 0
+        for bound, count in zip(latency_buckets, self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, self.max)
+        return 0.0
+
+
+class HostMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.latency = Histogram()
+        self.errors = Counter()
+
+
+class CrawlMetrics:
+    """
+    Telemetry of a crawl: per-host request latency histograms, bytes fetched,
+    errors by class, parse time and rows emitted.
+
+    `snapshot` returns everything as a dict, `write` stores it as a json file
+    (totals, stages, hosts) and a csv file (one row per host) that can be
+    opened while the crawl is running, and `summary` is the end of run report
+    with the slowest and most failing hosts.
+    """
+
+    def __init__(self):
+        self.time_start = time.perf_counter()
+        self.hosts = defaultdict(HostMetrics)
+        self.parse_time = Histogram()
+        self.rows = 0
+        self.errors = Counter()
+
+    def record_fetch(self, result):
+        """
+        Records a request (every attempt, see scraping.fetch.crawl); failed
+        ones count with the seconds until they failed.
+        """
+        host = self.hosts[host_of(result.url)]
+        host.requests += 1
+        if result.seconds is not None:
+            host.latency.add(result.seconds)
+        if result.content is not None:
+            host.bytes += len(result.content)
+        if result.error is not None:
+            self.record_error(result.url, result.error)
+
+    def record_parse(self, seconds, rows):
+        self.parse_time.add(seconds)
+        self.rows += rows
+
+    def record_error(self, url, error):
+        name = error_class(error)
+        self.hosts[host_of(url)].errors[name] += 1
+        self.errors[name] += 1
+
+    def snapshot(self):
+        seconds = max(time.perf_counter() - self.time_start, 1e-9)
+        requests = sum(host.requests for host in self.hosts.values())
+        bytes_ = sum(host.bytes for host in self.hosts.values())
+        hosts = {
+            name: {
+                "requests": host.requests,
+                "bytes": host.bytes,
+                "errors": sum(host.errors.values()),
+                "latency_mean": host.latency.total / max(len(host.latency), 1),
+                "latency_p50": host.latency.quantile(0.5),
+                "latency_p90": host.latency.quantile(0.9),
+                "latency_max": host.latency.max,
+                "latency_total": host.latency.total,
+                "latency_buckets": host.latency.counts,
+                "errors_by_class": dict(host.errors),
+            }
+            for name, host in self.hosts.items()
+        }
+        return {
+            "seconds": seconds,
+            "requests": requests,
+            "pages_per_second": requests / seconds,
+            "bytes": bytes_,
+            "megabytes_per_second": bytes_ / 1e6 / seconds,
+            "parsed": len(self.parse_time),
+            "parse_seconds_mean": self.parse_time.total / max(len(self.parse_time), 1),
+            "parse_seconds_p90": self.parse_time.quantile(0.9),
+            "rows": self.rows,
+            "errors_by_class": dict(self.errors),
+            "latency_buckets": latency_buckets[:-1] + ["inf"],
+            "hosts": hosts,
+        }
+
+    def write(self, file_json, file_csv):
+        """
+        Writes the current snapshot to a json and a csv file (atomically, so a
+        reader never sees half a file).
+        """
+        snapshot = self.snapshot()
+        with open(f"{file_json}.tmp", "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, indent=1)
+        os.replace(f"{file_json}.tmp", file_json)
+
+        columns = ["host", "requests", "bytes", "errors", "latency_mean"]
+        columns += ["latency_p50", "latency_p90", "latency_max", "latency_total"]
+        with open(f"{file_csv}.tmp", "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns + ["errors_by_class"])
+            for name, host in sorted(
+                snapshot["hosts"].items(), key=lambda item: -item[1]["latency_total"]
+            ):
+                writer.writerow(
+                    [name]
+                    + [host[column] for column in columns[1:]]
+                    + [json.dumps(host["errors_by_class"])]
+                )
+        os.replace(f"{file_csv}.tmp", file_csv)
+
+    def summary(self, hosts_num=10):
+        """
+        Returns the end of run report as text.
+        """
+        snapshot = self.snapshot()
+        lines = [
+            f"{snapshot['requests']} requests in {snapshot['seconds']:.0f}s"
+            f" ({snapshot['pages_per_second']:.1f} pages/s,"
+            f" {snapshot['megabytes_per_second']:.2f} MB/s,"
+            f" {snapshot['bytes'] / 1e6:.1f} MB)",
+            f"parse: {snapshot['parsed']} pages,"
+            f" mean {snapshot['parse_seconds_mean'] * 1000:.1f} ms,"
+            f" p90 {snapshot['parse_seconds_p90'] * 1000:.0f} ms,"
+            f" {snapshot['rows']} rows",
+            "errors: "
+            + (
+                ", ".join(
+                    f"{name} {count}" for name, count in self.errors.most_common()
+                )
+                or "none"
+            ),
+            "slowest hosts (total request time):",
+        ]
+        hosts = sorted(
+            snapshot["hosts"].items(), key=lambda item: -item[1]["latency_total"]
+        )
+        for name, host in hosts[:hosts_num]:
+            lines.append(
+                f"  {name}: {host['requests']} requests,"
+                f" {host['latency_total']:.1f}s total,"
+                f" p50 {host['latency_p50']:.2f}s, p90 {host['latency_p90']:.2f}s,"
+                f" {host['errors']} errors"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,164 @@
+import re
+from itertools import chain
+
+import ftfy
+import polars as pl
+
+
+replacement_dict = {
+    "√§": "ä",  #
+    "ГӨ": "ä",  #
+    "Ă¤": "ä",  #
+    "ÃĊ": "ä",  #
+    "ΟΛ": "ä",  #
+    "ûÊ": "ä",  #
+    "УЄ": "ä",  #
+    "ÃĪ": "ä",  #
+    "Ã€": "ä",  #
+    "Ã¤": "ä",  #
+    "├ż": "ä",  #
+    "Ć¤": "ä",  #
+    "√∂": "ö",  #
+    "Ă¶": "ö",  #
+    "ΟΕ": "ö",  #
+    "ûÑ": "ö",  #
+    "УЖ": "ö",  #
+    "Ãķ": "ö",  #
+    "Г¶": "ö",  #
+    "├Č": "ö",  #
+    "Ć¶": "ö",  #
+    "√ľ": "ü",  #
+    "Гј": "ü",  #
+    "ĂĽ": "ü",  #
+    "Ãỳ": "ü",  #
+    "УМ": "ü",  #
+    # 'û': 'ü', #
+    "ΟΦ": "ü",  #
+    "û¥": "ü",  #
+    "Ãž": "ü",  #
+    "ÃŒ": "ü",  #
+    "Ã¼": "ü",  #
+    "├╝": "ü",  #
+    "uМҲ": "ü",  #
+    "uäˆ": "ü",  #
+    "Ć¼": "ü",  #
+    "√Ą": "Ä",  #
+    "Ã": "Ä",  #
+    'Ã""': "Ä",  #
+    'û""': "Ä",  #
+    "√Ė": "Ö",  #
+    "Ã¶": "Ö",  #
+    "Ã": "Ö",  #
+    "Ã–": "Ö",  #
+    "Ć": "Ö",  #
+    "√ú": "Ü",
+    "Ăś": "Ü",  # Übersicht
+    "├£": "Ü",  #
+    "Ã": "Ü",  #
+    "Гң": "Ü",  #
+    "Ο€": "Ü",  #
+    "ûœ": "Ü",  #
+    "Ãœ": "Ü",  #
+    "Ć": "Ü",  #
+    "√ü": "ß",  #
+    "Гҹ": "ß",  #
+    "Οü": "ß",  #
+    "ûŸ": "ß",  #
+    "УЖ": "ß",  #
+    "ÃŸ": "ß",  #
+    "Ã": "ß",  #
+    "├¤": "ß",  #
+    "У": "ß",  #
+    "Ć": "ß",  #
+    # 'û': 'ß', #
+    "‚Äě": " ",  #
+    "вҖһ": " ",  #
+    "‚Äú": " ",  #
+    "вҖ“": " ",  #
+    "â€": " ",  #
+    "'Äě": " ",  #
+    "'Äú": " ",  #
+    "'Äď": " ",  #
+    "'Äô": " ",  #
+    "'Äö": " ",  #
+    "'Äė": " ",  #
+    "'Ä¶": " ",  #
+}
+
+# Ã 149
+
+
+def correct_umlaute(text):
+    # the former per row repair (reference for repair_texts)
+    # Ensure the input is a string for replacement operation
+    if isinstance(text, str):
+
+        text = ftfy.fix_text(text)
+
+        for wrong, right in replacement_dict.items():
+            text = text.replace(wrong, right)
+
+    return text
+
+
+# patterns longest first: with leftmost matching this is leftmost-longest
+_wrong = sorted(replacement_dict, key=len, reverse=True)
+_right = [replacement_dict[wrong] for wrong in _wrong]
+
+# characters ftfy leaves alone: ASCII without "&" (HTML entities) and the
+# accented letters of German, French and Spanish text. In each single-byte
+# encoding ftfy tries these letters are all UTF-8 lead bytes or all
+# continuation bytes, so they can't spell mojibake, except ß (a lead byte in
+# cp437) before another non-ASCII character.
+_letters_clean = "äöüÄÖÜßéèàáâêîôçñ"
+_pattern_unclean = rf"[^\t\n\x20-\x25\x27-\x7e{_letters_clean}]|ß[^\x00-\x7f]"
+pattern_suspicious = "|".join(
+    [_pattern_unclean]
+    + [re.escape(wrong) for wrong in _wrong if not re.search(_pattern_unclean, wrong)]
+)
+
+
+def fix_texts(texts):
+    """
+    Runs ftfy on a list of texts (in a worker process, see `repair_texts`).
+    """
+    return [ftfy.fix_text(text) for text in texts]
+
+
+def replace_mojibake(texts):
+    """
+    Replaces all keys of `replacement_dict` in a polars Series of texts.
+
+    One leftmost-longest Aho-Corasick pass per text; a replacement can spell
+    another key ("uÃ¤ˆ" -> "uäˆ" -> "ü"), so the few texts that still contain
+    one get another pass (every pass shortens them).
+    """
+    texts = texts.str.replace_many(_wrong, _right, leftmost=True)
+    pending = texts.str.contains_any(_wrong).fill_null(False).arg_true()
+    while len(pending):
+        repaired = texts.gather(pending).str.replace_many(_wrong, _right, leftmost=True)
+        texts = texts.scatter(pending, repaired)
+        pending = pending.filter(repaired.str.contains_any(_wrong))
+    return texts
+
+
+def repair_texts(texts, executor=None, chunk_size=10_000):
+    """
+    Returns a polars Series of texts with broken umlauts repaired (the result
+    of `correct_umlaute` and "Maönahme" -> "Maßnahme").
+
+    Only suspicious texts (`pattern_suspicious`, a vectorized check) can be
+    changed by ftfy or the replacements, so just these are repaired: ftfy in
+    chunks of `chunk_size` texts (on the processes of `executor` if given),
+    then `replace_mojibake`.
+    """
+    index = texts.str.contains(pattern_suspicious).fill_null(False).arg_true()
+    if len(index):
+        chunks = [
+            texts.gather(index[i : i + chunk_size]).to_list()
+            for i in range(0, len(index), chunk_size)
+        ]
+        fixed = (executor.map if executor else map)(fix_texts, chunks)
+        fixed = pl.Series(texts.name, list(chain.from_iterable(fixed)), pl.Utf8)
+        texts = texts.scatter(index, replace_mojibake(fixed))
+    return texts.str.replace_all("Maönahme", "Maßnahme", literal=True)
@@ -0,0 +1,120 @@
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+# query parameters that just track the visitor and never change the page
+tracking_params = re.compile(
+    r"^(utm_\w+|gclid|fbclid|msclkid|mc_cid|mc_eid|_ga|_gl|yclid|igshid)$", re.I
+)
+
+canonical_rules = {
+    "drop_params": tracking_params,  # regex of query parameters to drop
+    "sort_query": True,  # order of query parameters doesn't matter
+    "unify_scheme": True,  # http and https are the same page
+    "strip_www": True,  # www.uni.de and uni.de are the same host
+    "strip_slash": True,  # /about/ and /about are the same page
+}
+
+
+def canonical_url(
+    url,
+    drop_params=tracking_params,
+    sort_query=True,
+    unify_scheme=True,
+    strip_www=True,
+    strip_slash=True,
+):
+    """
+    Returns the canonical form of a url, used as key to find variants of the
+    same page (the url itself is still fetched as it is).
+
+    Scheme and host are lower case, default ports and the fragment are removed
+    in any case; the other rules are the keyword arguments (see
+    `canonical_rules` for their defaults).
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    try:
+        port = parts.port if parts.port not in (None, 80, 443) else None
+    except ValueError:  # invalid port, keep the url as it is
+        return url
+
+    if unify_scheme and scheme in ("http", "https"):
+        scheme = "https"
+    if strip_www and host.startswith("www."):
+        host = host[4:]
+    netloc = f"{host}:{port}" if port else host
+
+    path = parts.path or "/"
+    if strip_slash and len(path) > 1:
+        path = path.rstrip("/") or "/"
+
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if drop_params is not None:
+        query = [(k, v) for k, v in query if not drop_params.match(k)]
+    if sort_query:
+        query = sorted(query)
+
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+
+class SeenUrls:
+    """
+    Canonical forms of all successfully fetched pages and a redirect map, to
+    skip variants of a page before requesting them.
+
+    A url is a duplicate if its canonical form was fetched already (as a
+    requested or as a final url) or if it is known to redirect to such a page.
+    The redirect map is learned from the redirect chain of every response.
+
+    Parameters
+    ----------
+    pages : iterable of (str, str or None)
+        Requested and final url (None if not redirected) of the pages fetched
+        in earlier crawls.
+    redirects : dict of str to str
+        Known redirects (canonical url to canonical target).
+    **rules
+        The rules of `canonical_url`.
+    """
+
+    def __init__(self, pages=(), redirects=None, **rules):
+        self.rules = {**canonical_rules, **rules}
+        self.seen = {}  # canonical url to the requested url
+        for url, url_final in pages:
+            self._add(url, url_final)
+        self.redirects = dict(redirects or {})
+
+    def _add(self, url, url_final):
+        self.seen.setdefault(self.canonical(url), url)
+        if url_final is not None:
+            self.seen.setdefault(self.canonical(url_final), url)
+
+    def canonical(self, url):
+        return canonical_url(url, **self.rules)
+
+    def duplicate_of(self, url):
+        """
+        Returns the fetched url that `url` is a variant of (None if new).
+        """
+        key = self.canonical(url)
+        if key in self.seen:
+            return self.seen[key]
+        return self.seen.get(self.redirects.get(key))
+
+    def learn(self, result):
+        """
+        Adds a successful FetchResult; returns the new redirects (canonical
+        url, canonical target) of its redirect chain.
+        """
+        self._add(result.url, result.url_final)
+        target = self.canonical(result.url_final or result.url)
+
+        redirects_new = []
+        for _, url in result.redirects or []:
+            key = self.canonical(url)
+            if key != target and self.redirects.get(key) != target:
+                self.redirects[key] = target
+                redirects_new.append((key, target))
+        return redirects_new
@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from scraping.extract import extract_rows  # noqa: E402
+
+
+paragraph = "Příliš žluťoučký kůň úpěl ďábelské ódy o rovnosti a rozmanitosti. " * 3
+
+pages = {
+    "cp1250_undeclared": (
+        f"<html><head><title>Vysoká škola</title></head>"
+        f"<body><h1>Rovnost příležitostí</h1><p>{paragraph}</p></body></html>"
+    ).encode("cp1250"),
+    "latin1_declared": (
+        f'<html><head><meta charset="iso-8859-1"><title>Universität</title></head>'
+        f"<body><p>Gleichstellung und Diversität an der Universität. {'x' * 150}</p>"
+        f"</body></html>"
+    ).encode("latin-1"),
+    "utf8_bom": (f"<title>Universität</title><p>{paragraph}</p>").encode("utf-8-sig"),
+    "title_markup": f"<title>A <b>bold</b> title</title><p>{paragraph}</p>".encode(),
+    "title_single_tag": b"<title><span><i>Nested</i></span></title><h2>Heading</h2>",
+    "title_comment": b"<title>a<!-- c -->b</title><h2>Heading</h2>",
+    "title_entity": b"<title>Tom &amp; Jerry</title><h2>Heading</h2>",
+    "title_empty": b"<title></title><h2>Heading</h2>",
+    "no_title": b"<html><body><h1>Heading</h1></body></html>",
+}
+
+
+@pytest.mark.parametrize("name", list(pages))
+def test_backends_agree(name):
+    url = "https://www.uni-example.cz/"
+    rows_bs4 = extract_rows(pages[name], url, backend="bs4")
+    rows_lxml = extract_rows(pages[name], url, backend="lxml")
+    assert rows_lxml == rows_bs4
+
+
+def test_undeclared_cp1250_is_decoded():
+    rows = extract_rows(pages["cp1250_undeclared"], "https://x.cz/", backend="lxml")
+    assert rows[0][0] == "Vysoká škola"
+    assert rows[-1][0] == " ".join(paragraph.split())
@@ -0,0 +1,50 @@
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from scraping.archive import ArchiveWriter  # noqa: E402
+from scraping.dataset import scan_scraped_data, scan_scraped_errors  # noqa: E402
+from scraping.fetch import FetchResult  # noqa: E402
+
+scrape = importlib.import_module("1_1_scrape_texts_by_country")
+
+
+def make_page(url, paragraphs):
+    html = "<html><head><title>Page</title></head><body>"
+    html += "".join(
+        f"<p>Paragraph {i} of {url}: " + "diversity and equality " * 10 + "</p>"
+        for i in range(paragraphs)
+    )
+    return FetchResult(
+        url,
+        url_final=url,
+        status=200,
+        content_type="text/html; charset=utf-8",
+        content=(html + "</body></html>").encode("utf-8"),
+        headers=[("Content-Type", "text/html; charset=utf-8")],
+        redirects=[],
+    )
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_reextract_twice_keeps_rows(tmp_path, monkeypatch, output_format):
+    monkeypatch.chdir(tmp_path)
+    with ArchiveWriter("data/scraping/India/archive") as archive:
+        for i in range(3):
+            archive.write(make_page(f"https://uni{i}.ac.in/", paragraphs=i + 2))
+
+    directory = "data/scraping/reextracted"
+    counts = []
+    for _ in range(2):
+        scrape.reextract_countries(
+            ["India"], parse_workers=1, output_format=output_format
+        )
+        counts.append(scan_scraped_data("India", directory).collect().height)
+
+    assert counts[0] == 3 + 2 + 3 + 4  # a title and the paragraphs per page
+    assert counts[1] == counts[0]
+    assert scan_scraped_errors("India", directory).collect().height == 0